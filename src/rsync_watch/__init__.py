@@ -1,176 +1,658 @@
 #! /usr/bin/env python
 
 
+import concurrent.futures
+import datetime
+import functools
+import hashlib
+import os
 import re
 import shlex
 import socket
+import tempfile
+import time
 import typing
+from typing import Optional
 
-from command_watcher import CommandWatcherError, Watch
+from command_watcher import CommandExecutor, CommandWatcherError, Watch  # noqa: F401
+from command_watcher.report import Status
 
+from rsync_watch.autotune import AutoTuner, Candidate
 from rsync_watch.check import ChecksCollection
 from rsync_watch.cli import ArgumentsDefault, __version__, get_argparser  # noqa: F401
+from rsync_watch.daemon import is_daemon_location, is_remote_shell_location
+from rsync_watch.excludes import (
+    Rule,
+    build_filter_args,
+    compile_rules,
+    parse_rules,
+    read_rule_file,
+)
+from rsync_watch.histogram import OUT_FORMAT, FileHistogram, iter_out_format_lines
+from rsync_watch.lock import ServiceLock
+from rsync_watch.priority import Priority, build_preexec_fn
+from rsync_watch.reporting import ChannelDelivery, QueuedReporter
+from rsync_watch.resources import ResourceUsage
+from rsync_watch.schedule import ChangeRateForecaster
+from rsync_watch.snapshot import PARTIAL_SUFFIX, Retention, SnapshotStore
+from rsync_watch.stats import (  # noqa: F401
+    Stats,
+    StatsNotFoundError,
+    add_throughput,
+    aggregate_stats,
+    convert_number_to_float,
+    convert_number_to_int,
+    detect_stats_format,
+    parse_stats,
+)
+from rsync_watch.verify import VerificationResult, merge_results, verify
 
 watch: Watch
 
 
-class StatsNotFoundError(CommandWatcherError):
-    """Raised when some stats regex couldn’t be found in stdout."""
+_SERVICE_NAME_TRANSLATION: dict[int, int] = str.maketrans("/@:.~", "-----")
 
+_SERVICE_NAME_SEPARATORS: re.Pattern[str] = re.compile(r"[-_]{2,}")
 
-def convert_number_to_int(formatted_number: str) -> int:
-    """Convert a integer containing commas or dots to a integer without commas or dots.
 
-    :param comma_integer: a integer containing commas or dots
+def _collapse_separators(match: re.Match[str]) -> str:
+    return "_" if "_" in match.group(0) else "-"
 
-    :return: A integer without commas or dots
-    """
 
-    formatted_number = formatted_number.replace(",", "")
-    formatted_number = formatted_number.replace(".", "")
+@functools.lru_cache(maxsize=1024)
+def format_service_name(
+    host_name: str,
+    src: str,
+    dest: str,
+    unique: bool = False,
+    more_dests: tuple[str, ...] = (),
+) -> str:
+    """Format a service name to use as a Nagios or Icinga service name.
 
-    return int(formatted_number)
+    The special characters ``/@:.~`` are replaced by dashes, runs of dashes
+    and underscores are collapsed in a single pass. This is lossy:
+    ``a/b``, ``a:b`` and ``a-b`` result in the same name. Use ``unique`` to
+    append a hash of the unmodified arguments to tell them apart.
 
+    :param host_name: The hostname of the machine the rsync job running
+      on.
+    :param src: A source string rsync understands
+    :param dest: A destination string rsync understands
+    :param unique: Append the first 10 hex digits of the SHA-1 of the
+      arguments to make the name collision-free.
+    :param more_dests: Additional destinations of a fan-out.
 
-def convert_number_to_float(formatted_number: str) -> float:
-    return float(formatted_number.replace(",", "."))
+    :return: The service name
+    """
+    dests: tuple[str, ...] = (dest, *more_dests)
+    result: str = f"rsync_{host_name}_{src}_{'_'.join(dests)}".translate(
+        _SERVICE_NAME_TRANSLATION
+    )
+    result = _SERVICE_NAME_SEPARATORS.sub(_collapse_separators, result)
+    result = result.removesuffix("-").removeprefix("-")
+    if unique:
+        # NUL can’t occur in paths, unlike the underscore of the name.
+        digest = hashlib.sha1("\0".join((host_name, src, *dests)).encode()).hexdigest()
+        result = f"{result}_{digest[:10]}"
+    return result
 
 
-def parse_stats(stdout: str) -> typing.Dict[str, typing.Union[int, float]]:
-    """Parse the standard output of the rsync process.
+def build_rsync_command(
+    args: ArgumentsDefault,
+    extra_args: typing.Sequence[str] = (),
+    src: Optional[str] = None,
+    dest: Optional[str] = None,
+    read_batch: Optional[str] = None,
+) -> list[str]:
+    """
+    :param extra_args: Additional rsync arguments, for example the exclude
+      rules or the options selected by the auto-tuner. They are inserted
+      before ``--rsync-args``, so the arguments specified by the user take
+      precedence.
+    :param src: The source, ``args.src`` if not specified.
+    :param dest: The destination, ``args.dest`` if not specified.
+    :param read_batch: Apply this batch file (written by ``--write-batch``)
+      to the destination instead of syncing from the source.
+    """
+    if src is None:
+        src = args.src
+    if dest is None:
+        dest = args.dest
 
-    https://github.com/WayneD/rsync/blob/c69dc7a5ab473bb52a575b5803026c2694761084/main.c#L416-L465
+    rsync_command: list[str] = ["rsync", "-av", "--delete", "--stats"]
 
-    :param stdout: The standard output of the rsync process
+    if args.dest_user_group:
+        # https://stackoverflow.com/a/62982981
+        # zsh:1: no matches found: --usermap=*:smb
+        escape_star: str = ""
+        # A rsync daemon doesn’t pass the arguments through a shell.
+        if is_remote_shell_location(dest):
+            escape_star = "\\"
+        rsync_command += [
+            f"--usermap={escape_star}*:{args.dest_user_group}",
+            f"--groupmap={escape_star}*:{args.dest_user_group}",
+        ]
 
-    :return: A dictionary containing all the stats numbers.
-    """
-    result: typing.Dict[str, typing.Union[int, float]] = {}
+    if args.password_file:
+        rsync_command.append(f"--password-file={args.password_file}")
 
-    def search(regex: str, exception_msg: str) -> int:
-        match = re.search(regex, stdout)
-        if match:
-            return convert_number_to_int(match.group(1))
-        else:
-            raise StatsNotFoundError(exception_msg)
+    if args.file_histogram or args.verify:
+        rsync_command.append(f"--out-format={OUT_FORMAT}")
 
-    result["num_files"] = search(
-        r"\nNumber of files: ([\d,\.]*)",
-        "Number of files: X,XXX (reg: X,XXX, dir: X,XXX)",
-    )
+    rsync_command += extra_args
+    if args.rsync_args:
+        rsync_command += shlex.split(args.rsync_args)
+    if read_batch is not None:
+        rsync_command += [f"--read-batch={read_batch}", dest]
+    else:
+        rsync_command += [src, dest]
 
-    result["num_created_files"] = search(
-        r"\nNumber of created files: ([\d,\.]*)",
-        "Number of created files: X,XXX (reg: X,XXX, dir: X,XXX)",
-    )
+    return rsync_command
 
-    # num_deleted_files
-    # This line is sometimes missing on rsync --version 3.1.2
-    # raise no error
-    match = re.search(r"\nNumber of deleted files: ([\d,\.]*)", stdout)
-    if match:
-        result["num_deleted_files"] = convert_number_to_int(match.group(1))
-    else:
-        result["num_deleted_files"] = 0
 
-    result["num_files_transferred"] = search(
-        r"\nNumber of regular files transferred: ([\d,\.]*)\n",
-        "Number of regular files transferred: X,XXX",
-    )
+def acquire_lock(
+    watch: Watch, lock: ServiceLock, args: ArgumentsDefault, reporter: QueuedReporter
+) -> bool:
+    """Acquire the service lock according to ``--lock-policy``.
 
-    result["total_size"] = search(
-        r"\nTotal file size: ([\d,\.]*) bytes\n",
-        "Total file size: X,XXX bytes",
-    )
+    Runs that don’t get the lock are reported to the monitoring. A run that
+    gets it removes the pending marker: the run covers the passes requested
+    before it starts, and a marker left behind by a crashed instance
+    mustn’t trigger an extra pass.
 
-    result["transferred_size"] = search(
-        r"\nTotal transferred file size: ([\d,\.]*) bytes\n",
-        "Total transferred file size: X,XXX bytes",
+    :return: True if the lock has been acquired and the sync should be
+      performed.
+    """
+    if args.lock_policy == "wait":
+        watch.log.info(f"Waiting for the lock: {lock.lock_file}")
+        if lock.acquire(timeout=args.lock_timeout):
+            lock.consume_pending()
+            return True
+        message = (
+            f"Another instance of “{lock.service_name}” is still running after "
+            f"{args.lock_timeout} seconds."
+        )
+        reporter.report(status=1, custom_message=message)
+        watch.log.info(message)
+        return False
+
+    if lock.acquire():
+        lock.consume_pending()
+        return True
+
+    if args.lock_policy == "coalesce":
+        lock.request_pass()
+        # The other instance may have released the lock in the meantime.
+        if lock.acquire():
+            lock.consume_pending()
+            return True
+        message = (
+            f"Another instance of “{lock.service_name}” is running, "
+            "coalesced into one more pass of the running instance."
+        )
+        reporter.report(status=0, custom_message=message)
+    else:
+        message = (
+            f"Another instance of “{lock.service_name}” is running, skipped this run."
+        )
+        reporter.report(status=1, custom_message=message)
+    watch.log.info(message)
+    return False
+
+
+def get_priority(args: ArgumentsDefault) -> Priority:
+    return Priority(
+        args.nice,
+        args.ionice_class,
+        args.ionice_level,
+        args.cgroup,
+        args.cgroup_cpu_weight,
+        args.cgroup_io_weight,
+        args.cgroup_cpu_max,
+        args.cgroup_io_max,
     )
 
-    result["literal_data"] = search(
-        r"\nLiteral data: ([\d,\.]*) bytes\n",
-        "Literal data: X,XXX bytes",
-    )
 
-    result["matched_data"] = search(
-        r"\nMatched data: ([\d,\.]*) bytes\n",
-        "Matched data: X,XXX bytes",
-    )
+def load_rules(args: ArgumentsDefault) -> list[Rule]:
+    """Parse the rules of ``--exclude`` followed by the rules of the
+    ``--exclude-from`` files."""
+    rules: list[Rule] = parse_rules(args.exclude or [])
+    for path in args.exclude_from or []:
+        rules += read_rule_file(path)
+    return rules
 
-    result["list_size"] = search(
-        r"\nFile list size: ([\d,\.]*)\n", "File list size: X,XXX"
-    )
 
-    # list_generation_time
-    match = re.search(r"\nFile list generation time: ([\d,\.]*) seconds\n", stdout)
-    if match:
-        result["list_generation_time"] = convert_number_to_float(match.group(1))
-    else:
-        raise StatsNotFoundError("File list generation time: X.XXX seconds")
+def get_forecaster(args: ArgumentsDefault, service: str) -> ChangeRateForecaster:
+    return ChangeRateForecaster(
+        os.path.join(args.state_dir, f"{service}.schedule.json"),
+        min_interval=args.min_interval,
+        max_interval=args.max_interval,
+        target_size=args.target_change,
+    )
 
-    # list_transfer_time
-    match = re.search(r"\nFile list transfer time: ([\d,\.]*) seconds\n", stdout)
-    if match:
-        result["list_transfer_time"] = convert_number_to_float(match.group(1))
-    else:
-        raise StatsNotFoundError("File list transfer time: X.XXX seconds")
 
-    result["bytes_sent"] = search(
-        r"\nTotal bytes sent: ([\d,\.]*)\n",
-        "Total bytes sent: X,XXX",
+def get_retention(args: ArgumentsDefault) -> Retention:
+    return Retention(
+        args.keep_last, args.keep_daily, args.keep_weekly, args.keep_monthly
     )
 
-    result["bytes_received"] = search(
-        r"\nTotal bytes received: ([\d,\.]*)\n",
-        "Total bytes received: X,XXX",
+
+PARTIAL_STATS_MESSAGE: str = (
+    "The stats of rsync are incomplete (marked with “partial”). The counters "
+    "have been reconstructed from the files printed by rsync so far."
+)
+
+
+class RsyncResult(typing.NamedTuple):
+    src: str
+    dest: str
+    stats: Stats
+    stdout: str
+
+
+class RsyncFailedError(Exception):
+    """Raised if rsync exits with an exit code that isn’t ignored. The
+    result contains the partial stats of the output so far."""
+
+    result: RsyncResult
+
+    returncode: int
+
+    def __init__(self, result: RsyncResult, returncode: int) -> None:
+        super().__init__(
+            f"rsync failed with exit code {returncode}: {result.src} -> {result.dest}"
+        )
+        self.result = result
+        self.returncode = returncode
+
+
+class FanOutFailedError(RsyncFailedError):
+    """Raised if rsync fails for some destinations of a fan-out. The
+    result contains the aggregated stats of all destinations that have been
+    synced, the partial stats of the failed ones included. The return code
+    is the one of the first failed destination."""
+
+    results: list[RsyncResult]
+
+    errors: list[RsyncFailedError]
+
+    skipped: list[str]
+    """The destinations that haven’t been synced because they depend on a
+    failed one (``chain`` and ``batch``)."""
+
+    def __init__(
+        self,
+        results: list[RsyncResult],
+        errors: list[RsyncFailedError],
+        skipped: list[str],
+        duration: float,
+    ) -> None:
+        failed = ", ".join(
+            f"{error.result.dest} (exit code {error.returncode})" for error in errors
+        )
+        message = (
+            f"rsync failed for {len(errors)} of {len(results) + len(skipped)} "
+            f"destinations: {failed}"
+        )
+        if skipped:
+            message += f", skipped: {', '.join(skipped)}"
+        Exception.__init__(self, message)
+        self.result = RsyncResult(
+            results[0].src,
+            ", ".join(result.dest for result in results),
+            aggregate_stats([result.stats for result in results], duration),
+            "".join(result.stdout for result in results),
+        )
+        self.returncode = errors[0].returncode
+        self.results = results
+        self.errors = errors
+        self.skipped = skipped
+
+
+def run_rsync(
+    watch: Watch,
+    args: ArgumentsDefault,
+    src: str,
+    dest: str,
+    extra_args: typing.Sequence[str] = (),
+    read_batch: Optional[str] = None,
+) -> RsyncResult:
+    """Run one rsync process and parse its stats."""
+    rsync_command: list[str] = build_rsync_command(
+        args, extra_args, src, dest, read_batch
     )
 
+    if read_batch is not None:
+        watch.log.info(f"Batch file: {read_batch}")
+    else:
+        watch.log.info(f"Source: {src}")
+    watch.log.info(f"Destination: {dest}")
+
+    kwargs: dict[str, typing.Any] = {}
+    preexec_fn = build_preexec_fn(get_priority(args))
+    if preexec_fn is not None:
+        kwargs["preexec_fn"] = preexec_fn
+
+    start = time.monotonic()
+    # The watch doesn’t raise exceptions, see main(). The exit code is
+    # checked below.
+    process = watch.run(rsync_command, **kwargs)  # type: ignore
+    duration = time.monotonic() - start
+    # Use the output of this process only: with coalesced passes or
+    # multiple destinations the output of the watch contains the stats of
+    # all processes.
+    stats = parse_stats(process.stdout, partial=True)
+    add_throughput(stats, duration)
+    result = RsyncResult(src, dest, stats, process.stdout)
+    returncode = process.subprocess.returncode
+    if returncode != 0 and returncode not in args.ignore_exceptions:
+        raise RsyncFailedError(result, returncode)
+    if "partial" in stats:
+        watch.log.warning(
+            "The stats of rsync are missing, reconstructed them from the file list."
+        )
     return result
 
 
-def format_service_name(host_name: str, src: str, dest: str) -> str:
-    """Format a service name to use as a Nagios or Icinga service name.
+def chain_source(src: str, dest: str) -> str:
+    """The copy of ``src`` in ``dest`` to sync the next destination of a
+    chain from.
 
-    :param host_name: The hostname of the machine the rsync job running
-      on.
-    :param src: A source string rsync understands
-    :param dest: A destination string rsync understands
+    Without a trailing slash rsync copies the source directory itself into
+    the destination, ``dest/<name of src>``. The next destination is
+    synced from this directory, so every destination gets the same layout
+    and ``--delete`` never reaches files next to the synced directory.
 
-    :return: The service name
+    :return: ``dest/`` if ``src`` has a trailing slash (only its content is
+      copied), otherwise ``dest/<name of src>`` without a trailing slash.
     """
-    result: str = f"rsync_{host_name}_{src}_{dest}"
-    result = re.sub(r"[/@:\.~]", "-", result)
-    result = re.sub(r"-*_-*", "_", result)
-    result = re.sub(r"-{2,}", "-", result)
-    result = re.sub(r"_{2,}", "_", result)
-    result = re.sub(r"-$", "", result)
-    result = re.sub(r"^-", "", result)
-    return result
-
-
-def build_rsync_command(args: ArgumentsDefault) -> list[str]:
-    rsync_command: list[str] = ["rsync", "-av", "--delete", "--stats"]
+    path = src
+    if src.startswith("rsync://"):
+        # rsync://[USER@]HOST[:PORT]/MODULE[/PATH]
+        path = src.removeprefix("rsync://").partition("/")[2].partition("/")[2]
+    elif is_daemon_location(src):
+        path = src.partition("::")[2].partition("/")[2]
+    elif is_remote_shell_location(src):
+        path = src.partition(":")[2]
+    name = os.path.basename(path)
+    # The root of a module or the home directory: only the content.
+    if src.endswith("/") or name in ("", ".", ".."):
+        return f"{dest.rstrip('/')}/"
+    return f"{dest.rstrip('/')}/{name}"
+
+
+def fan_out(
+    watch: Watch,
+    args: ArgumentsDefault,
+    dests: list[str],
+    extra_args: typing.Sequence[str] = (),
+    filter_args: typing.Sequence[str] = (),
+) -> list[RsyncResult]:
+    """Sync the source to multiple destinations.
+
+    ``parallel``: sync to all destinations concurrently.
+    ``chain``: sync the source to the first destination, then each
+    destination from the copy in the previous one, so the source is walked
+    only once, see :func:`chain_source`.
+    rsync can’t sync from a remote to another remote location, so at most
+    one of two neighbouring locations may be remote in this mode.
+    ``batch``: sync the source to the first destination and record the
+    changes with ``--write-batch``, then apply the batch to the other
+    destinations concurrently with ``--read-batch``. The deltas are computed
+    only once. The other destinations must have been identical to the first
+    one before the sync and must be local: rsync doesn’t accept a remote
+    destination with ``--read-batch``.
+
+    :param filter_args: The exclude rules, also contained in ``extra_args``.
+      Only they are passed to ``--read-batch``.
+
+    :raises FanOutFailedError: If rsync fails for at least one destination.
+      The remaining destinations are synced nevertheless, unless they depend
+      on the failed one.
+    """
+    start = time.monotonic()
+    results: list[RsyncResult] = []
+    errors: list[RsyncFailedError] = []
+    if args.fan_out == "chain":
+        src = args.src
+        for dest in dests:
+            try:
+                results.append(run_rsync(watch, args, src, dest, extra_args))
+            except RsyncFailedError as error:
+                results.append(error.result)
+                errors.append(error)
+                break
+            src = chain_source(args.src, dest)
+
+    elif args.fan_out == "batch":
+        with tempfile.TemporaryDirectory(prefix="rsync-watch-") as batch_dir:
+            batch_file = os.path.join(batch_dir, "batch")
+            try:
+                results.append(
+                    run_rsync(
+                        watch,
+                        args,
+                        args.src,
+                        dests[0],
+                        [*extra_args, f"--write-batch={batch_file}"],
+                    )
+                )
+            except RsyncFailedError as error:
+                results.append(error.result)
+                errors.append(error)
+            else:
+                # The options of the auto-tuner are recorded in the batch file.
+                _run_concurrently(
+                    watch, args, dests[1:], results, errors, filter_args, batch_file
+                )
 
-    if args.dest_user_group:
-        # https://stackoverflow.com/a/62982981
-        # zsh:1: no matches found: --usermap=*:smb
-        escape_star: str = ""
-        if ":" in args.dest:
-            escape_star = "\\"
-        rsync_command += [
-            f"--usermap={escape_star}*:{args.dest_user_group}",
-            f"--groupmap={escape_star}*:{args.dest_user_group}",
+    else:
+        _run_concurrently(watch, args, dests, results, errors, extra_args)
+
+    if errors:
+        raise FanOutFailedError(
+            results, errors, dests[len(results) :], time.monotonic() - start
+        )
+    return results
+
+
+def _run_concurrently(
+    watch: Watch,
+    args: ArgumentsDefault,
+    dests: list[str],
+    results: list[RsyncResult],
+    errors: list[RsyncFailedError],
+    extra_args: typing.Sequence[str] = (),
+    read_batch: Optional[str] = None,
+) -> None:
+    """Append the result of each destination in order to ``results``, the
+    partial one if rsync fails, and the errors to ``errors``."""
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(dests)) as executor:
+        futures = [
+            executor.submit(
+                run_rsync, watch, args, args.src, dest, extra_args, read_batch
+            )
+            for dest in dests
         ]
-
-    if args.exclude:
-        for exclude in args.exclude:
-            rsync_command.append(f"--exclude={exclude}")
-    if args.rsync_args:
-        rsync_command += shlex.split(args.rsync_args)
-    rsync_command += [args.src, args.dest]
-
-    return rsync_command
+    for future in futures:
+        try:
+            results.append(future.result())
+        except RsyncFailedError as error:
+            results.append(error.result)
+            errors.append(error)
+
+
+def format_dests(results: list[RsyncResult]) -> str:
+    """Map the ``dest1_``, ``dest2_`` … prefixes of the aggregated stats to
+    the destinations."""
+    return "\n".join(f"dest{i}: {result.dest}" for i, result in enumerate(results, 1))
+
+
+def sync(
+    watch: Watch,
+    args: ArgumentsDefault,
+    service: str,
+    reporter: QueuedReporter,
+    locked: bool = False,
+) -> None:
+    """Run rsync once per destination, parse the stats and report them.
+
+    :param locked: True if the service lock is held. Only then the
+      snapshots of interrupted runs are removed, without the lock they may
+      belong to a concurrent run.
+    """
+    body: list[str] = []
+
+    tuner: Optional[AutoTuner] = None
+    candidate: Optional[Candidate] = None
+    extra_args: tuple[str, ...] = ()
+    if args.auto_tune:
+        tuner = AutoTuner(os.path.join(args.state_dir, f"{service}.autotune.json"))
+        candidate = tuner.select()
+        extra_args = candidate.rsync_args
+        watch.log.info(f"Auto-tune: {candidate.name}")
+
+    rules = load_rules(args)
+    compiled_rules = compile_rules(rules)
+    if len(compiled_rules) < len(rules):
+        watch.log.info(
+            f"Exclude rules: removed {len(rules) - len(compiled_rules)} "
+            f"of {len(rules)} as duplicate or shadowed"
+        )
+
+    dest: str = args.dest
+    store: Optional[SnapshotStore] = None
+    snapshot: Optional[str] = None
+    if args.snapshot:
+        store = SnapshotStore(args.dest)
+        store.create_base()
+        if locked:
+            for name in store.remove_partial():
+                watch.log.info(f"Removed the interrupted snapshot {name}")
+        previous = store.latest()
+        snapshot = store.claim(datetime.datetime.now(datetime.timezone.utc))
+        dest = store.location_of(snapshot + PARTIAL_SUFFIX)
+        if previous is not None:
+            # A relative --link-dest is relative to the destination.
+            extra_args = (*extra_args, f"--link-dest=../{previous}")
+        watch.log.info(f"Snapshot: {snapshot}, previous snapshot: {previous}")
+
+    stats: Stats
+    results: list[RsyncResult]
+    usage = ResourceUsage.children()
+    try:
+        with tempfile.TemporaryDirectory(prefix="rsync-watch-") as filter_dir:
+            filter_args = build_filter_args(compiled_rules, filter_dir)
+            extra_args = (*filter_args, *extra_args)
+            if args.more_dests:
+                start = time.monotonic()
+                results = fan_out(
+                    watch, args, [args.dest] + args.more_dests, extra_args, filter_args
+                )
+                duration = time.monotonic() - start
+                stats = aggregate_stats([result.stats for result in results], duration)
+                body.append(format_dests(results))
+            else:
+                results = [run_rsync(watch, args, args.src, dest, extra_args)]
+                stats = results[0].stats
+    except RsyncFailedError as error:
+        if tuner is not None and candidate is not None:
+            tuner.record_failure(candidate, error.returncode)
+        failure_body: list[str] = []
+        if isinstance(error, FanOutFailedError):
+            failure_body.append(format_dests(error.results))
+        if "partial" in error.result.stats:
+            failure_body.append(PARTIAL_STATS_MESSAGE)
+        reporter.report(
+            status=2,
+            custom_message=str(error),
+            performance_data=error.result.stats,
+            body="\n\n".join(failure_body) or None,
+        )
+        raise
+    if rules:
+        stats["exclude_rules"] = len(compiled_rules)
+        stats["exclude_rules_removed"] = len(rules) - len(compiled_rules)
+    # The CPU times and counters of this run; the peak RSS can’t be taken
+    # per run, it is the one of any child so far.
+    stats.update((ResourceUsage.children() - usage).performance_data)
+
+    if store is not None and snapshot is not None:
+        store.rename(snapshot + PARTIAL_SUFFIX, snapshot)
+        results[0] = results[0]._replace(dest=store.location_of(snapshot))
+        expired = store.prune(get_retention(args))
+        snapshots = store.snapshots()
+        new_data = ""
+        # Unchanged files are hard-linked, only new data is transferred.
+        # Partial stats without --out-format lines lack the size.
+        if "transferred_size" in stats:
+            stats["snapshot_new_bytes"] = stats["transferred_size"]
+            new_data = f"{stats['transferred_size']} bytes of new data, "
+        stats["snapshots"] = len(snapshots)
+        stats["snapshots_expired"] = len(expired)
+        body.append(
+            f"Snapshot: {snapshot}, {new_data}{len(snapshots)} snapshots"
+            + "".join(f"\n  expired: {name}" for name in expired)
+        )
+    priority = get_priority(args)
+    if priority.is_set:
+        body.append(priority.format())
+
+    # The counters of partial stats are incomplete, they would distort the
+    # history of the auto-tuner and the change rate.
+    if tuner is not None and candidate is not None:
+        if "partial" in stats:
+            tuner.record_failure(candidate, None)
+        else:
+            tuner.record(candidate, stats)
+        body.append(tuner.format(candidate))
+
+    if args.next_run or args.skip_if_not_due:
+        forecaster = get_forecaster(args, service)
+        if "partial" not in stats:
+            # All destinations receive the same changes.
+            forecaster.record(results[0].stats, time.time())
+        forecaster.write_next_run(os.path.join(args.state_dir, f"{service}.next-run"))
+        stats.update(forecaster.performance_data)
+        body.append(forecaster.format())
+        watch.log.info(forecaster.format())
+
+    if args.file_histogram:
+        histogram = FileHistogram(top=args.file_histogram_top)
+        for result in results:
+            histogram.add_output(result.stdout)
+        stats.update(histogram.performance_data)
+        body.append(histogram.format())
+
+    status: Status = 0
+    if "partial" in stats:
+        status = 1
+        body.append(PARTIAL_STATS_MESSAGE)
+
+    if args.verify:
+        verifications: list[VerificationResult] = []
+        for result in results:
+            try:
+                verifications.append(
+                    verify(
+                        result.src,
+                        result.dest,
+                        iter_out_format_lines(result.stdout),
+                        count=args.verify_sample,
+                        sampling=args.verify_sampling,
+                        workers=args.verify_workers,
+                    )
+                )
+            except ValueError as error:
+                watch.log.warning(str(error))
+        verification = merge_results(verifications)
+        stats.update(verification.performance_data)
+        body.append(verification.format())
+        if verification.mismatches or verification.errors:
+            status = 1
+
+    reporter.report(status=status, performance_data=stats, body="\n\n".join(body))
+    watch.log.debug(stats)
 
 
 def main() -> None:
@@ -181,6 +663,16 @@ def main() -> None:
     # A typical chicken-egg-situation.
     parser = get_argparser()
     args = typing.cast(ArgumentsDefault, parser.parse_args())
+    if args.snapshot and args.more_dests:
+        parser.error("--snapshot supports only one destination.")
+    # rsync refuses a remote destination with --read-batch.
+    if args.fan_out == "batch":
+        for dest in args.more_dests:
+            if is_remote_shell_location(dest) or is_daemon_location(dest):
+                parser.error(
+                    f"--fan-out=batch supports only local destinations after the "
+                    f"first one: {dest}"
+                )
 
     host_name: str
     if not args.host_name:
@@ -188,14 +680,55 @@ def main() -> None:
     else:
         host_name = args.host_name
 
-    service = format_service_name(host_name, args.src, args.dest)
+    dests: list[str] = [args.dest] + args.more_dests
+    service = format_service_name(
+        host_name,
+        args.src,
+        args.dest,
+        unique=args.unique_service_name,
+        more_dests=tuple(args.more_dests),
+    )
 
+    # A CommandWatcherError of a failed rsync would be reported right away,
+    # synchronously and without the partial stats. sync() reports it once
+    # through the queued reporter instead.
     watch = Watch(
-        service_name=service, service_display_name=f"rsync {args.src} {args.dest}"
+        service_name=service,
+        service_display_name=f"rsync {args.src} {' '.join(dests)}",
+        raise_exceptions=False,
     )
 
     watch.log.info(f"Service name: {service}")
 
+    delivery = ChannelDelivery(watch, service)
+    reporter = QueuedReporter(
+        delivery,
+        spool_dir=os.path.join(args.state_dir, f"{service}.spool"),
+        retries=args.report_retries,
+        log=watch.log,
+        capture=delivery.capture,
+    )
+    try:
+        check_and_sync(watch, args, service, reporter)
+    finally:
+        spooled = reporter.close(args.report_timeout)
+        if spooled:
+            watch.log.warning(
+                f"{spooled} reports couldn’t be delivered, they are delivered by "
+                "the next run."
+            )
+
+
+def check_and_sync(
+    watch: Watch, args: ArgumentsDefault, service: str, reporter: QueuedReporter
+) -> None:
+    """Run the checks and sync if they have passed."""
+    if args.skip_if_not_due:
+        forecaster = get_forecaster(args, service)
+        if not forecaster.is_due(time.time()):
+            watch.log.info(f"Not due yet. {forecaster.format()}")
+            return
+
     raise_exception: bool = False
     if args.action_check_failed == "exception":
         raise_exception = True
@@ -206,20 +739,28 @@ def main() -> None:
         checks.check_ping(args.check_ping)
     if args.check_ssh_login:
         checks.check_ssh_login(args.check_ssh_login)
+    if args.check_rsync_daemon:
+        checks.check_rsync_daemon(args.check_rsync_daemon)
 
     if not checks.have_passed():
-        watch.report(status=1, custom_message=checks.messages)
+        reporter.report(status=1, custom_message=checks.messages)
         watch.log.info(checks.messages)
-    else:
-        rsync_command: list[str] = build_rsync_command(args)
-
-        watch.log.info(f"Source: {args.src}")
-        watch.log.info(f"Destination: {args.dest}")
-
-        watch.run(rsync_command, ignore_exceptions=args.ignore_exceptions)  # type: ignore
-        stats: typing.Dict[str, int | float] = parse_stats(watch.stdout)
-        watch.report(status=0, performance_data=stats)
-        watch.log.debug(stats)
+        return
+
+    if args.lock_policy == "none":
+        sync(watch, args, service, reporter)
+        return
+
+    lock = ServiceLock(service, args.lock_dir or args.state_dir)
+    if not acquire_lock(watch, lock, args, reporter):
+        return
+    try:
+        sync(watch, args, service, reporter, locked=True)
+        while lock.next_pass():
+            watch.log.info("Performing a coalesced pass.")
+            sync(watch, args, service, reporter, locked=True)
+    finally:
+        lock.release()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,202 @@
+import json
+import os
+import statistics
+import typing
+from typing import Any, Optional
+
+from rsync_watch.stats import Stats
+
+
+class Candidate(typing.NamedTuple):
+    name: str
+    rsync_args: tuple[str, ...]
+
+
+CANDIDATES: tuple[Candidate, ...] = (
+    Candidate("default", ()),
+    Candidate("compress", ("--compress",)),
+    Candidate("compress-zstd", ("--compress", "--compress-choice=zstd")),
+    Candidate("checksum-xxh128", ("--checksum-choice=xxh128",)),
+    Candidate("whole-file", ("--whole-file",)),
+)
+"""The option sets the auto-tuner experiments with. The zstd compression
+and the xxh128 checksum require rsync 3.2 or later on both sides. A
+candidate rsync rejects is excluded from further runs."""
+
+REJECTED_EXIT_CODES: tuple[int, ...] = (1, 2)
+"""The exit codes of rsync for a syntax or usage error and a protocol
+incompatibility: rsync or the remote side doesn’t support an option. Other
+failures, for example a network outage, don’t exclude a candidate."""
+
+MIN_VOLUME: int = 1024**2
+"""The transferred volume in bytes below which runs are compared by their
+duration only. The file list generation dominates such runs."""
+
+
+class AutoTuner:
+    """Select the rsync options of a service based on its run history.
+
+    Each candidate is tried ``samples`` times first. Then the candidate with
+    the lowest mean cost is used. The cost of a run is its duration per MiB
+    of transferred file size, so a run transferring a lot of data, like the
+    initial full copy, doesn’t penalise its candidate. Every
+    ``reexplore_every`` runs the candidate tried least recently is run
+    again, so the choice follows changing conditions.
+
+    The history is stored as JSON in ``state_file``.
+
+    :param state_file: The file path of the history of one service.
+    :param samples: The number of runs per candidate to keep and compare.
+    :param reexplore_every: Re-explore every n-th run.
+    """
+
+    state_file: str
+    samples: int
+    reexplore_every: int
+    runs: int
+    """The number of runs so far."""
+
+    history: dict[str, list[dict[str, float]]]
+    """The last ``samples`` results per candidate name."""
+
+    last_run: dict[str, int]
+    """The number of the run a candidate was last selected in."""
+
+    failed: list[str]
+    """The names of the candidates rsync rejected."""
+
+    pending: Optional[str]
+    """The candidate selected for the current run. It is still set on the
+    next load if the run didn’t finish. Such a candidate is simply selected
+    again, since its results are still missing."""
+
+    def __init__(
+        self, state_file: str, samples: int = 3, reexplore_every: int = 10
+    ) -> None:
+        self.state_file = state_file
+        self.samples = samples
+        self.reexplore_every = reexplore_every
+        self.runs = 0
+        self.history = {}
+        self.last_run = {}
+        self.failed = []
+        self.pending = None
+        self.load()
+
+    def load(self) -> None:
+        if not os.path.exists(self.state_file):
+            return
+        with open(self.state_file) as file:
+            state: dict[str, Any] = json.load(file)
+        self.runs = state.get("runs", 0)
+        self.history = state.get("history", {})
+        self.last_run = state.get("last_run", {})
+        self.failed = state.get("failed", [])
+        self.pending = state.get("pending")
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.state_file) or ".", exist_ok=True)
+        with open(self.state_file, "w") as file:
+            json.dump(
+                {
+                    "runs": self.runs,
+                    "history": self.history,
+                    "last_run": self.last_run,
+                    "failed": self.failed,
+                    "pending": self.pending,
+                },
+                file,
+                indent=2,
+            )
+
+    @property
+    def candidates(self) -> list[Candidate]:
+        """The candidates rsync didn’t reject. The default options are
+        always kept."""
+        return [
+            c for c in CANDIDATES if c.name == "default" or c.name not in self.failed
+        ]
+
+    def mean_cost(self, candidate: Candidate) -> float:
+        """The mean duration in seconds per MiB of transferred file size."""
+        return statistics.fmean(
+            result["duration"]
+            / max(result.get("transferred_size", 0), MIN_VOLUME)
+            * 1024**2
+            for result in self.history[candidate.name]
+        )
+
+    def best(self) -> Optional[Candidate]:
+        """The cheapest candidate of the fully explored ones."""
+        explored = [
+            c
+            for c in self.candidates
+            if len(self.history.get(c.name, [])) >= self.samples
+        ]
+        if not explored:
+            return None
+        return min(explored, key=self.mean_cost)
+
+    def select(self) -> Candidate:
+        """Select the candidate for the next run and mark it as pending.
+
+        :return: The candidate whose ``rsync_args`` are to be used.
+        """
+        self.runs += 1
+        candidates = self.candidates
+        selected: Optional[Candidate] = None
+        for candidate in candidates:
+            if len(self.history.get(candidate.name, [])) < self.samples:
+                selected = candidate
+                break
+        if selected is None:
+            best = self.best() or CANDIDATES[0]
+            others = [c for c in candidates if c != best]
+            if others and self.runs % self.reexplore_every == 0:
+                selected = min(others, key=lambda c: self.last_run.get(c.name, 0))
+            else:
+                selected = best
+        self.last_run[selected.name] = self.runs
+        self.pending = selected.name
+        self.save()
+        return selected
+
+    def record(self, candidate: Candidate, stats: Stats) -> None:
+        """Record the result of a successful run."""
+        results = self.history.setdefault(candidate.name, [])
+        results.append(
+            {
+                "duration": stats["duration"],
+                "transferred_size": stats["transferred_size"],
+                "bytes_sent": stats["bytes_sent"],
+                "literal_data": stats["literal_data"],
+            }
+        )
+        del results[: -self.samples]
+        self.pending = None
+        self.save()
+
+    def record_failure(self, candidate: Candidate, returncode: Optional[int]) -> None:
+        """Record a failed or incomplete run. The candidate is excluded only
+        if rsync rejected its options, see :data:`REJECTED_EXIT_CODES`."""
+        if (
+            returncode in REJECTED_EXIT_CODES
+            and candidate.name != "default"
+            and candidate.name not in self.failed
+        ):
+            self.failed.append(candidate.name)
+        self.pending = None
+        self.save()
+
+    def format(self, selected: Candidate) -> str:
+        """Format the selected candidate and the mean costs as plain
+        text."""
+        args = " ".join(selected.rsync_args) or "no additional arguments"
+        lines: list[str] = [f"Auto-tune: {selected.name} ({args})"]
+        for candidate in self.candidates:
+            if candidate.name in self.history:
+                lines.append(
+                    f"  {candidate.name}: {self.mean_cost(candidate):.3f}s/MiB "
+                    f"(mean of {len(self.history[candidate.name])} runs)"
+                )
+        return "\n".join(lines)
@@ -4,6 +4,8 @@ from typing import List
 
 from command_watcher import CommandWatcherError, Watch
 
+from rsync_watch.daemon import DaemonError, list_modules, parse_daemon_location
+
 
 class ChecksCollection:
     """Collect multiple check results.
@@ -78,6 +80,32 @@ class ChecksCollection:
         else:
             self.watch.log.info(f"--check-ssh-login: '{ssh_host}' is reachable.")
 
+    def check_rsync_daemon(self, location: str) -> None:
+        """Check if a rsync daemon is reachable.
+
+        Only the daemon port is opened and the module list is requested,
+        no rsync process is started. Modules with ``list = no`` don’t
+        appear in the list, so a missing module only logs a warning.
+
+        :param location: A rsync daemon location in the form of:
+          `rsync://[USER@]HOST[:PORT]/MODULE` or `[USER@]HOST::MODULE`
+        """
+        try:
+            daemon = parse_daemon_location(location)
+            modules = list_modules(daemon.host, daemon.port)
+        except (ValueError, OSError, DaemonError) as error:
+            self._log_fail(
+                f"--check-rsync-daemon: '{location}' is not reachable ({error})."
+            )
+            return
+        if daemon.module and daemon.module not in modules:
+            self.watch.log.warning(
+                f"--check-rsync-daemon: The module '{daemon.module}' isn’t "
+                f"listed by '{daemon.host}:{daemon.port}', it may be unlisted "
+                "(list = no)."
+            )
+        self.watch.log.info(f"--check-rsync-daemon: '{location}' is reachable.")
+
     def have_passed(self) -> bool:
         """
         :return: True in fall checks have passed else false.
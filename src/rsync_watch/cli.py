@@ -1,26 +1,79 @@
 import argparse
+import os
 from argparse import ArgumentParser, Namespace
 from importlib import metadata
 from typing import Any, Literal, Optional, Sequence
 
+from rsync_watch.lock import LockPolicy
+from rsync_watch.priority import IoniceClass
+from rsync_watch.verify import Sampling
+
 __version__: str = metadata.version("rsync_watch")
 
 
 class ArgumentsDefault:
     host_name: str
+    unique_service_name: bool
     dest_user_group: Optional[str]
     exclude: Optional[list[str]]
+    exclude_from: Optional[list[str]]
     ignore_exceptions: list[int]
     rsync_args: Optional[str]
+    password_file: Optional[str]
+    file_histogram: bool
+    file_histogram_top: int
+    auto_tune: bool
+    verify: bool
+    verify_sample: int
+    verify_sampling: Sampling
+    verify_workers: int
+    state_dir: str
+
+    # Priority
+    nice: Optional[int]
+    ionice_class: Optional[IoniceClass]
+    ionice_level: Optional[int]
+    cgroup: Optional[str]
+    cgroup_cpu_weight: Optional[int]
+    cgroup_io_weight: Optional[int]
+    cgroup_cpu_max: Optional[int]
+    cgroup_io_max: Optional[str]
+
+    # Snapshot
+    snapshot: bool
+    keep_last: int
+    keep_daily: int
+    keep_weekly: int
+    keep_monthly: int
+
+    # Schedule
+    next_run: bool
+    skip_if_not_due: bool
+    min_interval: int
+    max_interval: int
+    target_change: int
+
+    # Report
+    report_timeout: float
+    report_retries: int
+
+    # Lock
+    lock_policy: LockPolicy
+    lock_timeout: Optional[float]
+    lock_dir: Optional[str]
 
     # Checks
     action_check_failed: Optional[Literal["exception", "skip"]]
     check_file: Optional[str]
     check_ping: Optional[str]
     check_ssh_login: Optional[str]
+    check_rsync_daemon: Optional[str]
+
+    fan_out: Literal["parallel", "chain", "batch"]
 
     src: str
     dest: str
+    more_dests: list[str]
 
 
 class CommaListAction(argparse.Action):
@@ -56,6 +109,14 @@ def get_argparser() -> ArgumentParser:
         help="The hostname to submit over NSCA to the monitoring.",
     )
 
+    parser.add_argument(
+        "--unique-service-name",
+        action="store_true",
+        help="Append a hash of the host name, the source and the "
+        "destination to the service name. Without it, for example the "
+        "sources “a/b” and “a-b” result in the same service name.",
+    )
+
     parser.add_argument(
         "--dest-user-group",
         metavar="USER_GROUP_NAME",
@@ -69,6 +130,17 @@ def get_argparser() -> ArgumentParser:
         help="See the documention of --exclude in the rsync manual.",
     )
 
+    parser.add_argument(
+        "--exclude-from",
+        metavar="FILE",
+        action="append",
+        help="Read exclude rules from a file, one per line. Lines starting "
+        "with “+ ” are include rules. Blank lines and lines starting with “#” "
+        "or “;” are ignored. The rules of --exclude come first. Duplicate rules "
+        "and rules below an excluded directory are removed. Many rules are "
+        "passed to rsync in a temporary --exclude-from file.",
+    )
+
     parser.add_argument(
         "--ignore-exceptions",
         action=CommaListAction,
@@ -84,6 +156,320 @@ def get_argparser() -> ArgumentParser:
         "--rsync-args '--exclude \"this folder\"'",
     )
 
+    parser.add_argument(
+        "--password-file",
+        metavar="FILE_PATH",
+        help="The password file to authenticate against a rsync daemon "
+        "(rsync:// or HOST::MODULE). The file must not be readable by others.",
+    )
+
+    parser.add_argument(
+        "--file-histogram",
+        action="store_true",
+        help="Let rsync print the size and the transferred bytes of each "
+        "file (using --out-format) and report a histogram of the transferred "
+        "files by size class and the largest transferred files.",
+    )
+
+    parser.add_argument(
+        "--file-histogram-top",
+        metavar="COUNT",
+        type=int,
+        default=10,
+        help="The number of largest transferred files to list in the "
+        "histogram (default: %(default)s).",
+    )
+
+    parser.add_argument(
+        "--auto-tune",
+        action="store_true",
+        help="Experiment with compression, checksum and whole-file options "
+        "across runs, record the duration per transferred MiB per service "
+        "and converge on the fastest combination.",
+    )
+
+    parser.add_argument(
+        "--state-dir",
+        metavar="DIRECTORY",
+        default=os.path.join(
+            os.environ.get("XDG_STATE_HOME", os.path.expanduser("~/.local/state")),
+            "rsync-watch",
+        ),
+        help="The directory to store the run history in (default: "
+        "$XDG_STATE_HOME/rsync-watch or ~/.local/state/rsync-watch).",
+    )
+
+    parser.add_argument(
+        "--fan-out",
+        choices=("parallel", "chain", "batch"),
+        default="parallel",
+        help="How to sync to multiple destinations: “parallel” syncs the "
+        "source to all destinations concurrently, “chain” syncs each "
+        "destination from the previous one, so the source is walked only "
+        "once, “batch” syncs the first destination with --write-batch and "
+        "applies the batch to the other (identical, local) destinations "
+        "concurrently with --read-batch, so the deltas are computed only "
+        "once. The stats of each destination and the aggregated stats are "
+        "reported.",
+    )
+
+    # verification
+
+    verification = parser.add_argument_group(
+        title="verification",
+        description="Verify a sample of the transferred files after the sync "
+        "by comparing their SHA-256 checksums on both sides. Remote files are "
+        "hashed using one SSH command (sha256sum is required on the remote "
+        "host). The SSH options of --rsync-args -e aren’t used, configure "
+        "the host in ~/.ssh/config instead. If a side can’t be hashed at all, "
+        "for example if the host isn’t reachable, an error is reported "
+        "instead of mismatches.",
+    )
+
+    verification.add_argument(
+        "--verify",
+        action="store_true",
+        help="Enable the verification.",
+    )
+
+    verification.add_argument(
+        "--verify-sample",
+        metavar="COUNT",
+        type=int,
+        default=20,
+        help="The number of files to verify (default: %(default)s).",
+    )
+
+    verification.add_argument(
+        "--verify-sampling",
+        choices=("random", "size"),
+        default="random",
+        help="Select the files randomly or weighted by their size, so large "
+        "files are more likely to be verified (default: %(default)s).",
+    )
+
+    verification.add_argument(
+        "--verify-workers",
+        metavar="COUNT",
+        type=int,
+        default=4,
+        help="The number of threads hashing local files (default: %(default)s).",
+    )
+
+    # priority
+
+    priority = parser.add_argument_group(
+        title="priority",
+        description="Start the rsync process with a lower CPU and I/O "
+        "priority. The settings are applied by rsync-watch in the child "
+        "process before rsync is executed. The resource usage of rsync is "
+        "reported as performance data.",
+    )
+
+    priority.add_argument(
+        "--nice",
+        metavar="INCREMENT",
+        type=int,
+        help="Increment the niceness of rsync, see nice(1).",
+    )
+
+    priority.add_argument(
+        "--ionice-class",
+        choices=("realtime", "best-effort", "idle"),
+        help="The I/O scheduling class of rsync, see ionice(1).",
+    )
+
+    priority.add_argument(
+        "--ionice-level",
+        metavar="LEVEL",
+        type=int,
+        choices=range(8),
+        help="The I/O scheduling level of the classes “realtime” and "
+        "“best-effort”: 0 (highest) to 7 (lowest).",
+    )
+
+    priority.add_argument(
+        "--cgroup",
+        metavar="PATH",
+        help="Run rsync in this cgroup v2 (relative to /sys/fs/cgroup). The "
+        "cgroup is created if it doesn’t exist. It has to be delegated to the "
+        "user running rsync-watch.",
+    )
+
+    priority.add_argument(
+        "--cgroup-cpu-weight",
+        metavar="WEIGHT",
+        type=int,
+        help="The cpu.weight of the cgroup: 1 to 10000 (default 100).",
+    )
+
+    priority.add_argument(
+        "--cgroup-io-weight",
+        metavar="WEIGHT",
+        type=int,
+        help="The io.weight of the cgroup: 1 to 10000 (default 100).",
+    )
+
+    priority.add_argument(
+        "--cgroup-cpu-max",
+        metavar="PERCENT",
+        type=int,
+        help="Limit the CPU usage of the cgroup to this percentage of one CPU "
+        "(cpu.max).",
+    )
+
+    priority.add_argument(
+        "--cgroup-io-max",
+        metavar="LIMITS",
+        help="The io.max limits of the cgroup, for example "
+        "“8:0 rbps=10485760 wbps=10485760”.",
+    )
+
+    # snapshot
+
+    snapshot = parser.add_argument_group(
+        title="snapshot",
+        description="Keep point-in-time backups: every run syncs into a new "
+        "directory DEST/YYYY-MM-DDTHH-MM-SSZ (UTC). Unchanged files are "
+        "hard-linked to the previous snapshot (--link-dest), so a snapshot only "
+        "needs the space of the changed files. DEST has to be a local or remote "
+        "shell (SSH) location. A snapshot is kept if any of the --keep-* options "
+        "selects it; without them all snapshots are kept. The snapshots of "
+        "interrupted runs are removed only with a --lock-policy.",
+    )
+
+    snapshot.add_argument(
+        "--snapshot",
+        action="store_true",
+        help="Sync into a new snapshot directory.",
+    )
+
+    for period, text in (
+        ("last", "the latest N snapshots"),
+        ("daily", "the latest snapshot of each of the last N days"),
+        ("weekly", "the latest snapshot of each of the last N weeks"),
+        ("monthly", "the latest snapshot of each of the last N months"),
+    ):
+        snapshot.add_argument(
+            f"--keep-{period}",
+            metavar="N",
+            type=int,
+            default=0,
+            help=f"Keep {text}.",
+        )
+
+    # schedule
+
+    schedule = parser.add_argument_group(
+        title="schedule",
+        description="Learn the change rate of the source from the transferred "
+        "bytes and forecast the time of the next run: quiet sources are synced "
+        "rarely, busy ones often. The next run is written as an ISO 8601 "
+        "timestamp to STATE_DIR/SERVICE.next-run, for example for a timer. Or "
+        "start rsync-watch frequently with --skip-if-not-due.",
+    )
+
+    schedule.add_argument(
+        "--next-run",
+        action="store_true",
+        help="Forecast the next run.",
+    )
+
+    schedule.add_argument(
+        "--skip-if-not-due",
+        action="store_true",
+        help="Exit without syncing if the forecasted next run hasn’t been "
+        "reached yet. Implies --next-run.",
+    )
+
+    schedule.add_argument(
+        "--min-interval",
+        metavar="SECONDS",
+        type=int,
+        default=300,
+        help="The minimum time between two runs (default: %(default)s).",
+    )
+
+    schedule.add_argument(
+        "--max-interval",
+        metavar="SECONDS",
+        type=int,
+        default=86400,
+        help="The maximum time between two runs (default: %(default)s).",
+    )
+
+    schedule.add_argument(
+        "--target-change",
+        metavar="BYTES",
+        type=int,
+        default=100 * 1024**2,
+        help="The amount of changed data a run should transfer (default: %(default)s).",
+    )
+
+    # report
+
+    report = parser.add_argument_group(
+        title="report",
+        description="The reports are delivered to the monitoring in the "
+        "background, so a slow or unreachable monitoring doesn’t delay the "
+        "sync. Reports that can’t be delivered are stored in the state "
+        "directory and delivered by the next run. Each report channel "
+        "(e-mail, Icinga) is retried separately, so a channel that has "
+        "already got a report doesn’t get it again.",
+    )
+
+    report.add_argument(
+        "--report-timeout",
+        metavar="SECONDS",
+        type=float,
+        default=10,
+        help="The maximum time to wait for the delivery of the reports before "
+        "exiting (default: %(default)s).",
+    )
+
+    report.add_argument(
+        "--report-retries",
+        metavar="COUNT",
+        type=int,
+        default=3,
+        help="The number of retries of a failed delivery, with exponential "
+        "backoff starting at one second (default: %(default)s).",
+    )
+
+    # lock
+
+    lock = parser.add_argument_group(
+        title="lock",
+        description="Prevent overlapping runs of the same service (same host "
+        "name, source and destination).",
+    )
+
+    lock.add_argument(
+        "--lock-policy",
+        choices=("none", "skip", "wait", "coalesce"),
+        default="none",
+        help="What to do if another instance of the same service is running: "
+        "“skip” this run, “wait” for the other instance to finish or "
+        "“coalesce” into the running instance, which then performs one more "
+        "pass when it finishes. Skipped and coalesced runs are reported.",
+    )
+
+    lock.add_argument(
+        "--lock-timeout",
+        metavar="SECONDS",
+        type=float,
+        help="Maximum time to wait for the lock when using “--lock-policy "
+        "wait”. Wait forever if not specified.",
+    )
+
+    lock.add_argument(
+        "--lock-dir",
+        metavar="DIRECTORY",
+        help="The directory to store the lock files in (default: the "
+        "--state-dir). Don’t use a world-writable directory like /tmp: other "
+        "users could hold the lock.",
+    )
+
     # checks
 
     checks = parser.add_argument_group(
@@ -119,6 +505,16 @@ def get_argparser() -> ArgumentParser:
         "or “root@example.com” or “example.com”.",
     )
 
+    checks.add_argument(
+        "--check-rsync-daemon",
+        metavar="RSYNC_URL",
+        help="Check if a rsync daemon is reachable by opening its port and "
+        "requesting the module list. A module of the URL that isn’t listed "
+        "(list = no) only logs a warning. "
+        "RSYNC_URL: “rsync://example.com/module” or "
+        "“rsync://user@example.com:873/module” or “example.com::module”.",
+    )
+
     parser.add_argument(
         "-v",
         "--version",
@@ -130,4 +526,11 @@ def get_argparser() -> ArgumentParser:
 
     parser.add_argument("dest", help="The destination ([[USER@]HOST:]DEST)")
 
+    parser.add_argument(
+        "more_dests",
+        metavar="DEST",
+        nargs="*",
+        help="More destinations to sync the source to (see --fan-out).",
+    )
+
     return parser
@@ -0,0 +1,97 @@
+import socket
+import typing
+from typing import Optional
+from urllib.parse import urlsplit
+
+DEFAULT_PORT: int = 873
+
+PROTOCOL_VERSION: str = "30.0"
+"""The protocol version announced to the daemon. Version 30 doesn’t
+require the daemon authentication digest negotiation of newer versions."""
+
+
+class DaemonLocation(typing.NamedTuple):
+    host: str
+    port: int
+    module: str
+    user: Optional[str]
+
+
+class DaemonError(Exception):
+    """Raised when the rsync daemon answers with an error."""
+
+
+def is_daemon_location(location: str) -> bool:
+    """Check if a rsync source or destination refers to a rsync daemon:
+    ``rsync://[USER@]HOST[:PORT]/MODULE[/PATH]`` or
+    ``[USER@]HOST::MODULE[/PATH]``."""
+    if location.startswith("rsync://"):
+        return True
+    host, separator, _ = location.partition("::")
+    return bool(separator) and "/" not in host
+
+
+def is_remote_shell_location(location: str) -> bool:
+    """Check if a rsync source or destination is accessed over a remote
+    shell (SSH): ``[USER@]HOST:PATH``."""
+    if is_daemon_location(location):
+        return False
+    host, separator, _ = location.partition(":")
+    return bool(separator) and "/" not in host
+
+
+def parse_daemon_location(location: str) -> DaemonLocation:
+    """Split a rsync daemon location into its parts.
+
+    :param location: ``rsync://[USER@]HOST[:PORT]/MODULE[/PATH]`` or
+      ``[USER@]HOST::MODULE[/PATH]``
+
+    :raise ValueError: If the location doesn’t refer to a rsync daemon.
+    """
+    if location.startswith("rsync://"):
+        url = urlsplit(location)
+        if not url.hostname:
+            raise ValueError(f"No host found in '{location}'.")
+        return DaemonLocation(
+            url.hostname,
+            url.port or DEFAULT_PORT,
+            url.path.strip("/").split("/")[0],
+            url.username,
+        )
+    if not is_daemon_location(location):
+        raise ValueError(f"'{location}' is not a rsync daemon location.")
+    host, _, path = location.partition("::")
+    user: Optional[str] = None
+    if "@" in host:
+        user, _, host = host.rpartition("@")
+    return DaemonLocation(host, DEFAULT_PORT, path.split("/")[0], user)
+
+
+def list_modules(host: str, port: int = DEFAULT_PORT, timeout: float = 10) -> list[str]:
+    """List the modules of a rsync daemon using the daemon protocol
+    directly, without starting a rsync process.
+
+    :return: The names of the listable modules.
+
+    :raise OSError: If the daemon is not reachable.
+    :raise DaemonError: If the daemon answers with an error or with
+      something that isn’t the rsync daemon protocol.
+    """
+    with socket.create_connection((host, port), timeout=timeout) as connection:
+        stream = connection.makefile("rwb")
+        greeting = stream.readline().decode("utf-8", "replace")
+        if not greeting.startswith("@RSYNCD: "):
+            raise DaemonError(f"Unexpected greeting: {greeting.strip()}")
+        # An empty module name requests the module list.
+        stream.write(f"@RSYNCD: {PROTOCOL_VERSION}\n\n".encode())
+        stream.flush()
+        modules: list[str] = []
+        for raw_line in stream:
+            line = raw_line.decode("utf-8", "replace").rstrip("\r\n")
+            if line.startswith("@RSYNCD: EXIT"):
+                break
+            if line.startswith("@ERROR"):
+                raise DaemonError(line)
+            if "\t" in line:
+                modules.append(line.split("\t", 1)[0].strip())
+        return modules
@@ -0,0 +1,152 @@
+"""Compile the include and exclude rules of a job into a minimal rule list.
+
+rsync checks every file name against the rules in order until one
+matches, so redundant rules cost time during the file list generation.
+"""
+
+import fnmatch
+import os
+import typing
+from collections.abc import Iterable
+from typing import Optional
+
+INLINE_RULES_MAX: int = 16
+"""Up to this number of rules is passed as ``--exclude`` and ``--include``
+arguments, more rules are written to a file passed with
+``--exclude-from``."""
+
+
+class Rule(typing.NamedTuple):
+    include: bool
+    pattern: str
+
+    @property
+    def anchored(self) -> bool:
+        return self.pattern.startswith("/")
+
+    @property
+    def segments(self) -> list[str]:
+        return self.pattern.strip("/").split("/")
+
+    def format(self) -> str:
+        """Format the rule with an explicit ``+`` or ``-`` prefix, which
+        rsync understands in ``--exclude-from`` files."""
+        return f"{'+' if self.include else '-'} {self.pattern}"
+
+
+def parse_rule(line: str, comments: bool = False) -> Optional[Rule]:
+    """Parse an exclude rule the way rsync does for ``--exclude`` and
+    ``--exclude-from``: an optional ``+ `` or ``- `` prefix followed by the
+    pattern.
+
+    :param comments: Skip lines starting with ``#`` or ``;``. rsync does
+      this only in rule files, ``--exclude=#recycle`` is a pattern.
+
+    :return: None for blank lines and comments.
+    """
+    line = line.rstrip("\r\n")
+    if not line or (comments and line.startswith(("#", ";"))):
+        return None
+    if line.startswith("+ "):
+        return Rule(True, line[2:])
+    if line.startswith("- "):
+        return Rule(False, line[2:])
+    return Rule(False, line)
+
+
+def parse_rules(lines: Iterable[str], comments: bool = False) -> list[Rule]:
+    """Parse the rules of a rule file or the ``--exclude`` arguments. The
+    ``!`` token clears the rules parsed so far.
+
+    :param comments: Skip comments, see :func:`parse_rule`.
+    """
+    rules: list[Rule] = []
+    for line in lines:
+        if line.rstrip("\r\n") == "!":
+            rules.clear()
+            continue
+        rule = parse_rule(line, comments)
+        if rule is not None:
+            rules.append(rule)
+    return rules
+
+
+def read_rule_file(path: str) -> list[Rule]:
+    """Read a rule file, skipping comments."""
+    with open(path) as file:
+        return parse_rules(file, comments=True)
+
+
+def _segment_matches(pattern: str, segment: str) -> bool:
+    if any(char in segment for char in "*?["):
+        return pattern == segment
+    return fnmatch.fnmatchcase(segment, pattern)
+
+
+def is_shadowed(rule: Rule, parent: Rule) -> bool:
+    """Check if ``parent`` excludes a directory ``rule`` can only match
+    below. rsync doesn’t descend into excluded directories, so such a rule
+    never matches anything.
+
+    Patterns with ``**`` or backslash escapes are never considered as
+    parent, since they can match across directory boundaries.
+    """
+    if parent.include or "**" in parent.pattern or "\\" in parent.pattern:
+        return False
+    if parent.anchored and not rule.anchored:
+        return False
+    patterns = parent.segments
+    segments = rule.segments
+    # The proper directory prefixes of the rule pattern.
+    for end in range(len(patterns), len(segments)):
+        start = end - len(patterns)
+        if parent.anchored and start != 0:
+            break
+        if all(
+            _segment_matches(pattern, segment)
+            for pattern, segment in zip(patterns, segments[start:end])
+        ):
+            return True
+    return False
+
+
+def compile_rules(rules: Iterable[Rule]) -> list[Rule]:
+    """Remove duplicate rules and rules shadowed by an exclude rule of a
+    parent directory.
+
+    Only the first occurrence of a rule can match. An exclude rule can
+    shadow other rules only if no include rule precedes it, since an
+    include rule like ``+ */`` could match the directory first.
+    """
+    unique: list[Rule] = list(dict.fromkeys(rules))
+    parents: list[Rule] = []
+    for rule in unique:
+        if rule.include:
+            break
+        parents.append(rule)
+    return [
+        rule
+        for rule in unique
+        if not any(is_shadowed(rule, parent) for parent in parents)
+    ]
+
+
+def write_rule_file(rules: Iterable[Rule], path: str) -> None:
+    with open(path, "w") as file:
+        for rule in rules:
+            file.write(f"{rule.format()}\n")
+
+
+def build_filter_args(rules: list[Rule], directory: str) -> list[str]:
+    """Build the rsync arguments passing the rules.
+
+    :param directory: The directory to write the rule file to if there are
+      more than :data:`INLINE_RULES_MAX` rules.
+    """
+    if len(rules) > INLINE_RULES_MAX:
+        path = os.path.join(directory, "filter.rules")
+        write_rule_file(rules, path)
+        return [f"--exclude-from={path}"]
+    return [
+        f"--{'include' if rule.include else 'exclude'}={rule.pattern}" for rule in rules
+    ]
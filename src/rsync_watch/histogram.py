@@ -0,0 +1,158 @@
+import bisect
+import heapq
+import re
+from collections.abc import Iterator
+
+OUT_FORMAT_PREFIX: str = "rsync-watch-file: "
+"""Prefix of the lines printed by rsync using :data:`OUT_FORMAT`. It
+separates these lines from the other output of rsync."""
+
+OUT_FORMAT: str = f"{OUT_FORMAT_PREFIX}%i %l %b %n"
+"""The ``--out-format`` of rsync: itemized changes, the length of the file,
+the bytes actually transferred and the file name."""
+
+_LINE: re.Pattern[str] = re.compile(
+    rf"^{re.escape(OUT_FORMAT_PREFIX)}(?P<itemize>\S+) (?P<size>[\d,.']+) "
+    r"(?P<transferred>[\d,.']+) (?P<name>.*?)\r?$",
+    re.MULTILINE,
+)
+
+SIZE_CLASSES: tuple[tuple[str, int], ...] = (
+    ("lt_1k", 1024),
+    ("lt_16k", 16 * 1024),
+    ("lt_256k", 256 * 1024),
+    ("lt_4m", 4 * 1024**2),
+    ("lt_64m", 64 * 1024**2),
+    ("lt_1g", 1024**3),
+)
+"""The upper bounds (exclusive) of the size classes. Larger files are
+counted in the class ``ge_1g``."""
+
+_BOUNDS: list[int] = [bound for _, bound in SIZE_CLASSES]
+
+_LABELS: list[str] = [label for label, _ in SIZE_CLASSES] + ["ge_1g"]
+
+
+class OutFormatLine:
+    """A file line printed by rsync using :data:`OUT_FORMAT`."""
+
+    itemize: str
+    """The itemized changes, for example ``>f+++++++++``."""
+
+    size: int
+    """The length of the file in bytes."""
+
+    transferred: int
+    """The number of bytes actually transferred."""
+
+    name: str
+
+    def __init__(self, itemize: str, size: int, transferred: int, name: str) -> None:
+        self.itemize = itemize
+        self.size = size
+        self.transferred = transferred
+        self.name = name
+
+    @property
+    def is_file(self) -> bool:
+        """True for regular files, false for directories, links, devices
+        and deletions."""
+        return len(self.itemize) > 1 and self.itemize[1] == "f"
+
+    @property
+    def is_transferred(self) -> bool:
+        """True for regular files sent (``<``) or received (``>``), false
+        for attribute-only changes (``.``), hard links (``h``) and local
+        changes (``c``)."""
+        return self.is_file and self.itemize[0] in "<>"
+
+
+def iter_out_format_lines(stdout: str) -> Iterator[OutFormatLine]:
+    """Iterate over the lines printed by rsync using :data:`OUT_FORMAT`
+    without splitting the whole output into a list."""
+    for match in _LINE.finditer(stdout):
+        yield OutFormatLine(
+            match["itemize"],
+            int(re.sub(r"\D", "", match["size"])),
+            int(re.sub(r"\D", "", match["transferred"])),
+            match["name"],
+        )
+
+
+class FileHistogram:
+    """A histogram of the transferred regular files bucketed by file size.
+
+    The memory usage is constant: only the fixed buckets and the ``top``
+    largest files are kept.
+
+    :param top: The number of largest transferred files to keep.
+    """
+
+    top: int
+    counts: list[int]
+    """The number of files per size class."""
+
+    transferred: list[int]
+    """The bytes transferred per size class."""
+
+    _largest: list[tuple[int, int, str]]
+    """A min heap of (size, transferred, name)."""
+
+    def __init__(self, top: int = 10) -> None:
+        self.top = top
+        self.counts = [0] * len(_LABELS)
+        self.transferred = [0] * len(_LABELS)
+        self._largest = []
+
+    @classmethod
+    def from_output(cls, stdout: str, top: int = 10) -> "FileHistogram":
+        histogram = cls(top)
+        histogram.add_output(stdout)
+        return histogram
+
+    def add_output(self, stdout: str) -> None:
+        """Add all transferred regular files of the output of an rsync
+        process."""
+        for line in iter_out_format_lines(stdout):
+            if line.is_transferred:
+                self.add(line.size, line.transferred, line.name)
+
+    def add(self, size: int, transferred: int, name: str) -> None:
+        index = bisect.bisect_right(_BOUNDS, size)
+        self.counts[index] += 1
+        self.transferred[index] += transferred
+        if self.top <= 0:
+            return
+        item = (size, transferred, name)
+        if len(self._largest) < self.top:
+            heapq.heappush(self._largest, item)
+        elif item > self._largest[0]:
+            heapq.heapreplace(self._largest, item)
+
+    @property
+    def largest(self) -> list[tuple[int, int, str]]:
+        """The largest transferred files as (size, transferred, name),
+        the largest first."""
+        return sorted(self._largest, reverse=True)
+
+    @property
+    def performance_data(self) -> dict[str, int]:
+        """For example ``histogram_files_lt_1k`` and
+        ``histogram_bytes_lt_1k``."""
+        data: dict[str, int] = {}
+        for label, count, transferred in zip(_LABELS, self.counts, self.transferred):
+            data[f"histogram_files_{label}"] = count
+            data[f"histogram_bytes_{label}"] = transferred
+        return data
+
+    def format(self) -> str:
+        """Format the histogram as a plain text table."""
+        lines: list[str] = ["Size class   Files  Bytes transferred"]
+        for label, count, transferred in zip(_LABELS, self.counts, self.transferred):
+            lines.append(f"{label:<10} {count:>7}  {transferred:>17}")
+        if self._largest:
+            lines.append("")
+            lines.append(f"Largest transferred files (top {self.top}):")
+            for size, transferred, name in self.largest:
+                lines.append(f"{size:>15} {transferred:>15}  {name}")
+        return "\n".join(lines)
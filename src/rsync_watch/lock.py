@@ -0,0 +1,107 @@
+import fcntl
+import os
+import time
+from typing import IO, Literal, Optional
+
+LockPolicy = Literal["none", "skip", "wait", "coalesce"]
+
+
+class ServiceLock:
+    """An advisory lock (``flock``) on a lock file named after the service.
+
+    A second file, the *pending marker*, is used by the ``coalesce`` policy:
+    a run that finds the lock held leaves the marker behind and the instance
+    holding the lock performs one more pass when it finishes.
+
+    :param service_name: The service name as returned by
+      :func:`rsync_watch.format_service_name`.
+    :param lock_dir: The directory to store the lock files in.
+    """
+
+    service_name: str
+    lock_file: str
+    pending_file: str
+    _file: Optional[IO[str]]
+
+    def __init__(self, service_name: str, lock_dir: str) -> None:
+        self.service_name = service_name
+        self.lock_file = os.path.join(lock_dir, f"{service_name}.lock")
+        self.pending_file = os.path.join(lock_dir, f"{service_name}.pending")
+        self._file = None
+
+    @property
+    def locked(self) -> bool:
+        """True if this instance holds the lock."""
+        return self._file is not None
+
+    def acquire(self, timeout: Optional[float] = 0, interval: float = 0.5) -> bool:
+        """Try to acquire the lock.
+
+        :param timeout: Seconds to wait for the lock. ``0`` returns
+          immediately, ``None`` waits forever.
+        :param interval: Seconds between two attempts while waiting.
+
+        :return: True if the lock has been acquired.
+        """
+        if self._file is not None:
+            return True
+        os.makedirs(os.path.dirname(self.lock_file) or ".", exist_ok=True)
+        file = open(self.lock_file, "a")
+        deadline: Optional[float] = None
+        if timeout is not None:
+            deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                if deadline is not None and time.monotonic() >= deadline:
+                    file.close()
+                    return False
+                time.sleep(interval)
+            else:
+                self._file = file
+                return True
+
+    def release(self) -> None:
+        """Release the lock if this instance holds it."""
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+    def request_pass(self) -> None:
+        """Ask the instance holding the lock to perform one more pass."""
+        with open(self.pending_file, "w") as file:
+            file.write(f"{os.getpid()}\n")
+
+    def consume_pending(self) -> bool:
+        """Remove the pending marker.
+
+        :return: True if a further pass has been requested.
+        """
+        try:
+            os.remove(self.pending_file)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def next_pass(self) -> bool:
+        """Decide, after a finished pass, whether another pass is required.
+
+        The pending marker is checked twice: once while holding the lock and
+        once after releasing it. The second check closes the window in which
+        a coalescing run writes its marker just after the first check and
+        then fails to get the lock because it isn’t released yet. In that
+        case whichever instance gets the lock first performs the pass.
+
+        :return: True if the lock is held (again) and another pass has to be
+          performed. False if the lock has been released.
+        """
+        if self.consume_pending():
+            return True
+        self.release()
+        if os.path.exists(self.pending_file) and self.acquire():
+            if self.consume_pending():
+                return True
+            self.release()
+        return False
@@ -0,0 +1,191 @@
+"""Start the rsync process with a lower CPU and I/O priority.
+
+The settings are applied in the child process before rsync is executed
+(``preexec_fn`` of :class:`subprocess.Popen`), so rsync-watch itself keeps
+its priority and no wrapper commands like ``nice`` or ``ionice`` are
+required.
+"""
+
+import ctypes
+import os
+import platform
+import typing
+from collections.abc import Callable
+from typing import Literal, Optional
+
+IoniceClass = Literal["realtime", "best-effort", "idle"]
+
+IONICE_CLASSES: dict[IoniceClass, int] = {"realtime": 1, "best-effort": 2, "idle": 3}
+
+_IOPRIO_WHO_PROCESS: int = 1
+
+_IOPRIO_CLASS_SHIFT: int = 13
+
+_SYS_IOPRIO_SET: dict[str, int] = {
+    "x86_64": 251,
+    "i386": 289,
+    "i686": 289,
+    "aarch64": 30,
+    "arm64": 30,
+    "armv7l": 314,
+    "ppc64le": 273,
+    "s390x": 282,
+    "riscv64": 30,
+}
+"""The number of the ``ioprio_set`` system call per machine architecture.
+The Python standard library doesn’t provide this system call."""
+
+CGROUP_ROOT: str = "/sys/fs/cgroup"
+
+
+class Priority(typing.NamedTuple):
+    nice: Optional[int] = None
+    """The niceness increment, see ``nice(1)``."""
+
+    ionice_class: Optional[IoniceClass] = None
+
+    ionice_level: Optional[int] = None
+    """0 (highest) to 7 (lowest) for the classes ``realtime`` and
+    ``best-effort``."""
+
+    cgroup: Optional[str] = None
+    """A cgroup v2 path relative to :data:`CGROUP_ROOT`."""
+
+    cgroup_cpu_weight: Optional[int] = None
+    """``cpu.weight``: 1 to 10000, the default is 100."""
+
+    cgroup_io_weight: Optional[int] = None
+    """``io.weight``: 1 to 10000, the default is 100."""
+
+    cgroup_cpu_max: Optional[int] = None
+    """``cpu.max`` in percent of one CPU."""
+
+    cgroup_io_max: Optional[str] = None
+    """``io.max``, for example ``8:0 rbps=10485760 wbps=10485760``."""
+
+    @property
+    def is_set(self) -> bool:
+        return any(value is not None for value in self)
+
+    def format(self) -> str:
+        parts: list[str] = []
+        if self.nice is not None:
+            parts.append(f"nice {self.nice}")
+        if self.ionice_class is not None:
+            level = f" {self.ionice_level}" if self.ionice_level is not None else ""
+            parts.append(f"ionice {self.ionice_class}{level}")
+        if self.cgroup is not None:
+            parts.append(f"cgroup {self.cgroup}")
+        return "Priority: " + ", ".join(parts)
+
+
+def resolve_ioprio_set() -> Callable[[IoniceClass, int], None]:
+    """Resolve the ``ioprio_set`` system call.
+
+    The symbols of the running program already contain ``syscall()`` of
+    libc, so no library has to be searched (:func:`ctypes.util.find_library`
+    runs ``ldconfig`` in a subprocess).
+
+    :return: A function setting the I/O scheduling class and level of the
+      calling process. It raises :class:`OSError` if the system call fails.
+
+    :raise OSError: If the system call is unknown on this architecture.
+    """
+    number = _SYS_IOPRIO_SET.get(platform.machine())
+    if number is None:
+        raise OSError(f"ioprio_set is not supported on {platform.machine()}")
+    syscall = ctypes.CDLL(None, use_errno=True).syscall
+
+    def ioprio_set(ionice_class: IoniceClass, level: int) -> None:
+        value = (IONICE_CLASSES[ionice_class] << _IOPRIO_CLASS_SHIFT) | level
+        if syscall(number, _IOPRIO_WHO_PROCESS, 0, value) == -1:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+    return ioprio_set
+
+
+def ioprio_set(ionice_class: IoniceClass, level: int = 4) -> None:
+    """Set the I/O scheduling class and level of the calling process.
+
+    :raise OSError: If the system call fails or is unknown on this
+      architecture.
+    """
+    resolve_ioprio_set()(ionice_class, level)
+
+
+def setup_cgroup(priority: Priority) -> Optional[str]:
+    """Create the cgroup if necessary and write its limits.
+
+    The cgroup has to be delegated to the user running rsync-watch (or
+    rsync-watch has to run as root).
+
+    :return: The path of the ``cgroup.procs`` file or None if no cgroup is
+      configured.
+    """
+    if priority.cgroup is None:
+        return None
+    path = os.path.join(CGROUP_ROOT, priority.cgroup.strip("/"))
+    os.makedirs(path, exist_ok=True)
+    settings: dict[str, Optional[str]] = {
+        "cpu.weight": _str(priority.cgroup_cpu_weight),
+        "io.weight": _str(priority.cgroup_io_weight),
+        "cpu.max": f"{priority.cgroup_cpu_max * 1000} 100000"
+        if priority.cgroup_cpu_max is not None
+        else None,
+        "io.max": priority.cgroup_io_max,
+    }
+    for name, value in settings.items():
+        if value is not None:
+            with open(os.path.join(path, name), "w") as file:
+                file.write(f"{value}\n")
+    return os.path.join(path, "cgroup.procs")
+
+
+def _str(value: Optional[int]) -> Optional[str]:
+    return None if value is None else str(value)
+
+
+def build_preexec_fn(priority: Priority) -> Optional[Callable[[], None]]:
+    """Build the function to apply the priority in the child process.
+
+    The cgroup is set up and the system call is resolved in the parent
+    process. The child process only moves itself into the cgroup and calls
+    ``nice`` and ``ioprio_set``.
+
+    :return: None if no priority is configured.
+
+    :raise OSError: If ``ioprio_set`` is unknown on this architecture.
+    """
+    if not priority.is_set:
+        return None
+    procs_file = setup_cgroup(priority)
+    ionice_class = priority.ionice_class
+    ioprio_set: Optional[Callable[[IoniceClass, int], None]] = None
+    level = 0
+    if ionice_class is not None:
+        ioprio_set = resolve_ioprio_set()
+        if ionice_class != "idle":
+            level = 4 if priority.ionice_level is None else priority.ionice_level
+
+    # preexec_fn runs in the forked child between fork() and exec(). Only
+    # the calling thread exists there, a lock held by another thread of
+    # rsync-watch (the reporter, the fan-out threads) is never released.
+    # Anything that may take such a lock, start a process or load a library
+    # is therefore done above. The child only makes plain system calls. A
+    # wrapper command like nice or ionice would avoid preexec_fn, but would
+    # have to be installed and would change the reported command.
+    def preexec_fn() -> None:
+        if procs_file is not None:
+            # “0” moves the writing process.
+            fd = os.open(procs_file, os.O_WRONLY)
+            try:
+                os.write(fd, b"0\n")
+            finally:
+                os.close(fd)
+        if priority.nice is not None:
+            os.nice(priority.nice)
+        if ioprio_set is not None and ionice_class is not None:
+            ioprio_set(ionice_class, level)
+
+    return preexec_fn
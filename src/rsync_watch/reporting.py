@@ -0,0 +1,334 @@
+"""Deliver the reports to the monitoring in a background thread.
+
+A slow or unreachable monitoring backend must not delay the sync. The
+reports are queued and delivered by a worker thread with retries. Reports
+that can’t be delivered are written to a spool directory and delivered by
+the next run. Each report channel is retried separately, so a channel that
+has already got a report doesn’t get it again.
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import typing
+from collections.abc import Callable
+from typing import Any, Optional
+
+from command_watcher import CommandExecutor, Watch
+from command_watcher.channels.base_channel import BaseChannel
+from command_watcher.log import LoggingHandler
+from command_watcher.message import Message
+from command_watcher.report import Status, reporter
+
+logger = logging.getLogger(__name__)
+
+SPOOL_MAX: int = 100
+"""The maximum number of reports kept in the spool directory. The oldest
+reports are dropped first."""
+
+
+class Report(typing.NamedTuple):
+    status: Status
+    custom_message: Optional[str] = None
+    body: Optional[str] = None
+    performance_data: Optional[dict[str, Any]] = None
+
+    channels: Optional[list[str]] = None
+    """The names of the channels the report still has to be delivered to,
+    None for all channels."""
+
+    log_records: Optional[str] = None
+    """The log records of the run at the time the report was queued."""
+
+    processes: Optional[list[list[str]]] = None
+    """The arguments of the processes of the run at the time the report
+    was queued."""
+
+    @property
+    def data(self) -> dict[str, Any]:
+        """The keyword arguments of :meth:`command_watcher.Watch.report`
+        without the status."""
+        return {
+            key: value
+            for key, value in self._asdict().items()
+            if key not in ("status", "channels", "log_records", "processes")
+            and value is not None
+        }
+
+
+class DeliveryError(Exception):
+    """Raised if a report couldn’t be delivered to some channels."""
+
+    channels: list[str]
+    """The names of the failed channels."""
+
+    def __init__(self, channels: list[str], message: str) -> None:
+        super().__init__(message)
+        self.channels = channels
+
+
+Deliver = Callable[[Report], object]
+"""Deliver a report to the monitoring. Raises :class:`DeliveryError` to
+retry only some channels, any other exception to retry the whole
+report."""
+
+Capture = Callable[[Report], Report]
+"""Add the state of the run to a report when it is queued."""
+
+
+class ProcessRecord(typing.NamedTuple):
+    """Stands in for a :class:`command_watcher.CommandExecutor` in a
+    message, which only formats its arguments."""
+
+    args_normalized: list[str]
+
+
+def get_channel_name(channel: BaseChannel) -> str:
+    return type(channel).__name__
+
+
+class ChannelDelivery:
+    """Deliver a report to each report channel of command_watcher
+    separately.
+
+    :meth:`command_watcher.Watch.report` delivers a report to all channels
+    in a row and stops at the first failing channel. Retrying it would
+    deliver the report again to the channels that already got it, for
+    example a second e-mail. Here all channels are tried and only the
+    failed ones are retried and spooled. A channel is identified by its
+    class name, for example ``IcingaChannel``.
+    """
+
+    watch: Watch
+    service_name: str
+
+    def __init__(self, watch: Watch, service_name: str) -> None:
+        self.watch = watch
+        self.service_name = service_name
+
+    def capture(self, report: Report) -> Report:
+        """Add the log records and the processes of the watch so far, like
+        :meth:`command_watcher.Watch.report`. Called when the report is
+        queued, so a spooled report keeps the records of its own run."""
+        log_records = "\n".join(
+            handler.all_records
+            for handler in self.watch.log.handlers
+            if isinstance(handler, LoggingHandler)
+        )
+        processes = [list(process.args_normalized) for process in self.watch.processes]
+        return report._replace(log_records=log_records, processes=processes)
+
+    def __call__(self, report: Report) -> None:
+        # The same message as Watch.report() builds.
+        processes = [ProcessRecord(args) for args in report.processes or []]
+        message = Message(
+            status=report.status,
+            service_name=self.service_name,
+            log_records=report.log_records or "",
+            processes=typing.cast(list[CommandExecutor], processes),
+            **report.data,
+        )
+        self.watch.log.debug(message)
+        failed: list[str] = []
+        errors: list[str] = []
+        for channel in reporter.channels:
+            name = get_channel_name(channel)
+            if report.channels is not None and name not in report.channels:
+                continue
+            try:
+                channel.report(message)
+            except Exception as error:
+                failed.append(name)
+                errors.append(f"{name}: {error}")
+        if failed:
+            raise DeliveryError(failed, ", ".join(errors))
+
+
+class QueuedReporter:
+    """Queue the reports and deliver them in a background thread.
+
+    All queued reports are delivered in one batch each time the worker
+    wakes up. A failed delivery is retried with exponential backoff, only
+    for the failed channels if ``deliver`` raises :class:`DeliveryError`.
+    If it still fails, the report and the rest of the batch are spooled,
+    since the backend is probably down.
+
+    :param deliver: The function delivering one report, for example
+      :meth:`command_watcher.Watch.report`.
+    :param capture: Called with each report in the thread queuing it, for
+      example :meth:`ChannelDelivery.capture`.
+    :param spool_dir: The directory to store undeliverable reports in.
+      Spooled reports are queued again first.
+    :param retries: The number of retries per report.
+    :param backoff: The delay in seconds before the first retry. It is
+      doubled with every retry.
+    :param log: The logger for failed deliveries.
+    """
+
+    deliver: Deliver
+    capture: Optional[Capture]
+    spool_dir: Optional[str]
+    retries: int
+    backoff: float
+    log: logging.Logger
+
+    _queue: "queue.Queue[Optional[Report]]"
+    """None stops the worker."""
+
+    _in_flight: list[Report]
+    """The batch the worker is currently delivering."""
+
+    _lock: threading.Lock
+    _closing: threading.Event
+    _worker: threading.Thread
+    _spooled: int
+
+    def __init__(
+        self,
+        deliver: Deliver,
+        spool_dir: Optional[str] = None,
+        retries: int = 3,
+        backoff: float = 1.0,
+        log: logging.Logger = logger,
+        capture: Optional[Capture] = None,
+    ) -> None:
+        self.deliver = deliver
+        self.capture = capture
+        self.spool_dir = spool_dir
+        self.retries = retries
+        self.backoff = backoff
+        self.log = log
+        self._queue = queue.Queue()
+        self._in_flight = []
+        self._lock = threading.Lock()
+        self._closing = threading.Event()
+        self._spooled = 0
+        for report in self._load_spool():
+            self._queue.put(report)
+        self._worker = threading.Thread(
+            target=self._work, name="rsync-watch-reporter", daemon=True
+        )
+        self._worker.start()
+
+    def report(
+        self,
+        status: Status,
+        custom_message: Optional[str] = None,
+        body: Optional[str] = None,
+        performance_data: Optional[dict[str, Any]] = None,
+    ) -> None:
+        """Queue a report. Returns immediately."""
+        report = Report(status, custom_message, body, performance_data)
+        if self.capture is not None:
+            report = self.capture(report)
+        self._queue.put(report)
+
+    def close(self, timeout: float = 10) -> int:
+        """Wait for the queued reports to be delivered and stop the worker.
+
+        :param timeout: The maximum number of seconds to wait.
+
+        :return: The number of reports that have been spooled.
+        """
+        self._queue.put(None)
+        self._worker.join(timeout)
+        self._closing.set()
+        self._worker.join(1)
+        if not self._worker.is_alive():
+            return self._spooled
+        # The worker hangs in a delivery. A report being delivered right
+        # now may be delivered twice.
+        with self._lock:
+            pending = list(self._in_flight)
+            self._in_flight = []
+        while True:
+            try:
+                report = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if report is not None:
+                pending.append(report)
+        self._spool(pending)
+        return self._spooled + len(pending)
+
+    def _work(self) -> None:
+        while True:
+            items = [self._queue.get()]
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in items
+            batch = [report for report in items if report is not None]
+            with self._lock:
+                self._in_flight = batch
+            for index, report in enumerate(batch):
+                remaining = self._deliver_with_retries(report)
+                if remaining is not None:
+                    with self._lock:
+                        undelivered = self._in_flight[index:]
+                        if undelivered:
+                            undelivered[0] = remaining
+                        self._in_flight = []
+                    self._spool(undelivered)
+                    self._spooled += len(undelivered)
+                    break
+            else:
+                with self._lock:
+                    self._in_flight = []
+            if stop:
+                return
+
+    def _deliver_with_retries(self, report: Report) -> Optional[Report]:
+        """:return: None if the report has been delivered, otherwise the
+        report limited to the channels that still fail."""
+        for attempt in range(self.retries + 1):
+            try:
+                self.deliver(report)
+                return None
+            except DeliveryError as error:
+                report = report._replace(channels=error.channels)
+                self.log.warning(f"Report delivery failed: {error}")
+            except Exception as error:
+                self.log.warning(f"Report delivery failed: {error}")
+            if attempt == self.retries or self._closing.wait(self.backoff * 2**attempt):
+                break
+        return report
+
+    def _spool(self, reports: list[Report]) -> None:
+        if not reports or self.spool_dir is None:
+            return
+        os.makedirs(self.spool_dir, exist_ok=True)
+        for index, report in enumerate(reports):
+            name = f"{time.time_ns()}-{index:04d}.json"
+            path = os.path.join(self.spool_dir, name)
+            with open(path, "w") as file:
+                json.dump(report._asdict(), file)
+        names = sorted(os.listdir(self.spool_dir))
+        for name in names[:-SPOOL_MAX]:
+            os.remove(os.path.join(self.spool_dir, name))
+
+    def _load_spool(self) -> list[Report]:
+        """Read and remove the spooled reports, the oldest first."""
+        if self.spool_dir is None or not os.path.isdir(self.spool_dir):
+            return []
+        reports: list[Report] = []
+        for name in sorted(os.listdir(self.spool_dir)):
+            path = os.path.join(self.spool_dir, name)
+            try:
+                with open(path) as file:
+                    report = Report(**json.load(file))
+                # Another instance may have taken the report in the meantime.
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            except (OSError, ValueError, TypeError) as error:
+                self.log.warning(f"Dropping the spooled report {path}: {error}")
+                os.remove(path)
+                continue
+            reports.append(report)
+        return reports
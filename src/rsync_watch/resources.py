@@ -0,0 +1,75 @@
+import resource
+import sys
+import typing
+
+
+class ResourceUsage(typing.NamedTuple):
+    """The resource usage of the terminated and waited-for child processes
+    (including their descendants, for example the SSH process started by
+    rsync)."""
+
+    user_time: float
+    """CPU time spent in user mode in seconds."""
+
+    system_time: float
+    """CPU time spent in kernel mode in seconds."""
+
+    max_rss_so_far: int
+    """The peak resident set size in bytes of any child reaped so far by
+    this process, not only of this run: ``ru_maxrss`` of
+    ``RUSAGE_CHILDREN`` is a maximum over all children, it can’t be taken
+    per run. The subtraction keeps the later value."""
+
+    voluntary_switches: int
+    """Context switches because a child waited for a resource, typically
+    I/O. Many of them indicate an I/O or network bound job."""
+
+    involuntary_switches: int
+    """Context switches because the time slice of a child expired. Many of
+    them indicate a CPU bound job."""
+
+    block_input: int
+    """The number of block input operations (file system reads)."""
+
+    block_output: int
+    """The number of block output operations (file system writes)."""
+
+    @classmethod
+    def children(cls) -> "ResourceUsage":
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        # Linux reports kibibytes, macOS bytes.
+        max_rss_so_far = (
+            usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+        )
+        return cls(
+            usage.ru_utime,
+            usage.ru_stime,
+            max_rss_so_far,
+            usage.ru_nvcsw,
+            usage.ru_nivcsw,
+            usage.ru_inblock,
+            usage.ru_oublock,
+        )
+
+    def __sub__(self, other: "ResourceUsage") -> "ResourceUsage":
+        return ResourceUsage(
+            self.user_time - other.user_time,
+            self.system_time - other.system_time,
+            self.max_rss_so_far,
+            self.voluntary_switches - other.voluntary_switches,
+            self.involuntary_switches - other.involuntary_switches,
+            self.block_input - other.block_input,
+            self.block_output - other.block_output,
+        )
+
+    @property
+    def performance_data(self) -> dict[str, int | float]:
+        return {
+            "cpu_user": round(self.user_time, 3),
+            "cpu_system": round(self.system_time, 3),
+            "max_rss_so_far": self.max_rss_so_far,
+            "ctx_switches_voluntary": self.voluntary_switches,
+            "ctx_switches_involuntary": self.involuntary_switches,
+            "block_input": self.block_input,
+            "block_output": self.block_output,
+        }
@@ -0,0 +1,158 @@
+import datetime
+import json
+import os
+from typing import Any, Optional
+
+from rsync_watch.stats import Stats
+
+
+class ChangeRateForecaster:
+    """Learn the change rate of a source and forecast the next run.
+
+    The change rate is the exponentially weighted moving average of the
+    transferred bytes per second of wall-clock time between two runs. The
+    next run is scheduled when ``target_size`` bytes are expected to have
+    changed, bounded by ``min_interval`` and ``max_interval``. Quiet sources
+    are synced rarely, busy ones often.
+
+    The state is stored as JSON in ``state_file``.
+
+    :param state_file: The file path of the state of one service.
+    :param min_interval: The minimum number of seconds between two runs.
+    :param max_interval: The maximum number of seconds between two runs.
+    :param target_size: The number of changed bytes a run should transfer.
+    :param smoothing: The weight of the latest observation, 0 to 1.
+    """
+
+    state_file: str
+    min_interval: float
+    max_interval: float
+    target_size: int
+    smoothing: float
+
+    last_run: Optional[float]
+    """The end of the last run as a Unix timestamp."""
+
+    rate: Optional[float]
+    """The change rate in bytes per second."""
+
+    empty_runs: int
+    """The number of consecutive runs that transferred no files."""
+
+    next_run: Optional[float]
+    """The forecasted next run as a Unix timestamp."""
+
+    def __init__(
+        self,
+        state_file: str,
+        min_interval: float = 300,
+        max_interval: float = 86400,
+        target_size: int = 100 * 1024**2,
+        smoothing: float = 0.3,
+    ) -> None:
+        self.state_file = state_file
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.target_size = target_size
+        self.smoothing = smoothing
+        self.last_run = None
+        self.rate = None
+        self.empty_runs = 0
+        self.next_run = None
+        self.load()
+
+    def load(self) -> None:
+        if not os.path.exists(self.state_file):
+            return
+        with open(self.state_file) as file:
+            state: dict[str, Any] = json.load(file)
+        self.last_run = state.get("last_run")
+        self.rate = state.get("rate")
+        self.empty_runs = state.get("empty_runs", 0)
+        self.next_run = state.get("next_run")
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.state_file) or ".", exist_ok=True)
+        with open(self.state_file, "w") as file:
+            json.dump(
+                {
+                    "last_run": self.last_run,
+                    "rate": self.rate,
+                    "empty_runs": self.empty_runs,
+                    "next_run": self.next_run,
+                },
+                file,
+                indent=2,
+            )
+
+    def is_due(self, now: float) -> bool:
+        return self.next_run is None or now >= self.next_run
+
+    def interval(self) -> float:
+        """The number of seconds until the next run according to the
+        current change rate. The first runs are scheduled after
+        ``min_interval`` to learn the change rate quickly."""
+        if self.rate is None:
+            return self.min_interval
+        if self.rate == 0:
+            return self.max_interval
+        return min(
+            max(self.target_size / self.rate, self.min_interval), self.max_interval
+        )
+
+    def record(self, stats: Stats, now: float) -> float:
+        """Record the result of a run, update the change rate and forecast
+        the next run.
+
+        :param stats: The stats of one destination.
+        :param now: The end of the run as a Unix timestamp.
+
+        :return: The number of seconds until the next run.
+        """
+        # Changed metadata only doesn’t count as a change.
+        size = stats["transferred_size"] if stats["num_files_transferred"] else 0
+        self.empty_runs = 0 if size else self.empty_runs + 1
+        if self.last_run is not None and now > self.last_run:
+            observed = size / (now - self.last_run)
+            if self.rate is None:
+                self.rate = observed
+            else:
+                self.rate = self.smoothing * observed + (1 - self.smoothing) * self.rate
+        self.last_run = now
+        interval = self.interval()
+        self.next_run = now + interval
+        self.save()
+        return interval
+
+    @property
+    def next_run_datetime(self) -> Optional[datetime.datetime]:
+        """The forecasted next run in the local time zone."""
+        if self.next_run is None:
+            return None
+        return datetime.datetime.fromtimestamp(self.next_run).astimezone()
+
+    def write_next_run(self, path: str) -> None:
+        """Write the next run as an ISO 8601 timestamp, for example to be
+        read by a timer."""
+        next_run = self.next_run_datetime
+        if next_run is None:
+            return
+        with open(path, "w") as file:
+            file.write(f"{next_run.isoformat(timespec='seconds')}\n")
+
+    @property
+    def performance_data(self) -> dict[str, float]:
+        return {
+            "change_rate": round(self.rate or 0.0, 2),
+            "next_run_interval": round(self.interval(), 1),
+        }
+
+    def format(self) -> str:
+        next_run = self.next_run_datetime
+        if next_run is None:
+            return "Next run: not scheduled"
+        return (
+            f"Next run: {next_run.isoformat(timespec='seconds')} "
+            f"(change rate {self.rate or 0.0:.1f} bytes/sec, "
+            f"{self.empty_runs} empty runs in a row)"
+        )
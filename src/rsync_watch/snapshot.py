@@ -0,0 +1,262 @@
+"""Point-in-time backups into dated snapshot directories.
+
+Each run syncs into a new directory below the destination. Unchanged
+files are hard-linked to the previous snapshot using ``--link-dest``, so
+a snapshot only costs the space of the changed files.
+"""
+
+import datetime
+import os
+import re
+import shlex
+import shutil
+import subprocess
+import typing
+from collections.abc import Callable
+from typing import Optional
+
+from rsync_watch.daemon import is_daemon_location, is_remote_shell_location
+
+NAME_FORMAT: str = "%Y-%m-%dT%H-%M-%SZ"
+"""The :func:`~datetime.datetime.strftime` format of the snapshot
+directory names in UTC. Lexicographic order is chronological order, also
+across daylight saving time changes."""
+
+MAX_SEQUENCE: int = 9
+"""The maximum number of additional snapshots in the same second. A single
+digit keeps the lexicographic order."""
+
+PARTIAL_SUFFIX: str = ".partial"
+"""The suffix of a snapshot that is being written. It is renamed when
+rsync has finished, so an interrupted run never becomes the base of the
+next snapshot."""
+
+_NAME: re.Pattern[str] = re.compile(
+    r"^(?P<time>\d{4}-\d\d-\d\dT\d\d-\d\d-\d\d)(?:Z(?:-\d)?)?$"
+)
+"""Also matches the names in local time without ``Z`` of older versions."""
+
+
+class Retention(typing.NamedTuple):
+    """How many snapshots to keep. A snapshot is kept if any of the rules
+    selects it. No rule at all keeps every snapshot."""
+
+    last: int = 0
+    """Keep the ``last`` latest snapshots."""
+
+    daily: int = 0
+    """Keep the latest snapshot of each of the last ``daily`` days with
+    snapshots."""
+
+    weekly: int = 0
+    """The same per ISO week."""
+
+    monthly: int = 0
+    """The same per month."""
+
+    @property
+    def is_set(self) -> bool:
+        return any(self)
+
+
+_PERIODS: tuple[tuple[str, Callable[[datetime.datetime], object]], ...] = (
+    ("daily", lambda time: time.date()),
+    ("weekly", lambda time: time.isocalendar()[:2]),
+    ("monthly", lambda time: (time.year, time.month)),
+)
+
+
+def format_name(time: datetime.datetime, sequence: int = 0) -> str:
+    """:param time: Converted to UTC, a naive time is taken as local time.
+    :param sequence: Tells apart the snapshots taken in the same second,
+      appended as ``-1``, ``-2`` and so on."""
+    name = time.astimezone(datetime.timezone.utc).strftime(NAME_FORMAT)
+    if sequence:
+        name += f"-{sequence}"
+    return name
+
+
+def parse_name(name: str) -> datetime.datetime:
+    match = _NAME.match(name)
+    if match is None:
+        raise ValueError(f"Not a snapshot name: {name}")
+    return datetime.datetime.strptime(match["time"], "%Y-%m-%dT%H-%M-%S")
+
+
+def select_expired(names: list[str], retention: Retention) -> list[str]:
+    """Select the snapshots the retention policy doesn’t keep. The latest
+    snapshot is always kept.
+
+    :param names: Snapshot names in any order.
+
+    :return: The expired names, the oldest first.
+    """
+    if not retention.is_set:
+        return []
+    ordered = sorted(names, reverse=True)
+    keep: set[str] = set(ordered[: max(retention.last, 1)])
+    for attribute, period in _PERIODS:
+        count: int = getattr(retention, attribute)
+        seen: set[object] = set()
+        for name in ordered:
+            if len(seen) >= count:
+                break
+            key = period(parse_name(name))
+            if key not in seen:
+                seen.add(key)
+                keep.add(name)
+    return sorted(name for name in names if name not in keep)
+
+
+class SnapshotStore:
+    """The snapshot directories below a local or remote shell (SSH)
+    destination.
+
+    :param location: The destination as passed to rsync.
+
+    :raise ValueError: If the destination is a rsync daemon, whose
+      directories can’t be listed, renamed or removed.
+    """
+
+    location: str
+    host: Optional[str]
+    """``[USER@]HOST`` of a remote shell destination."""
+
+    path: str
+
+    def __init__(self, location: str) -> None:
+        if is_daemon_location(location):
+            raise ValueError(f"Snapshots can’t be made on a rsync daemon: {location}")
+        self.location = location
+        self.host = None
+        self.path = location
+        if is_remote_shell_location(location):
+            self.host, _, self.path = location.partition(":")
+        self.path = self.path.rstrip("/") or "/"
+
+    def _join(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _ssh(self, *command: str) -> str:
+        assert self.host is not None
+        process = subprocess.run(
+            ["ssh", self.host, shlex.join(command)],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            encoding="utf-8",
+            errors="replace",
+        )
+        if process.returncode != 0:
+            raise OSError(
+                f"{shlex.join(command)} failed on {self.host}: {process.stderr.strip()}"
+            )
+        return process.stdout
+
+    def location_of(self, name: str) -> str:
+        """The location of a snapshot as passed to rsync."""
+        if self.host is None:
+            return self._join(name)
+        return f"{self.host}:{self._join(name)}"
+
+    def create_base(self) -> None:
+        """Create the destination directory, rsync creates only the last
+        component of the snapshot path."""
+        if self.host is None:
+            os.makedirs(self.path, exist_ok=True)
+        else:
+            self._ssh("mkdir", "-p", "--", self.path)
+
+    def create(self, name: str) -> bool:
+        """Create a directory below the destination. ``mkdir`` is atomic, so
+        only one of concurrent runs gets it.
+
+        :return: False if the directory exists already.
+        """
+        if self.host is None:
+            try:
+                os.mkdir(self._join(name))
+            except FileExistsError:
+                return False
+            return True
+        try:
+            self._ssh("mkdir", "--", self._join(name))
+        except OSError:
+            if name in self.list_names():
+                return False
+            raise
+        return True
+
+    def claim(self, time: datetime.datetime) -> str:
+        """Choose the name of a new snapshot and create its partial
+        directory. Snapshots taken in the same second get a sequence number.
+
+        :return: The name of the snapshot without :data:`PARTIAL_SUFFIX`.
+
+        :raise FileExistsError: If all sequence numbers of the second are
+          taken.
+        """
+        names = set(self.list_names())
+        for sequence in range(MAX_SEQUENCE + 1):
+            name = format_name(time, sequence)
+            if name not in names and self.create(name + PARTIAL_SUFFIX):
+                return name
+        raise FileExistsError(
+            f"More than {MAX_SEQUENCE + 1} snapshots at {format_name(time)} in "
+            f"{self.location}"
+        )
+
+    def list_names(self) -> list[str]:
+        """:return: The names of the directory entries, sorted."""
+        if self.host is None:
+            if not os.path.isdir(self.path):
+                return []
+            return sorted(os.listdir(self.path))
+        return sorted(self._ssh("ls", "-1A", "--", self.path).splitlines())
+
+    def snapshots(self) -> list[str]:
+        """:return: The names of the complete snapshots, the oldest first."""
+        return [name for name in self.list_names() if _NAME.match(name)]
+
+    def latest(self) -> Optional[str]:
+        snapshots = self.snapshots()
+        return snapshots[-1] if snapshots else None
+
+    def rename(self, name: str, new_name: str) -> None:
+        if self.host is None:
+            os.rename(self._join(name), self._join(new_name))
+        else:
+            self._ssh("mv", "-T", "--", self._join(name), self._join(new_name))
+
+    def remove(self, names: list[str]) -> None:
+        if not names:
+            return
+        if self.host is None:
+            for name in names:
+                shutil.rmtree(self._join(name))
+        else:
+            self._ssh("rm", "-rf", "--", *(self._join(name) for name in names))
+
+    def remove_partial(self) -> list[str]:
+        """Remove the snapshots of interrupted runs. Only call this while
+        holding the service lock: the partial snapshot of a concurrent run
+        can’t be told apart.
+
+        :return: The removed names.
+        """
+        partial = [
+            name
+            for name in self.list_names()
+            if name.endswith(PARTIAL_SUFFIX)
+            and _NAME.match(name.removesuffix(PARTIAL_SUFFIX))
+        ]
+        self.remove(partial)
+        return partial
+
+    def prune(self, retention: Retention) -> list[str]:
+        """Remove the snapshots the retention policy doesn’t keep.
+
+        :return: The removed names.
+        """
+        expired = select_expired(self.snapshots(), retention)
+        self.remove(expired)
+        return expired
@@ -0,0 +1,384 @@
+"""Parse the ``--stats`` output of rsync.
+
+All known output formats are covered by one compiled grammar, which is
+applied in a single pass over the output:
+
+* ``rsync-3.0``: ``Number of files transferred``, no created or deleted
+  files, no breakdowns.
+* ``rsync-3.1``: rsync 3.1 and later (3.2 and 3.3 use the same format):
+  ``Number of regular files transferred``, created and deleted files and
+  ``(reg: X, dir: Y, link: Z)`` breakdowns.
+* ``openrsync``: like 3.0, but the sizes are suffixed with ``B`` instead of
+  ``bytes``.
+
+Numbers are printed using the thousands separator of the locale rsync is
+running under (``,``, ``.``, ``'``, a space or a (narrow) no-break space)
+and the decimal separator of the locale (``.`` or ``,``).
+"""
+
+import re
+import typing
+from typing import Literal
+
+from command_watcher import CommandWatcherError
+
+from rsync_watch.histogram import iter_out_format_lines
+
+Stats = dict[str, int | float]
+
+StatsFormat = Literal["rsync-3.0", "rsync-3.1", "openrsync"]
+
+
+class StatsNotFoundError(CommandWatcherError):
+    """Raised when some stats regex couldn’t be found in stdout."""
+
+
+_SEPARATORS: str = ".,' \u00a0\u202f"
+
+_NUMBER: str = rf"\d(?:[\d{_SEPARATORS}]*\d)?"
+
+_NON_DIGIT: re.Pattern[str] = re.compile(r"\D")
+
+
+class _Field(typing.NamedTuple):
+    key: str
+    type: type[int] | type[float]
+    missing_message: str
+    """The message of the :class:`StatsNotFoundError`."""
+
+
+_FIELDS: dict[str, _Field] = {
+    "Number of files": _Field(
+        "num_files", int, "Number of files: X,XXX (reg: X,XXX, dir: X,XXX)"
+    ),
+    "Number of created files": _Field(
+        "num_created_files",
+        int,
+        "Number of created files: X,XXX (reg: X,XXX, dir: X,XXX)",
+    ),
+    "Number of deleted files": _Field(
+        "num_deleted_files",
+        int,
+        "Number of deleted files: X,XXX (reg: X,XXX, dir: X,XXX)",
+    ),
+    "Number of regular files transferred": _Field(
+        "num_files_transferred", int, "Number of regular files transferred: X,XXX"
+    ),
+    "Number of files transferred": _Field(
+        "num_files_transferred", int, "Number of files transferred: X,XXX"
+    ),
+    "Total file size": _Field("total_size", int, "Total file size: X,XXX bytes"),
+    "Total transferred file size": _Field(
+        "transferred_size", int, "Total transferred file size: X,XXX bytes"
+    ),
+    "Literal data": _Field("literal_data", int, "Literal data: X,XXX bytes"),
+    "Matched data": _Field("matched_data", int, "Matched data: X,XXX bytes"),
+    "File list size": _Field("list_size", int, "File list size: X,XXX"),
+    "File list generation time": _Field(
+        "list_generation_time", float, "File list generation time: X.XXX seconds"
+    ),
+    "File list transfer time": _Field(
+        "list_transfer_time", float, "File list transfer time: X.XXX seconds"
+    ),
+    "Total bytes sent": _Field("bytes_sent", int, "Total bytes sent: X,XXX"),
+    "Total bytes received": _Field(
+        "bytes_received", int, "Total bytes received: X,XXX"
+    ),
+}
+
+_LABELS: str = "|".join(
+    re.escape(label) for label in sorted(_FIELDS, key=len, reverse=True)
+)
+
+_GRAMMAR: re.Pattern[str] = re.compile(
+    rf"^(?P<label>{_LABELS}): (?P<value>{_NUMBER})(?P<unit> bytes| B| seconds)?"
+    rf"(?: \((?P<breakdown>[^)]*)\))?[ \t]*\r?$"
+    rf"|^sent {_NUMBER} bytes +received {_NUMBER} bytes"
+    rf"(?: +(?P<bytes_per_sec>{_NUMBER}) bytes/sec)?[ \t]*\r?$"
+    rf"|^total size is {_NUMBER} +speedup is (?P<speedup>{_NUMBER})",
+    re.MULTILINE,
+)
+
+_BREAKDOWN: re.Pattern[str] = re.compile(rf"(?P<kind>[a-z]+): (?P<value>{_NUMBER})")
+
+_REQUIRED: dict[StatsFormat, tuple[str, ...]] = {
+    "rsync-3.1": (
+        "Number of files",
+        "Number of created files",
+        "Number of regular files transferred",
+    ),
+    "rsync-3.0": ("Number of files", "Number of files transferred"),
+    "openrsync": ("Number of files", "Number of files transferred"),
+}
+"""The labels of the leading fields that are required in the given format.
+The fields from ``Total file size`` on are required in all formats."""
+
+_REQUIRED_COMMON: tuple[str, ...] = (
+    "Total file size",
+    "Total transferred file size",
+    "Literal data",
+    "Matched data",
+    "File list size",
+    "File list generation time",
+    "File list transfer time",
+    "Total bytes sent",
+    "Total bytes received",
+)
+
+
+def convert_number_to_int(formatted_number: str) -> int:
+    """Convert a integer containing thousands separators to a integer.
+
+    All separators (commas, dots, apostrophes and spaces) are removed, so
+    the result doesn’t depend on the locale rsync is running under.
+
+    :param formatted_number: a integer containing thousands separators
+
+    :return: A integer without separators
+    """
+    return int(_NON_DIGIT.sub("", formatted_number))
+
+
+def convert_number_to_float(formatted_number: str) -> float:
+    """Convert a float with locale dependent separators to a float.
+
+    rsync always prints floats with a fixed number of decimal places
+    (``%.3f`` or ``%.2f``), so the last separator is the decimal
+    separator and all preceding separators are thousands separators.
+
+    :param formatted_number: for example ``0,147``, ``3.548,76`` or
+      ``1,234.56``
+
+    :return: The parsed float
+    """
+    match = re.search(rf"[{_SEPARATORS}](\d+)$", formatted_number)
+    if not match:
+        return float(convert_number_to_int(formatted_number))
+    integer = _NON_DIGIT.sub("", formatted_number[: match.start()])
+    return float(f"{integer or 0}.{match.group(1)}")
+
+
+def _convert(field_type: type[int] | type[float], value: str) -> int | float:
+    if field_type is float:
+        return convert_number_to_float(value)
+    return convert_number_to_int(value)
+
+
+def detect_stats_format(stdout: str) -> StatsFormat:
+    """Detect the output format of the stats block.
+
+    :param stdout: The standard output of the rsync process
+
+    :return: ``rsync-3.1`` (also used by rsync 3.2 and 3.3),
+      ``rsync-3.0`` or ``openrsync``.
+    """
+    if "\nNumber of files transferred: " not in stdout:
+        return "rsync-3.1"
+    if re.search(rf"\nTotal file size: {_NUMBER} B\r?\n", stdout):
+        return "openrsync"
+    return "rsync-3.0"
+
+
+def _scan(stdout: str) -> tuple[int, dict[str, str], Stats]:
+    """Apply the grammar to the stats block.
+
+    :return: The start of the stats block, the values of the stats lines
+      by label and the breakdowns, ``bytes_per_sec`` and ``speedup``.
+    """
+    found: dict[str, str] = {}
+    result: Stats = {}
+
+    # The stats block is printed at the very end of the output. Skip the
+    # (possibly very long) list of transferred files.
+    start = max(stdout.rfind("\nNumber of files: "), 0)
+
+    for match in _GRAMMAR.finditer(stdout, start):
+        label = match.group("label")
+        if label is not None:
+            if label in found:
+                continue
+            found[label] = match.group("value")
+            field = _FIELDS[label]
+            breakdown = match.group("breakdown")
+            if breakdown:
+                for item in _BREAKDOWN.finditer(breakdown):
+                    result[f"{field.key}_{item.group('kind')}"] = convert_number_to_int(
+                        item.group("value")
+                    )
+        elif match.group("speedup") is not None:
+            result.setdefault("speedup", convert_number_to_float(match["speedup"]))
+        elif match.group("bytes_per_sec") is not None:
+            result.setdefault(
+                "bytes_per_sec", convert_number_to_float(match["bytes_per_sec"])
+            )
+    return start, found, result
+
+
+def parse_stats(stdout: str, partial: bool = False) -> Stats:
+    """Parse the standard output of the rsync process.
+
+    https://github.com/WayneD/rsync/blob/c69dc7a5ab473bb52a575b5803026c2694761084/main.c#L416-L465
+
+    Besides the stats block, the breakdowns of the file counts (for example
+    ``num_files_reg`` and ``num_files_dir``) and the throughput
+    (``bytes_per_sec``) and ``speedup`` of the summary lines are extracted
+    if present.
+
+    :param stdout: The standard output of the rsync process
+    :param partial: Fall back to :func:`parse_partial_stats` instead of
+      raising a :class:`StatsNotFoundError` if the stats block is
+      incomplete.
+
+    :return: A dictionary containing all the stats numbers.
+    """
+    start, found, result = _scan(stdout)
+
+    stats_format = detect_stats_format(stdout[start:])
+    for label in _REQUIRED[stats_format] + _REQUIRED_COMMON:
+        if label not in found:
+            if partial:
+                return parse_partial_stats(stdout)
+            raise StatsNotFoundError(_FIELDS[label].missing_message)
+
+    # The created and deleted files are missing in rsync 3.0 and openrsync.
+    # The deleted files line is sometimes missing on rsync --version 3.1.2
+    found.setdefault("Number of created files", "0")
+    found.setdefault("Number of deleted files", "0")
+
+    stats: Stats = {}
+    for label in (
+        "Number of files",
+        "Number of created files",
+        "Number of deleted files",
+        _REQUIRED[stats_format][-1],
+    ) + _REQUIRED_COMMON:
+        field = _FIELDS[label]
+        stats[field.key] = _convert(field.type, found[label])
+    stats.update(result)
+    return stats
+
+
+_NOT_A_FILE: re.Pattern[str] = re.compile(
+    r"^(?:sending incremental file list|receiving incremental file list"
+    r"|building file list|receiving file list|created directory |skipping "
+    r"|rsync(?: error)?: |sent \d|total size is |total: "
+    r"|Number of |Total |Literal data|Matched data|File list )"
+    r"|/$| -> "
+)
+"""Lines of the verbose output that don’t name a transferred file:
+messages, the summary, directories and symbolic links."""
+
+
+def parse_partial_stats(stdout: str) -> Stats:
+    """Reconstruct the counters of an rsync run that has been interrupted
+    before the stats block was printed, for example because rsync has been
+    killed.
+
+    The counters are taken from the lines printed with
+    :data:`~rsync_watch.histogram.OUT_FORMAT`: ``num_files_transferred``,
+    ``num_created_files``, ``num_deleted_files``, ``transferred_size`` and
+    the bytes actually transferred (``partial_bytes_transferred``).
+    Without them the transferred and deleted files are counted using the
+    verbose output, the sizes are unknown then. The lines of the stats
+    block printed so far take precedence.
+
+    The result is marked with ``partial``.
+    """
+    stats: Stats = {}
+    transferred = created = deleted = 0
+    size = bytes_transferred = 0
+    out_format = False
+    for line in iter_out_format_lines(stdout):
+        out_format = True
+        if line.itemize.startswith("*deleting"):
+            deleted += 1
+            continue
+        if "+++++++++" in line.itemize:
+            created += 1
+        if line.is_transferred:
+            transferred += 1
+            size += line.size
+            bytes_transferred += line.transferred
+    if not out_format:
+        for raw_line in stdout.splitlines():
+            text = raw_line.strip()
+            if not text:
+                continue
+            if text.startswith("deleting "):
+                deleted += 1
+            elif not _NOT_A_FILE.search(text):
+                transferred += 1
+    stats["num_files_transferred"] = transferred
+    stats["num_created_files"] = created
+    stats["num_deleted_files"] = deleted
+    if out_format:
+        stats["transferred_size"] = size
+        stats["partial_bytes_transferred"] = bytes_transferred
+    _, found, result = _scan(stdout)
+    for label, value in found.items():
+        field = _FIELDS[label]
+        stats[field.key] = _convert(field.type, value)
+    stats.update(result)
+    stats["partial"] = 1
+    return stats
+
+
+_DERIVED: tuple[str, ...] = (
+    "bytes_per_sec",
+    "speedup",
+    "duration",
+    "effective_bytes_per_sec",
+)
+"""Values that can’t be summed up."""
+
+
+def add_throughput(stats: Stats, duration: float) -> Stats:
+    """Add the wall-clock duration and the throughput derived from it.
+
+    ``bytes_per_sec`` and ``speedup`` are reported by rsync itself and
+    refer to the time rsync measures. ``duration`` is measured by
+    rsync-watch around the whole rsync process (including the SSH
+    connection setup) and ``effective_bytes_per_sec`` is the network
+    throughput based on this wall-clock duration. ``speedup`` is computed
+    the way rsync does if the summary line is missing.
+
+    :param stats: The result of :func:`parse_stats`.
+    :param duration: The wall-clock duration of the rsync process in seconds.
+
+    :return: The updated ``stats``.
+    """
+    # The byte counts are missing in partial stats.
+    transferred = stats.get("bytes_sent", 0) + stats.get("bytes_received", 0)
+    stats["duration"] = round(duration, 3)
+    stats["effective_bytes_per_sec"] = (
+        round(transferred / duration, 2) if duration > 0 else 0.0
+    )
+    if "speedup" not in stats and "total_size" in stats:
+        stats["speedup"] = (
+            round(stats["total_size"] / transferred, 2) if transferred else 0.0
+        )
+    return stats
+
+
+def aggregate_stats(stats_list: list[Stats], duration: float) -> Stats:
+    """Aggregate the stats of multiple rsync processes, for example of a
+    fan-out to multiple destinations.
+
+    The counters are summed up. The stats of each process are included as
+    well, prefixed with ``dest1_``, ``dest2_`` and so on.
+
+    :param stats_list: The stats of each process.
+    :param duration: The wall-clock duration of all processes in seconds.
+
+    :return: The aggregated stats.
+    """
+    aggregate: Stats = {}
+    for stats in stats_list:
+        for key, value in stats.items():
+            if key not in _DERIVED:
+                aggregate[key] = aggregate.get(key, 0) + value
+    add_throughput(aggregate, duration)
+    for i, stats in enumerate(stats_list, 1):
+        for key, value in stats.items():
+            aggregate[f"dest{i}_{key}"] = value
+    return aggregate
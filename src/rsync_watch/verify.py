@@ -0,0 +1,243 @@
+import concurrent.futures
+import hashlib
+import heapq
+import os
+import random
+import shlex
+import subprocess
+import time
+import typing
+from collections.abc import Iterable
+from typing import Literal, Optional
+
+from rsync_watch.daemon import is_daemon_location, is_remote_shell_location
+from rsync_watch.histogram import OutFormatLine
+
+Sampling = Literal["random", "size"]
+
+_CHUNK_SIZE: int = 1024 * 1024
+
+
+def sample_files(
+    lines: Iterable[OutFormatLine],
+    count: int,
+    sampling: Sampling = "random",
+    rand: Optional[random.Random] = None,
+) -> list[OutFormatLine]:
+    """Select a sample of the transferred regular files in one pass with
+    constant memory.
+
+    ``random``: every file has the same probability (reservoir sampling).
+    ``size``: the probability is proportional to the file size (weighted
+    reservoir sampling by Efraimidis and Spirakis), so the sample covers
+    most of the transferred bytes.
+    """
+    if rand is None:
+        rand = random.Random()
+    heap: list[tuple[float, int, OutFormatLine]] = []
+    index = 0
+    for line in lines:
+        if not line.is_file:
+            continue
+        index += 1
+        if sampling == "size":
+            key = rand.random() ** (1 / max(line.size, 1))
+        else:
+            key = rand.random()
+        item = (key, index, line)
+        if len(heap) < count:
+            heapq.heappush(heap, item)
+        elif count > 0 and key > heap[0][0]:
+            heapq.heapreplace(heap, item)
+    return [line for _, _, line in sorted(heap, key=lambda item: item[1])]
+
+
+def resolve_root(src: str, dest: str) -> tuple[str, str]:
+    """Get the directories the file names printed by rsync are relative to.
+
+    With a trailing slash the contents of the source are transferred, the
+    names are relative to the source itself, otherwise to its parent.
+
+    :return: The source and the destination root.
+    """
+    if src.endswith("/"):
+        src_root = src
+    else:
+        host, separator, path = "", "", src
+        if is_remote_shell_location(src):
+            host, separator, path = src.partition(":")
+        parent = os.path.dirname(path.rstrip("/"))
+        src_root = f"{host}{separator}{parent}"
+    return src_root, dest
+
+
+def _join(root: str, name: str) -> str:
+    if not root or root.endswith((":", "/")):
+        return f"{root}{name}"
+    return f"{root}/{name}"
+
+
+def hash_local_file(path: str) -> Optional[str]:
+    """:return: The SHA-256 hex digest or None if the file can’t be read."""
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as file:
+            while chunk := file.read(_CHUNK_SIZE):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def hash_local_files(paths: list[str], workers: int = 4) -> list[Optional[str]]:
+    """Hash local files in parallel using a thread pool. hashlib releases
+    the GIL for large buffers."""
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(hash_local_file, paths))
+
+
+def hash_remote_files(host: str, paths: list[str]) -> list[Optional[str]]:
+    """Hash files on a remote host using one batched SSH command.
+
+    ``sha256sum`` (GNU coreutils) is required on the remote host. The SSH
+    options of ``--rsync-args -e`` aren’t used, only ``~/.ssh/config``.
+
+    :param host: ``[USER@]HOST``
+
+    :return: The digests, None for files that can’t be read.
+
+    :raise OSError: If ssh fails, for example if the host isn’t reachable,
+      or if ``sha256sum`` can’t be run. ``sha256sum`` exits with 1 if only
+      some files can’t be read.
+    """
+    if not paths:
+        return []
+    command = "sha256sum -- " + " ".join(shlex.quote(path) for path in paths)
+    process = subprocess.run(
+        ["ssh", host, command],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        encoding="utf-8",
+        errors="replace",
+    )
+    if process.returncode not in (0, 1):
+        raise OSError(
+            f"Can’t hash the files on {host} (exit code {process.returncode}): "
+            f"{process.stderr.strip()}"
+        )
+    digests: dict[str, str] = {}
+    for line in process.stdout.splitlines():
+        digest, separator, path = line.partition("  ")
+        if separator:
+            digests[path] = digest
+    return [digests.get(path) for path in paths]
+
+
+def hash_files(root: str, names: list[str], workers: int = 4) -> list[Optional[str]]:
+    """Hash the files below a local or remote shell (SSH) location."""
+    if is_remote_shell_location(root):
+        host, _, path = root.partition(":")
+        return hash_remote_files(host, [_join(path, name) for name in names])
+    return hash_local_files([_join(root, name) for name in names], workers)
+
+
+class VerificationResult(typing.NamedTuple):
+    files: int
+    """The number of verified files."""
+
+    bytes: int
+    """The size of the verified files."""
+
+    mismatches: list[str]
+    """The names of the files whose checksums differ or which are missing
+    on one side."""
+
+    duration: float
+
+    errors: tuple[str, ...] = ()
+    """The reasons a side couldn’t be verified at all, for example an
+    unreachable host. Its files are neither verified nor mismatches."""
+
+    @property
+    def performance_data(self) -> dict[str, int | float]:
+        return {
+            "verify_files": self.files,
+            "verify_mismatches": len(self.mismatches),
+            "verify_errors": len(self.errors),
+            "verify_bytes": self.bytes,
+            "verify_duration": round(self.duration, 3),
+            "verify_bytes_per_sec": round(self.bytes / self.duration, 2)
+            if self.duration > 0
+            else 0.0,
+        }
+
+    def format(self, limit: int = 10) -> str:
+        lines: list[str] = [
+            f"Verification: {self.files} files, {len(self.mismatches)} mismatches"
+        ]
+        for name in self.mismatches[:limit]:
+            lines.append(f"  mismatch: {name}")
+        if len(self.mismatches) > limit:
+            lines.append(f"  … and {len(self.mismatches) - limit} more")
+        for error in self.errors:
+            lines.append(f"  couldn’t verify: {error}")
+        return "\n".join(lines)
+
+
+def merge_results(results: list[VerificationResult]) -> VerificationResult:
+    return VerificationResult(
+        sum(result.files for result in results),
+        sum(result.bytes for result in results),
+        [name for result in results for name in result.mismatches],
+        sum(result.duration for result in results),
+        tuple(error for result in results for error in result.errors),
+    )
+
+
+def verify(
+    src: str,
+    dest: str,
+    lines: Iterable[OutFormatLine],
+    count: int = 20,
+    sampling: Sampling = "random",
+    workers: int = 4,
+) -> VerificationResult:
+    """Compare the checksums of a sample of the transferred files on both
+    sides. The two sides are hashed concurrently.
+
+    If a side can’t be hashed at all, the error is recorded in
+    :attr:`VerificationResult.errors` and no file is verified.
+
+    :raise ValueError: If one side is a rsync daemon, which doesn’t allow
+      reading checksums.
+    """
+    for location in (src, dest):
+        if is_daemon_location(location):
+            raise ValueError(f"Can’t verify files of a rsync daemon: {location}")
+    start = time.monotonic()
+    sample = sample_files(lines, count, sampling)
+    names = [line.name for line in sample]
+    src_root, dest_root = resolve_root(src, dest)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        src_future = executor.submit(hash_files, src_root, names, workers)
+        dest_future = executor.submit(hash_files, dest_root, names, workers)
+        errors: list[str] = []
+        digests: list[list[Optional[str]]] = []
+        for future in (src_future, dest_future):
+            try:
+                digests.append(future.result())
+            except OSError as error:
+                errors.append(str(error))
+    if errors:
+        return VerificationResult(0, 0, [], time.monotonic() - start, tuple(errors))
+    mismatches = [
+        name
+        for name, src_digest, dest_digest in zip(names, *digests)
+        if src_digest is None or src_digest != dest_digest
+    ]
+    return VerificationResult(
+        len(sample),
+        sum(line.size for line in sample),
+        mismatches,
+        time.monotonic() - start,
+    )
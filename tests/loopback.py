@@ -0,0 +1,433 @@
+"""A loopback benchmark harness: sync synthetic source trees with the real
+rsync through rsync-watch on one machine.
+
+The destination is a local directory or a local rsync daemon. The daemon
+can be reached through a proxy that adds latency and limits the
+bandwidth to simulate a slow network. rsync-watch runs in a subprocess
+without report channels; the wall time, the time spent in
+:func:`rsync_watch.parse_stats`, the peak memory and the CPU time of
+rsync-watch and its rsync processes are recorded.
+
+Usage::
+
+    python tests/loopback.py --profile small-files --target daemon \\
+        --latency 0.02 --bandwidth 1048576
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import queue
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import typing
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any, Literal, Optional
+
+from rsync_watch.daemon import DaemonError, list_modules
+
+Profile = Literal["small-files", "huge-files", "deep"]
+
+Target = Literal["local", "daemon"]
+
+PROFILES: tuple[Profile, ...] = ("small-files", "huge-files", "deep")
+
+_RESULT_PREFIX: str = "loopback-result: "
+
+_CHUNK_SIZE: int = 64 * 1024
+
+_RUNNER: str = f"""
+import json
+import sys
+import time
+
+import command_watcher.config
+
+# Don’t read /etc/command-watcher.yml: no report channels.
+command_watcher.config._config = command_watcher.config.Config()
+
+import rsync_watch
+
+parse_time = 0.0
+parse_stats = rsync_watch.parse_stats
+
+
+def timed_parse_stats(*args, **kwargs):
+    global parse_time
+    start = time.perf_counter()
+    try:
+        return parse_stats(*args, **kwargs)
+    finally:
+        parse_time += time.perf_counter() - start
+
+
+rsync_watch.parse_stats = timed_parse_stats
+
+reports = []
+deliver = rsync_watch.ChannelDelivery.__call__
+
+
+def capture_report(self, report):
+    reports.append(dict(status=report.status, **report.data))
+    return deliver(self, report)
+
+
+rsync_watch.ChannelDelivery.__call__ = capture_report
+
+sys.argv = ["rsync-watch.py"] + json.loads(sys.argv[1])
+rsync_watch.main()
+print({_RESULT_PREFIX!r} + json.dumps(dict(parse_time=parse_time, reports=reports)))
+"""
+"""Runs rsync-watch and prints the measurements as JSON."""
+
+
+class TreeStats(typing.NamedTuple):
+    files: int
+    bytes: int
+
+
+def _write_file(path: Path, size: int, rand: random.Random) -> None:
+    with open(path, "wb") as file:
+        while size > 0:
+            chunk = min(size, 1024 * 1024)
+            file.write(rand.randbytes(chunk))
+            size -= chunk
+
+
+def generate_tree(
+    root: Path, profile: Profile, scale: float = 1.0, seed: int = 0
+) -> TreeStats:
+    """Generate a reproducible synthetic source tree.
+
+    ``small-files``: 5000 files of 1 to 16 KiB in 50 directories.
+    ``huge-files``: 3 files of 256 MiB.
+    ``deep``: 10 directory chains 30 levels deep with 3 small files per
+    level.
+
+    :param scale: Multiplies the number of files (``small-files``,
+      ``deep``) or the file size (``huge-files``).
+    """
+    rand = random.Random(seed)
+    files: list[tuple[Path, int]] = []
+    if profile == "small-files":
+        for i in range(max(int(5000 * scale), 1)):
+            files.append(
+                (root / f"dir{i % 50:02d}" / f"file{i:05d}", rand.randint(1024, 16384))
+            )
+    elif profile == "huge-files":
+        for i in range(3):
+            files.append((root / f"huge{i}", max(int(256 * 1024**2 * scale), 1)))
+    else:
+        depth = max(int(30 * scale), 1)
+        for chain in range(10):
+            directory = root / f"chain{chain}"
+            for level in range(depth):
+                directory = directory / f"level{level:02d}"
+                for i in range(3):
+                    files.append((directory / f"file{i}", rand.randint(64, 4096)))
+    for path, size in files:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _write_file(path, size, rand)
+    return TreeStats(len(files), sum(size for _, size in files))
+
+
+def modify_tree(root: Path, fraction: float = 0.1, seed: int = 1) -> int:
+    """Rewrite a fraction of the files to benchmark incremental runs.
+
+    :return: The number of modified files.
+    """
+    rand = random.Random(seed)
+    paths = sorted(path for path in root.rglob("*") if path.is_file())
+    modified = rand.sample(paths, max(int(len(paths) * fraction), 1))
+    for path in modified:
+        with open(path, "r+b") as file:
+            file.write(rand.randbytes(min(path.stat().st_size, 4096)))
+    return len(modified)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def rsync_daemon(path: Path, module: str = "dest") -> Iterator[int]:
+    """Run a rsync daemon on localhost with one writable module.
+
+    :return: The port of the daemon.
+    """
+    port = _free_port()
+    with tempfile.TemporaryDirectory(prefix="rsync-watch-daemon-") as directory:
+        config = Path(directory) / "rsyncd.conf"
+        config.write_text(
+            "use chroot = no\n"
+            # As root the daemon would run as nobody by default.
+            f"uid = {os.getuid()}\n"
+            f"gid = {os.getgid()}\n"
+            f"lock file = {directory}/rsyncd.lock\n"
+            f"log file = {directory}/rsyncd.log\n"
+            f"[{module}]\n"
+            f"path = {path}\n"
+            "read only = no\n"
+        )
+        process = subprocess.Popen(
+            [
+                "rsync",
+                "--daemon",
+                "--no-detach",
+                "--address=127.0.0.1",
+                f"--port={port}",
+                f"--config={config}",
+            ]
+        )
+        try:
+            deadline = time.monotonic() + 10
+            while True:
+                try:
+                    list_modules("127.0.0.1", port, timeout=1)
+                    break
+                except (OSError, DaemonError):
+                    if time.monotonic() > deadline or process.poll() is not None:
+                        raise
+                    time.sleep(0.05)
+            yield port
+        finally:
+            process.terminate()
+            process.wait()
+
+
+class ShapingProxy:
+    """A TCP proxy on localhost that delays the data in both directions by
+    ``latency`` seconds and limits the throughput per direction to
+    ``bandwidth`` bytes per second.
+
+    The delay doesn’t block the connection: the data is forwarded
+    continuously, but each chunk is sent ``latency`` seconds after it has
+    been received, like on a link with a long round-trip time.
+    """
+
+    target: tuple[str, int]
+    latency: float
+    bandwidth: Optional[float]
+    port: int
+
+    _server: socket.socket
+    _closed: threading.Event
+
+    def __init__(
+        self,
+        target_port: int,
+        latency: float = 0.0,
+        bandwidth: Optional[float] = None,
+        target_host: str = "127.0.0.1",
+    ) -> None:
+        self.target = (target_host, target_port)
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self._server = socket.create_server(("127.0.0.1", 0))
+        self.port = self._server.getsockname()[1]
+        self._closed = threading.Event()
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def __enter__(self) -> "ShapingProxy":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._closed.set()
+        self._server.close()
+
+    def _accept(self) -> None:
+        while not self._closed.is_set():
+            try:
+                client, _ = self._server.accept()
+            except OSError:
+                return
+            upstream = socket.create_connection(self.target)
+            for source, destination in ((client, upstream), (upstream, client)):
+                chunks: "queue.Queue[tuple[float, bytes]]" = queue.Queue()
+                threading.Thread(
+                    target=self._receive, args=(source, chunks), daemon=True
+                ).start()
+                threading.Thread(
+                    target=self._send, args=(destination, chunks), daemon=True
+                ).start()
+
+    def _receive(
+        self, source: socket.socket, chunks: "queue.Queue[tuple[float, bytes]]"
+    ) -> None:
+        while True:
+            try:
+                data = source.recv(_CHUNK_SIZE)
+            except OSError:
+                data = b""
+            chunks.put((time.monotonic() + self.latency, data))
+            if not data:
+                return
+
+    def _send(
+        self, destination: socket.socket, chunks: "queue.Queue[tuple[float, bytes]]"
+    ) -> None:
+        while True:
+            due, data = chunks.get()
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            if not data:
+                try:
+                    destination.shutdown(socket.SHUT_WR)
+                except OSError:
+                    pass
+                return
+            try:
+                destination.sendall(data)
+            except OSError:
+                return
+            if self.bandwidth:
+                time.sleep(len(data) / self.bandwidth)
+
+
+class BenchmarkResult(typing.NamedTuple):
+    wall_time: float
+    """The wall-clock time of the rsync-watch process in seconds."""
+
+    parse_time: float
+    """The time spent in :func:`rsync_watch.parse_stats` in seconds."""
+
+    max_rss: int
+    """The peak resident set size of the largest process in KiB."""
+
+    cpu_user: float
+    cpu_system: float
+    """The CPU time of rsync-watch and its rsync processes in seconds."""
+
+    returncode: int
+    performance_data: dict[str, Any]
+    """The performance data of the last report."""
+
+    def format(self) -> str:
+        return (
+            f"wall {self.wall_time:.3f}s, parse {self.parse_time * 1000:.2f}ms, "
+            f"cpu {self.cpu_user:.3f}s user {self.cpu_system:.3f}s system, "
+            f"max rss {self.max_rss} KiB"
+        )
+
+
+def run_rsync_watch(args: list[str], state_dir: Path) -> BenchmarkResult:
+    """Run rsync-watch in a subprocess and measure it."""
+    command = [
+        sys.executable,
+        "-c",
+        _RUNNER,
+        json.dumps(["--state-dir", str(state_dir), *args]),
+    ]
+    start = time.monotonic()
+    process = subprocess.Popen(
+        command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+    )
+    assert process.stdout is not None
+    output = process.stdout.read().decode("utf-8", "replace")
+    _, status, usage = os.wait4(process.pid, 0)
+    wall_time = time.monotonic() - start
+    # Popen must not wait for the reaped process again.
+    process.returncode = os.waitstatus_to_exitcode(status)
+    result: dict[str, Any] = {"parse_time": 0.0, "reports": []}
+    for line in output.splitlines():
+        if line.startswith(_RESULT_PREFIX):
+            result = json.loads(line.removeprefix(_RESULT_PREFIX))
+    if process.returncode != 0 or not result["reports"]:
+        raise RuntimeError(f"rsync-watch failed:\n{output}")
+    return BenchmarkResult(
+        wall_time,
+        result["parse_time"],
+        usage.ru_maxrss,
+        usage.ru_utime,
+        usage.ru_stime,
+        process.returncode,
+        result["reports"][-1].get("performance_data", {}),
+    )
+
+
+def benchmark(
+    work_dir: Path,
+    profile: Profile,
+    target: Target = "local",
+    scale: float = 1.0,
+    latency: float = 0.0,
+    bandwidth: Optional[float] = None,
+    rsync_watch_args: typing.Sequence[str] = (),
+) -> tuple[BenchmarkResult, BenchmarkResult]:
+    """Generate a tree, sync it (initial run), modify a tenth of the files
+    and sync it again (incremental run).
+
+    :param latency: Only for the target ``daemon``.
+    :param bandwidth: Only for the target ``daemon``.
+
+    :return: The results of the initial and the incremental run.
+    """
+    src = work_dir / "src"
+    dest = work_dir / "dest"
+    dest.mkdir(parents=True)
+    generate_tree(src, profile, scale)
+    args = [*rsync_watch_args, "--host-name=loopback"]
+
+    def run() -> BenchmarkResult:
+        if target == "local":
+            return run_rsync_watch(args + [f"{src}/", str(dest)], work_dir / "state")
+        with contextlib.ExitStack() as stack:
+            port = stack.enter_context(rsync_daemon(dest))
+            if latency or bandwidth:
+                port = stack.enter_context(ShapingProxy(port, latency, bandwidth)).port
+            return run_rsync_watch(
+                args + [f"{src}/", f"rsync://127.0.0.1:{port}/dest/"],
+                work_dir / "state",
+            )
+
+    initial = run()
+    modify_tree(src)
+    return initial, run()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profile", choices=PROFILES, action="append")
+    parser.add_argument("--target", choices=("local", "daemon"), default="local")
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--latency", type=float, default=0.0, metavar="SECONDS")
+    parser.add_argument("--bandwidth", type=float, metavar="BYTES_PER_SEC")
+    parser.add_argument(
+        "--rsync-watch-args",
+        default="",
+        help="Additional rsync-watch arguments in one string.",
+    )
+    args = parser.parse_args()
+    if shutil.which("rsync") is None:
+        parser.error("rsync is not installed.")
+    for profile in args.profile or PROFILES:
+        with tempfile.TemporaryDirectory(prefix="rsync-watch-loopback-") as work_dir:
+            initial, incremental = benchmark(
+                Path(work_dir),
+                profile,
+                args.target,
+                args.scale,
+                args.latency,
+                args.bandwidth,
+                args.rsync_watch_args.split(),
+            )
+        print(f"{profile} initial:     {initial.format()}")
+        print(f"{profile} incremental: {incremental.format()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import json
+from pathlib import Path
+
+from rsync_watch.autotune import CANDIDATES, AutoTuner
+from rsync_watch.stats import Stats
+
+
+def get_tuner(tmp_path: Path, **kwargs: int) -> AutoTuner:
+    return AutoTuner(str(tmp_path / "service.autotune.json"), **kwargs)
+
+
+def get_stats(duration: float, transferred_size: int = 100) -> Stats:
+    return {
+        "duration": duration,
+        "transferred_size": transferred_size,
+        "bytes_sent": 100,
+        "literal_data": 50,
+    }
+
+
+DURATIONS: dict[str, float] = {
+    "default": 5.0,
+    "compress": 3.0,
+    "compress-zstd": 2.0,
+    "checksum-xxh128": 4.0,
+    "whole-file": 6.0,
+}
+
+
+def run(tmp_path: Path, **kwargs: int) -> str:
+    tuner = get_tuner(tmp_path, **kwargs)
+    candidate = tuner.select()
+    tuner.record(candidate, get_stats(DURATIONS[candidate.name]))
+    return candidate.name
+
+
+class TestAutoTuner:
+    def test_explore_then_converge(self, tmp_path: Path) -> None:
+        names = [run(tmp_path, samples=2) for _ in range(12)]
+        assert names[:10] == [c.name for c in CANDIDATES for _ in range(2)]
+        assert names[10:] == ["compress-zstd", "compress-zstd"]
+        assert get_tuner(tmp_path, samples=2).best() == CANDIDATES[2]
+
+    def test_reexplore(self, tmp_path: Path) -> None:
+        names = [run(tmp_path, samples=1, reexplore_every=10) for _ in range(10)]
+        assert names[5:9] == ["compress-zstd"] * 4
+        # The candidate tried least recently
+        assert names[9] == "default"
+
+    def test_rejected_candidate_is_excluded(self, tmp_path: Path) -> None:
+        tuner = get_tuner(tmp_path, samples=1)
+        tuner.record(tuner.select(), get_stats(5))
+        candidate = tuner.select()
+        assert candidate.name == "compress"
+        tuner.record_failure(candidate, 1)
+        tuner = get_tuner(tmp_path, samples=1)
+        assert tuner.failed == ["compress"]
+        assert tuner.select().name == "compress-zstd"
+
+    def test_transient_failure_is_retried(self, tmp_path: Path) -> None:
+        tuner = get_tuner(tmp_path, samples=1)
+        tuner.record(tuner.select(), get_stats(5))
+        tuner.record_failure(tuner.select(), 12)
+        # The run is killed, record() is never called.
+        assert get_tuner(tmp_path, samples=1).select().name == "compress"
+        tuner = get_tuner(tmp_path, samples=1)
+        assert tuner.failed == []
+        assert tuner.select().name == "compress"
+
+    def test_default_is_never_excluded(self, tmp_path: Path) -> None:
+        tuner = get_tuner(tmp_path)
+        tuner.record_failure(tuner.select(), 2)
+        tuner = get_tuner(tmp_path)
+        assert tuner.failed == []
+        assert tuner.candidates[0].name == "default"
+
+    def test_cost_per_transferred_volume(self, tmp_path: Path) -> None:
+        tuner = get_tuner(tmp_path, samples=1)
+        # The initial full copy takes long, but is cheap per MiB.
+        tuner.record(tuner.select(), get_stats(100, 1000 * 1024**2))
+        tuner.record(tuner.select(), get_stats(2))
+        assert tuner.mean_cost(CANDIDATES[0]) == 0.1
+        assert tuner.mean_cost(CANDIDATES[1]) == 2
+        assert tuner.best() == CANDIDATES[0]
+
+    def test_history_is_bounded(self, tmp_path: Path) -> None:
+        for _ in range(20):
+            run(tmp_path, samples=2)
+        state = json.loads((tmp_path / "service.autotune.json").read_text())
+        assert all(len(results) <= 2 for results in state["history"].values())
+
+    def test_format(self, tmp_path: Path) -> None:
+        tuner = get_tuner(tmp_path, samples=1)
+        candidate = tuner.select()
+        tuner.record(candidate, get_stats(5))
+        candidate = tuner.select()
+        assert tuner.format(candidate) == (
+            "Auto-tune: compress (--compress)\n  default: 5.000s/MiB (mean of 1 runs)"
+        )
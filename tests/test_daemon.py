@@ -0,0 +1,133 @@
+import socket
+import threading
+from collections.abc import Iterator
+from unittest.mock import Mock
+
+import pytest
+
+from rsync_watch.check import ChecksCollection
+from rsync_watch.daemon import (
+    DaemonError,
+    DaemonLocation,
+    is_daemon_location,
+    is_remote_shell_location,
+    list_modules,
+    parse_daemon_location,
+)
+
+MODULE_LIST: bytes = (
+    b"@RSYNCD: 31.0 sha512 sha256 sha1 md5 md4\n"
+    b"Welcome to the backup server\n"
+    b"backup         \tNightly backups\n"
+    b"media          \tPictures and videos\n"
+    b"@RSYNCD: EXIT\n"
+)
+
+
+def serve(answer: bytes) -> tuple[int, threading.Thread]:
+    """Start a fake rsync daemon answering one connection."""
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(1)
+
+    def handle() -> None:
+        connection, _ = server.accept()
+        with connection, server:
+            greeting, _, rest = answer.partition(b"\n")
+            connection.sendall(greeting + b"\n")
+            received = b""
+            while not received.endswith(b"\n\n"):
+                received += connection.recv(1024)
+            assert received == b"@RSYNCD: 30.0\n\n"
+            connection.sendall(rest)
+
+    thread = threading.Thread(target=handle)
+    thread.start()
+    return server.getsockname()[1], thread
+
+
+@pytest.fixture
+def daemon_port() -> Iterator[int]:
+    port, thread = serve(MODULE_LIST)
+    yield port
+    thread.join()
+
+
+class TestLocation:
+    @pytest.mark.parametrize(
+        "location, daemon, remote_shell",
+        [
+            ("rsync://host/module", True, False),
+            ("user@host::module/path", True, False),
+            ("host:path", False, True),
+            ("user@host:/path", False, True),
+            ("/local/path", False, False),
+            ("./local:path", False, False),
+            ("./local::path", False, False),
+        ],
+    )
+    def test_kind(self, location: str, daemon: bool, remote_shell: bool) -> None:
+        assert is_daemon_location(location) == daemon
+        assert is_remote_shell_location(location) == remote_shell
+
+    def test_parse_url(self) -> None:
+        assert parse_daemon_location(
+            "rsync://backup@example.com:8873/module/sub/dir"
+        ) == DaemonLocation("example.com", 8873, "module", "backup")
+
+    def test_parse_url_default_port(self) -> None:
+        assert parse_daemon_location("rsync://example.com/module") == DaemonLocation(
+            "example.com", 873, "module", None
+        )
+
+    def test_parse_double_colon(self) -> None:
+        assert parse_daemon_location("backup@example.com::module/dir") == (
+            DaemonLocation("example.com", 873, "module", "backup")
+        )
+
+    def test_parse_no_daemon(self) -> None:
+        with pytest.raises(ValueError):
+            parse_daemon_location("example.com:/dir")
+
+
+class TestListModules:
+    def test_list(self, daemon_port: int) -> None:
+        assert list_modules("127.0.0.1", daemon_port) == ["backup", "media"]
+
+    def test_error(self) -> None:
+        port, thread = serve(b"@RSYNCD: 31.0\n@ERROR: access denied\n")
+        with pytest.raises(DaemonError, match="access denied"):
+            list_modules("127.0.0.1", port)
+        thread.join()
+
+
+class TestCheckRsyncDaemon:
+    def get_checks(self) -> ChecksCollection:
+        return ChecksCollection(watch=Mock(), raise_exception=False)
+
+    def test_pass(self, daemon_port: int) -> None:
+        checks = self.get_checks()
+        checks.check_rsync_daemon(f"rsync://127.0.0.1:{daemon_port}/media/2024")
+        assert checks.have_passed()
+
+    def test_module_unlisted(self, daemon_port: int) -> None:
+        watch = Mock()
+        checks = ChecksCollection(watch=watch, raise_exception=False)
+        checks.check_rsync_daemon(f"rsync://127.0.0.1:{daemon_port}/music")
+        # A module with “list = no” is still reachable.
+        assert checks.have_passed()
+        watch.log.warning.assert_called_once_with(
+            "--check-rsync-daemon: The module 'music' isn’t listed by "
+            f"'127.0.0.1:{daemon_port}', it may be unlisted (list = no)."
+        )
+
+    def test_unreachable(self) -> None:
+        with socket.socket() as unused:
+            unused.bind(("127.0.0.1", 0))
+            port = unused.getsockname()[1]
+        checks = self.get_checks()
+        checks.check_rsync_daemon(f"rsync://127.0.0.1:{port}/media")
+        assert not checks.have_passed()
+        assert checks.messages.startswith(
+            f"--check-rsync-daemon: 'rsync://127.0.0.1:{port}/media' is not reachable"
+        )
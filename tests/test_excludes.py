@@ -0,0 +1,110 @@
+from pathlib import Path
+
+from rsync_watch.excludes import (
+    Rule,
+    build_filter_args,
+    compile_rules,
+    is_shadowed,
+    parse_rule,
+    parse_rules,
+    read_rule_file,
+)
+
+
+def exclude(pattern: str) -> Rule:
+    return Rule(False, pattern)
+
+
+def include(pattern: str) -> Rule:
+    return Rule(True, pattern)
+
+
+class TestParseRule:
+    def test_prefixes(self) -> None:
+        assert parse_rule("+ *.txt\n") == include("*.txt")
+        assert parse_rule("- *.tmp") == exclude("*.tmp")
+        assert parse_rule("cache/") == exclude("cache/")
+
+    def test_comments(self) -> None:
+        assert parse_rule("# comment", comments=True) is None
+        assert parse_rule("; comment", comments=True) is None
+        assert parse_rule("\n") is None
+
+    def test_no_comments_in_arguments(self) -> None:
+        # A common exclude on Synology systems
+        assert parse_rules(["#recycle", ";x", "@eaDir"]) == [
+            exclude("#recycle"),
+            exclude(";x"),
+            exclude("@eaDir"),
+        ]
+
+    def test_clear(self) -> None:
+        assert parse_rules(["a", "!", "b"]) == [exclude("b")]
+
+    def test_read_rule_file(self, tmp_path: Path) -> None:
+        path = tmp_path / "rules"
+        path.write_text("# caches\n.cache/\n\n+ keep.tmp\n*.tmp\n")
+        assert read_rule_file(str(path)) == [
+            exclude(".cache/"),
+            include("keep.tmp"),
+            exclude("*.tmp"),
+        ]
+
+
+class TestIsShadowed:
+    def test_unanchored_parent(self) -> None:
+        assert is_shadowed(exclude("node_modules/foo"), exclude("node_modules"))
+        assert is_shadowed(exclude("/a/node_modules/b/"), exclude("node_modules/"))
+        assert is_shadowed(exclude("x/a/b/c"), exclude("a/b"))
+        assert not is_shadowed(exclude("node_modules"), exclude("node_modules"))
+
+    def test_anchored_parent(self) -> None:
+        assert is_shadowed(exclude("/home/tmp/x"), exclude("/home"))
+        assert not is_shadowed(exclude("home/tmp"), exclude("/home"))
+        assert not is_shadowed(exclude("/x/home/tmp"), exclude("/home"))
+
+    def test_wildcards(self) -> None:
+        assert is_shadowed(exclude("build.cache/x"), exclude("*.cache"))
+        assert not is_shadowed(exclude("*/x"), exclude("a"))
+        assert not is_shadowed(exclude("a/b/c"), exclude("a/**"))
+
+    def test_parent_needs_to_be_deeper(self) -> None:
+        # The parent could match above the rule, which is unknown.
+        assert not is_shadowed(exclude("b/c"), exclude("a/b"))
+
+    def test_include_parent(self) -> None:
+        assert not is_shadowed(exclude("a/b"), include("a"))
+
+
+class TestCompileRules:
+    def test_duplicates(self) -> None:
+        assert compile_rules([exclude("a"), exclude("b"), exclude("a")]) == [
+            exclude("a"),
+            exclude("b"),
+        ]
+
+    def test_shadowed(self) -> None:
+        assert compile_rules(
+            [exclude("a/b"), exclude("/c/d"), exclude("a"), include("/c/d/e")]
+        ) == [exclude("/c/d"), exclude("a")]
+
+    def test_include_before_exclude(self) -> None:
+        rules = [include("*/"), exclude("a"), exclude("a/b")]
+        assert compile_rules(rules) == rules
+
+
+class TestBuildFilterArgs:
+    def test_inline(self, tmp_path: Path) -> None:
+        assert build_filter_args([include("a/b"), exclude("a")], str(tmp_path)) == [
+            "--include=a/b",
+            "--exclude=a",
+        ]
+
+    def test_file(self, tmp_path: Path) -> None:
+        rules = [exclude(f"dir{i}") for i in range(17)] + [include("x")]
+        args = build_filter_args(rules, str(tmp_path))
+        path = tmp_path / "filter.rules"
+        assert args == [f"--exclude-from={path}"]
+        lines = path.read_text().splitlines()
+        assert lines[0] == "- dir0"
+        assert lines[-1] == "+ x"
@@ -0,0 +1,89 @@
+from rsync_watch.histogram import (
+    OUT_FORMAT,
+    FileHistogram,
+    iter_out_format_lines,
+)
+
+OUTPUT: str = """
+sending incremental file list
+rsync-watch-file: cd+++++++++ 4,096 0 dir/
+rsync-watch-file: >f+++++++++ 10 10 dir/tiny.txt
+rsync-watch-file: >f.st...... 2000 120 dir/small file.txt
+rsync-watch-file: >f+++++++++ 5000000 5000000 dir/medium.iso
+rsync-watch-file: >f+++++++++ 2147483648 2147483648 dir/huge.img
+rsync-watch-file: cL+++++++++ 8 0 dir/link -> tiny.txt
+rsync-watch-file: *deleting 0 0 dir/old.txt
+Number of files: 7 (reg: 4, dir: 1, link: 1)
+"""
+
+
+class TestOutFormat:
+    def test_prefix(self) -> None:
+        assert OUT_FORMAT == "rsync-watch-file: %i %l %b %n"
+
+    def test_iter_lines(self) -> None:
+        lines = list(iter_out_format_lines(OUTPUT))
+        assert len(lines) == 7
+        assert lines[0].size == 4096
+        assert not lines[0].is_file
+        assert lines[2].name == "dir/small file.txt"
+        assert lines[2].transferred == 120
+        assert lines[2].is_file
+        assert not lines[6].is_file
+        assert lines[2].is_transferred
+        assert not lines[0].is_transferred
+
+
+class TestFileHistogram:
+    def test_from_output(self) -> None:
+        histogram = FileHistogram.from_output(OUTPUT)
+        assert histogram.performance_data == {
+            "histogram_files_lt_1k": 1,
+            "histogram_bytes_lt_1k": 10,
+            "histogram_files_lt_16k": 1,
+            "histogram_bytes_lt_16k": 120,
+            "histogram_files_lt_256k": 0,
+            "histogram_bytes_lt_256k": 0,
+            "histogram_files_lt_4m": 0,
+            "histogram_bytes_lt_4m": 0,
+            "histogram_files_lt_64m": 1,
+            "histogram_bytes_lt_64m": 5000000,
+            "histogram_files_lt_1g": 0,
+            "histogram_bytes_lt_1g": 0,
+            "histogram_files_ge_1g": 1,
+            "histogram_bytes_ge_1g": 2147483648,
+        }
+
+    def test_only_transferred_files(self) -> None:
+        histogram = FileHistogram.from_output(
+            "rsync-watch-file: .f..t...... 5000 0 unchanged.txt\n"
+            "rsync-watch-file: hf+++++++++ 6000 0 hardlink.txt\n"
+            "rsync-watch-file: cf+++++++++ 7000 0 local.txt\n"
+            "rsync-watch-file: <f+++++++++ 8000 8000 sent.txt\n"
+        )
+        assert histogram.counts[1] == 1
+        assert histogram.transferred[1] == 8000
+        assert histogram.largest == [(8000, 8000, "sent.txt")]
+
+    def test_bucket_bounds(self) -> None:
+        histogram = FileHistogram()
+        histogram.add(1023, 0, "a")
+        histogram.add(1024, 0, "b")
+        assert histogram.counts[:2] == [1, 1]
+
+    def test_top(self) -> None:
+        histogram = FileHistogram(top=2)
+        for size in (5, 1, 9, 3, 7):
+            histogram.add(size, size, f"file{size}")
+        assert histogram.largest == [(9, 9, "file9"), (7, 7, "file7")]
+
+    def test_top_zero(self) -> None:
+        histogram = FileHistogram(top=0)
+        histogram.add(5, 5, "file")
+        assert histogram.largest == []
+
+    def test_format(self) -> None:
+        output = FileHistogram.from_output(OUTPUT, top=1).format()
+        assert "lt_1k            1                 10" in output
+        assert "Largest transferred files (top 1):" in output
+        assert output.endswith("2147483648      2147483648  dir/huge.img")
@@ -1,12 +1,21 @@
+import datetime
 import os
+from collections.abc import Iterator
 from dataclasses import dataclass
+from pathlib import Path
 from typing import List
 from unittest.mock import Mock, patch
 
 import pytest
+from command_watcher.channels.base_channel import BaseChannel
+from command_watcher.log import setup_logging
+from command_watcher.message import Message
 from stdout_stderr_capturing import Capturing
 
 import rsync_watch
+from rsync_watch.autotune import AutoTuner
+from rsync_watch.lock import ServiceLock
+from rsync_watch.reporting import ChannelDelivery, Report
 
 OUTPUT: str = """
 sending incremental file list
@@ -28,6 +37,32 @@ total size is 0  speedup is 0.00
 """
 
 
+def get_process(stdout: str = OUTPUT, returncode: int = 0) -> Mock:
+    """A mocked :class:`command_watcher.CommandExecutor`."""
+    process = Mock(stdout=stdout)
+    process.subprocess.returncode = returncode
+    return process
+
+
+@pytest.fixture(autouse=True)
+def report_through_watch() -> Iterator[None]:
+    """Deliver each report with one call of the mocked ``Watch.report``
+    instead of per channel, so the tests can inspect the reports."""
+
+    class Forward:
+        def __init__(self, watch: Mock, service_name: str) -> None:
+            self.watch = watch
+
+        def capture(self, report: Report) -> Report:
+            return report
+
+        def __call__(self, report: Report) -> None:
+            self.watch.report(status=report.status, **report.data)
+
+    with patch("rsync_watch.ChannelDelivery", Forward):
+        yield
+
+
 @dataclass
 class PatchResult:
     stdout: Capturing
@@ -46,7 +81,6 @@ class PatchResult:
                 "tmp1",
                 "tmp2",
             ],
-            ignore_exceptions=[24],
         )
 
 
@@ -64,8 +98,8 @@ def _patch(
         Capturing(stream="stderr") as stderr,
     ):
         watch = Watch.return_value
-        watch.run.return_value.returncode = watch_run_returncode
         watch.stdout = watch_run_stdout
+        watch.run.return_value = get_process(watch_run_stdout, watch_run_returncode)
         if mocks_subprocess_run:
             subprocess_run.side_effect = mocks_subprocess_run
 
@@ -80,8 +114,7 @@ class TestIntegrationMock:
     def test_log_info(self) -> None:
         result = _patch(["--host-name", "test1", "tmp1", "tmp2"])
         result.watch.run.assert_called_with(
-            ["rsync", "-av", "--delete", "--stats", "tmp1", "tmp2"],
-            ignore_exceptions=[24],
+            ["rsync", "-av", "--delete", "--stats", "tmp1", "tmp2"]
         )
 
         info = result.watch.log.info
@@ -89,6 +122,20 @@ class TestIntegrationMock:
         info.assert_any_call("Destination: tmp2")
         result.watch.log.info.assert_any_call("Service name: rsync_test1_tmp1_tmp2")
 
+    def test_report_duration(self) -> None:
+        with patch("rsync_watch.time.monotonic", side_effect=[10.0, 12.0]):
+            result = _patch(["tmp1", "tmp2"])
+        performance_data = result.watch.report.call_args.kwargs["performance_data"]
+        assert performance_data["duration"] == 2.0
+        assert performance_data["effective_bytes_per_sec"] == 13.5
+        assert performance_data["bytes_per_sec"] == 156.0
+
+    def test_report_resource_usage(self) -> None:
+        result = _patch(["tmp1", "tmp2"])
+        performance_data = result.watch.report.call_args.kwargs["performance_data"]
+        for key in ("cpu_user", "cpu_system", "max_rss_so_far", "block_input"):
+            assert key in performance_data
+
     def test_option_rsync_args(self) -> None:
         result = _patch(["--rsync-args", '--exclude "lol lol"', "tmp1", "tmp2"])
         result.watch.run.assert_called_with(
@@ -102,7 +149,6 @@ class TestIntegrationMock:
                 "tmp1",
                 "tmp2",
             ],
-            ignore_exceptions=[24],
         )
 
 
@@ -115,6 +161,10 @@ class TestOptionExclude:
         result = _patch(["--exclude=school", '--exclude="My Music"', "tmp1", "tmp2"])
         result.assert_exclude_args("--exclude=school", '--exclude="My Music"')
 
+    def test_hash_sign(self) -> None:
+        result = _patch(["--exclude=#recycle", "--exclude=@eaDir", "tmp1", "tmp2"])
+        result.assert_exclude_args("--exclude=#recycle", "--exclude=@eaDir")
+
     def test_without_equal_sign(self) -> None:
         result = _patch(["--exclude", "school", "tmp1", "tmp2"])
         result.assert_exclude_args("--exclude=school")
@@ -123,6 +173,32 @@ class TestOptionExclude:
         result = _patch(["tmp1", "tmp2"])
         result.assert_exclude_args()
 
+    def test_compiled(self) -> None:
+        result = _patch(["--exclude=a/b", "--exclude=a", "--exclude=a", "tmp1", "tmp2"])
+        result.assert_exclude_args("--exclude=a")
+        performance_data = result.watch.report.call_args.kwargs["performance_data"]
+        assert performance_data["exclude_rules"] == 1
+        assert performance_data["exclude_rules_removed"] == 2
+
+    def test_exclude_from(self, tmp_path: Path) -> None:
+        rules = tmp_path / "rules"
+        rules.write_text("".join(f"dir{i}/\n" for i in range(20)))
+        commands: list[list[str]] = []
+
+        def run(command: list[str], **kwargs: object) -> Mock:
+            # The temporary rule file only exists during the run.
+            exclude_from = command[4].split("=", 1)[1]
+            commands.append(command)
+            assert Path(exclude_from).read_text().startswith("- dir0/\n")
+            return get_process()
+
+        with patch("rsync_watch.Watch") as Watch:
+            Watch.return_value.run.side_effect = run
+            with patch("sys.argv", ["cmd", f"--exclude-from={rules}", "tmp1", "tmp2"]):
+                rsync_watch.main()
+        assert commands[0][4].startswith("--exclude-from=")
+        assert commands[0][5:] == ["tmp1", "tmp2"]
+
 
 class TestOptionCheckSshLogin:
     def test_action_check_failed_pass(self) -> None:
@@ -142,8 +218,7 @@ class TestOptionCheckSshLogin:
             ["ssh", "test@example.com", "ls"], stderr=-3, stdout=-3
         )
         result.watch.run.assert_called_with(
-            ["rsync", "-av", "--delete", "--stats", "tmp1", "tmp2"],
-            ignore_exceptions=[24],
+            ["rsync", "-av", "--delete", "--stats", "tmp1", "tmp2"]
         )
 
     def test_action_check_failed_fail(self) -> None:
@@ -200,8 +275,7 @@ class TestOptionCheckPing:
             ["ping", "-c", "3", "8.8.8.8"], stderr=-3, stdout=-3
         )
         result.watch.run.assert_called_with(
-            ["rsync", "-av", "--delete", "--stats", "tmp1", "tmp2"],
-            ignore_exceptions=[24],
+            ["rsync", "-av", "--delete", "--stats", "tmp1", "tmp2"]
         )
 
     def test_no_exception_fail(self) -> None:
@@ -222,8 +296,7 @@ class TestOptionCheckPing:
             ["ping", "-c", "3", "8.8.8.8"], stderr=-3, stdout=-3
         )
         result.watch.run.assert_called_with(
-            ["rsync", "-av", "--delete", "--stats", "tmp1", "tmp2"],
-            ignore_exceptions=[24],
+            ["rsync", "-av", "--delete", "--stats", "tmp1", "tmp2"]
         )
 
 
@@ -241,8 +314,7 @@ class TestOptionCheckFile:
         )
         assert result.watch.run.call_count == 1
         result.watch.run.assert_any_call(
-            ["rsync", "-av", "--delete", "--stats", "tmp1", "tmp2"],
-            ignore_exceptions=[24],
+            ["rsync", "-av", "--delete", "--stats", "tmp1", "tmp2"]
         )
 
     def test_action_check_failed_fail(self) -> None:
@@ -279,7 +351,29 @@ class TestOptionDestUserGroup:
                 "tmp1",
                 "tmp2",
             ],
-            ignore_exceptions=[24],
+        )
+
+    def test_dest_daemon(self) -> None:
+        result = _patch(
+            [
+                "--dest-user-group=jf",
+                "--password-file=/etc/rsync.secret",
+                "tmp1",
+                "rsync://backup@remote/module",
+            ]
+        )
+        result.watch.run.assert_any_call(
+            [
+                "rsync",
+                "-av",
+                "--delete",
+                "--stats",
+                "--usermap=*:jf",
+                "--groupmap=*:jf",
+                "--password-file=/etc/rsync.secret",
+                "tmp1",
+                "rsync://backup@remote/module",
+            ],
         )
 
     def test_dest_remote(self) -> None:
@@ -296,5 +390,534 @@ class TestOptionDestUserGroup:
                 "tmp1",
                 "remote:tmp2",
             ],
-            ignore_exceptions=[24],
         )
+
+
+class TestOptionLockPolicy:
+    def hold_lock(self, lock_dir: str) -> ServiceLock:
+        lock = ServiceLock("rsync_test1_tmp1_tmp2", lock_dir)
+        lock.acquire()
+        return lock
+
+    def test_free(self, tmp_path: Path) -> None:
+        result = _patch(
+            ["--host-name=test1", "--lock-policy=skip", f"--lock-dir={tmp_path}"]
+            + ["tmp1", "tmp2"]
+        )
+        assert result.watch.run.call_count == 1
+
+    def test_default_lock_dir(self, tmp_path: Path) -> None:
+        lock = self.hold_lock(str(tmp_path))
+        result = _patch(
+            ["--host-name=test1", "--lock-policy=skip", f"--state-dir={tmp_path}"]
+            + ["tmp1", "tmp2"]
+        )
+        lock.release()
+        assert result.watch.run.call_count == 0
+
+    @pytest.mark.parametrize("lock_policy", ["skip", "wait", "coalesce"])
+    def test_stale_pending_marker(self, tmp_path: Path, lock_policy: str) -> None:
+        ServiceLock("rsync_test1_tmp1_tmp2", str(tmp_path)).request_pass()
+        result = _patch(
+            ["--host-name=test1", f"--lock-policy={lock_policy}"]
+            + [f"--lock-dir={tmp_path}", "tmp1", "tmp2"]
+        )
+        assert result.watch.run.call_count == 1
+        assert not (tmp_path / "rsync_test1_tmp1_tmp2.pending").exists()
+
+    def test_skip(self, tmp_path: Path) -> None:
+        lock = self.hold_lock(str(tmp_path))
+        result = _patch(
+            ["--host-name=test1", "--lock-policy=skip", f"--lock-dir={tmp_path}"]
+            + ["tmp1", "tmp2"]
+        )
+        lock.release()
+        assert result.watch.run.call_count == 0
+        result.watch.report.assert_called_once_with(
+            status=1,
+            custom_message="Another instance of “rsync_test1_tmp1_tmp2” is "
+            "running, skipped this run.",
+        )
+
+    def test_wait_timeout(self, tmp_path: Path) -> None:
+        lock = self.hold_lock(str(tmp_path))
+        result = _patch(
+            ["--host-name=test1", "--lock-policy=wait", "--lock-timeout=0"]
+            + [f"--lock-dir={tmp_path}", "tmp1", "tmp2"]
+        )
+        lock.release()
+        assert result.watch.run.call_count == 0
+        assert result.watch.report.call_args.kwargs["status"] == 1
+
+    def test_coalesce(self, tmp_path: Path) -> None:
+        lock = self.hold_lock(str(tmp_path))
+        result = _patch(
+            ["--host-name=test1", "--lock-policy=coalesce", f"--lock-dir={tmp_path}"]
+            + ["tmp1", "tmp2"]
+        )
+        assert result.watch.run.call_count == 0
+        assert result.watch.report.call_args.kwargs["status"] == 0
+        assert lock.next_pass()
+        lock.release()
+
+
+class TestOptionFileHistogram:
+    def test_histogram(self) -> None:
+        result = _patch(
+            ["--file-histogram", "tmp1", "tmp2"],
+            watch_run_stdout="rsync-watch-file: >f+++++++++ 10 10 a.txt\n" + OUTPUT,
+        )
+        result.assert_exclude_args("--out-format=rsync-watch-file: %i %l %b %n")
+        kwargs = result.watch.report.call_args.kwargs
+        assert kwargs["performance_data"]["histogram_files_lt_1k"] == 1
+        assert kwargs["performance_data"]["num_files"] == 1
+        assert "a.txt" in kwargs["body"]
+
+
+class TestOptionAutoTune:
+    def test_auto_tune(self, tmp_path: Path) -> None:
+        args = ["--auto-tune", f"--state-dir={tmp_path}", "--host-name=test1"]
+        for _ in range(3):
+            result = _patch(args + ["tmp1", "tmp2"])
+            result.assert_exclude_args()
+        body = result.watch.report.call_args.kwargs["body"]
+        assert body.startswith("Auto-tune: default (no additional arguments)")
+        result = _patch(args + ["tmp1", "tmp2"])
+        result.assert_exclude_args("--compress")
+        assert (tmp_path / "rsync_test1_tmp1_tmp2.autotune.json").exists()
+
+    @pytest.mark.parametrize("returncode,failed", [(1, ["compress"]), (12, [])])
+    def test_failure(self, tmp_path: Path, returncode: int, failed: list[str]) -> None:
+        state_file = str(tmp_path / "rsync_h_tmp1_tmp2.autotune.json")
+        tuner = AutoTuner(state_file)
+        # The default options have been explored, “compress” is next.
+        tuner.history["default"] = [{"duration": 1.0}] * 3
+        tuner.save()
+        with pytest.raises(rsync_watch.RsyncFailedError):
+            _patch(
+                ["--auto-tune", f"--state-dir={tmp_path}", "--host-name=h"]
+                + ["tmp1", "tmp2"],
+                watch_run_stdout="",
+                watch_run_returncode=returncode,
+            )
+        tuner = AutoTuner(state_file)
+        assert tuner.pending is None
+        assert tuner.failed == failed
+
+
+class TestOptionPriority:
+    def test_preexec_fn(self) -> None:
+        result = _patch(["--nice=10", "--ionice-class=idle", "tmp1", "tmp2"])
+        assert callable(result.watch.run.call_args.kwargs["preexec_fn"])
+        body = result.watch.report.call_args.kwargs["body"]
+        assert body == "Priority: nice 10, ionice idle"
+
+
+class EmailChannel(BaseChannel):
+    def __init__(self) -> None:
+        self.messages: list[Message] = []
+
+    def report(self, message: Message) -> None:
+        self.messages.append(message)
+
+
+class IcingaChannel(BaseChannel):
+    def __init__(self, fail: bool) -> None:
+        self.fail = fail
+        self.messages: list[Message] = []
+
+    def report(self, message: Message) -> None:
+        if self.fail:
+            raise ConnectionError("unreachable")
+        self.messages.append(message)
+
+
+class TestReport:
+    def run(
+        self, tmp_path: Path, channels: list[BaseChannel], log_record: str = "run"
+    ) -> Mock:
+        args = ["cmd", "--report-retries=0", f"--state-dir={tmp_path}", "--host-name=h"]
+        log, _ = setup_logging()
+        with (
+            patch("rsync_watch.Watch") as Watch,
+            patch("sys.argv", args + ["a", "b"]),
+            patch("rsync_watch.ChannelDelivery", ChannelDelivery),
+            patch("rsync_watch.reporting.reporter.channels", channels),
+            patch("command_watcher.log.LoggingHandler._print"),
+        ):
+            watch = Watch.return_value
+            watch.log.handlers = log.handlers
+            watch.processes = [Mock(args_normalized=["rsync", log_record])]
+            log.info(log_record)
+            watch.run.return_value = get_process()
+            rsync_watch.main()
+        return watch
+
+    def test_spool_failed_channel(self, tmp_path: Path) -> None:
+        email = EmailChannel()
+        watch = self.run(tmp_path, [email, IcingaChannel(fail=True)])
+        watch.log.warning.assert_called_with(
+            "1 reports couldn’t be delivered, they are delivered by the next run."
+        )
+        assert len(email.messages) == 1
+        assert email.messages[0].status == 0
+        spool = tmp_path / "rsync_h_a_b.spool"
+        assert len(list(spool.iterdir())) == 1
+
+        email = EmailChannel()
+        icinga = IcingaChannel(fail=False)
+        self.run(tmp_path, [email, icinga], log_record="second run")
+        # The spooled report is only delivered to the failed channel.
+        assert len(email.messages) == 1
+        assert len(icinga.messages) == 2
+        assert list(spool.iterdir()) == []
+        # The spooled report keeps the log records of its own run.
+        spooled, current = icinga.messages
+        assert spooled.body.endswith(" INFO run")
+        assert spooled.processes == "(rsync run)"
+        assert current.body.endswith(" INFO second run")
+        assert current.processes == "(rsync second run)"
+
+
+class TestOptionNextRun:
+    def test_next_run(self, tmp_path: Path) -> None:
+        args = [f"--state-dir={tmp_path}", "--host-name=h", "a", "b"]
+        result = _patch(["--next-run"] + args)
+        kwargs = result.watch.report.call_args.kwargs
+        assert kwargs["performance_data"]["next_run_interval"] == 300
+        assert kwargs["body"].startswith("Next run: ")
+        assert (tmp_path / "rsync_h_a_b.next-run").exists()
+
+        result = _patch(["--skip-if-not-due"] + args)
+        result.watch.run.assert_not_called()
+        result.watch.report.assert_not_called()
+
+
+class TestOptionSnapshot:
+    def test_snapshot(self, tmp_path: Path) -> None:
+        backup = tmp_path / "backup"
+        commands: list[list[str]] = []
+
+        def run(command: list[str], **kwargs: object) -> Mock:
+            commands.append(command)
+            assert Path(command[-1]).is_dir()
+            return get_process()
+
+        for _ in range(2):
+            with (
+                patch("rsync_watch.Watch") as Watch,
+                patch("rsync_watch.datetime") as mock_datetime,
+                patch(
+                    "sys.argv", ["cmd", "--snapshot", "--keep-last=1", "a", str(backup)]
+                ),
+            ):
+                mock_datetime.datetime.now.return_value = datetime.datetime(
+                    2026, 1, len(commands) + 1, tzinfo=datetime.timezone.utc
+                )
+                Watch.return_value.run.side_effect = run
+                rsync_watch.main()
+
+        assert commands[0][-1] == str(backup / "2026-01-01T00-00-00Z.partial")
+        assert "--link-dest=../2026-01-01T00-00-00Z" not in commands[0]
+        assert commands[1][-1] == str(backup / "2026-01-02T00-00-00Z.partial")
+        assert "--link-dest=../2026-01-01T00-00-00Z" in commands[1]
+        assert [path.name for path in backup.iterdir()] == ["2026-01-02T00-00-00Z"]
+        kwargs = Watch.return_value.report.call_args.kwargs
+        assert kwargs["performance_data"]["snapshot_new_bytes"] == 7
+        assert kwargs["performance_data"]["snapshots_expired"] == 1
+        assert kwargs["body"].endswith("expired: 2026-01-01T00-00-00Z")
+
+    def test_same_second(self, tmp_path: Path) -> None:
+        backup = tmp_path / "backup"
+        for _ in range(2):
+            with (
+                patch("rsync_watch.Watch") as Watch,
+                patch("rsync_watch.datetime") as mock_datetime,
+                patch("sys.argv", ["cmd", "--snapshot", "a", str(backup)]),
+            ):
+                mock_datetime.datetime.now.return_value = datetime.datetime(
+                    2026, 1, 1, tzinfo=datetime.timezone.utc
+                )
+                Watch.return_value.run.return_value = get_process()
+                rsync_watch.main()
+        assert sorted(path.name for path in backup.iterdir()) == [
+            "2026-01-01T00-00-00Z",
+            "2026-01-01T00-00-00Z-1",
+        ]
+
+    @pytest.mark.parametrize(
+        "lock_policy, removed", [("none", False), ("skip", True), ("wait", True)]
+    )
+    def test_remove_partial(
+        self, tmp_path: Path, lock_policy: str, removed: bool
+    ) -> None:
+        backup = tmp_path / "backup"
+        partial = backup / "2026-01-01T00-00-00Z.partial"
+        partial.mkdir(parents=True)
+        _patch(
+            [
+                "--snapshot",
+                f"--lock-policy={lock_policy}",
+                f"--lock-dir={tmp_path}",
+                "a",
+                str(backup),
+            ]
+        )
+        assert partial.exists() is not removed
+
+    def test_multiple_dests(self) -> None:
+        with pytest.raises(SystemExit):
+            _patch(["--snapshot", "a", "b", "c"])
+
+
+PARTIAL_OUTPUT: str = "sending incremental file list\nfoo\nbar/\nbaz\n"
+"""The output of an interrupted rsync without --out-format lines: no
+sizes."""
+
+
+class TestPartialStats:
+    def test_ignored_exit_code(self) -> None:
+        result = _patch(
+            ["tmp1", "tmp2"],
+            watch_run_stdout="sending incremental file list\na.txt\nb.txt\n",
+            watch_run_returncode=24,
+        )
+        kwargs = result.watch.report.call_args.kwargs
+        assert kwargs["status"] == 1
+        assert kwargs["performance_data"]["partial"] == 1
+        assert kwargs["performance_data"]["num_files_transferred"] == 2
+        assert kwargs["body"] == rsync_watch.PARTIAL_STATS_MESSAGE
+
+    def test_next_run(self, tmp_path: Path) -> None:
+        result = _patch(
+            ["--next-run", f"--state-dir={tmp_path}", "--host-name=h", "a", "b"],
+            watch_run_stdout=PARTIAL_OUTPUT,
+        )
+        kwargs = result.watch.report.call_args.kwargs
+        assert kwargs["status"] == 1
+        assert kwargs["body"].startswith("Next run: not scheduled")
+        assert not (tmp_path / "rsync_h_a_b.schedule.json").exists()
+
+    def test_auto_tune(self, tmp_path: Path) -> None:
+        result = _patch(
+            ["--auto-tune", f"--state-dir={tmp_path}", "--host-name=h", "a", "b"],
+            watch_run_stdout=PARTIAL_OUTPUT,
+        )
+        kwargs = result.watch.report.call_args.kwargs
+        assert kwargs["status"] == 1
+        tuner = AutoTuner(str(tmp_path / "rsync_h_a_b.autotune.json"))
+        assert tuner.history == {}
+        assert tuner.pending is None
+        assert tuner.failed == []
+
+    def test_snapshot(self, tmp_path: Path) -> None:
+        backup = tmp_path / "backup"
+
+        def run(command: list[str], **kwargs: object) -> Mock:
+            return get_process(PARTIAL_OUTPUT)
+
+        with (
+            patch("rsync_watch.Watch") as Watch,
+            patch("sys.argv", ["cmd", "--snapshot", "a", str(backup)]),
+        ):
+            Watch.return_value.run.side_effect = run
+            rsync_watch.main()
+        kwargs = Watch.return_value.report.call_args.kwargs
+        assert kwargs["status"] == 1
+        assert "snapshot_new_bytes" not in kwargs["performance_data"]
+        assert kwargs["performance_data"]["snapshots"] == 1
+        assert kwargs["body"].startswith("Snapshot: ")
+        assert kwargs["body"].split("\n")[0].endswith(", 1 snapshots")
+
+    def run_failing(self, stdout: str, returncode: int) -> Mock:
+        with (
+            patch("rsync_watch.Watch") as Watch,
+            patch("sys.argv", ["cmd", "tmp1", "tmp2"]),
+        ):
+            Watch.return_value.run.return_value = get_process(stdout, returncode)
+            with pytest.raises(rsync_watch.RsyncFailedError):
+                rsync_watch.main()
+        # command_watcher must not report the failure on its own.
+        assert Watch.call_args.kwargs["raise_exceptions"] is False
+        Watch.return_value.report.assert_called_once()
+        return Watch.return_value.report
+
+    def test_failed(self) -> None:
+        report = self.run_failing("rsync-watch-file: >f+++++++++ 800 800 a.txt\n", 20)
+        kwargs = report.call_args.kwargs
+        assert kwargs["status"] == 2
+        assert kwargs["custom_message"] == (
+            "rsync failed with exit code 20: tmp1 -> tmp2"
+        )
+        assert kwargs["performance_data"]["transferred_size"] == 800
+        assert kwargs["body"] == rsync_watch.PARTIAL_STATS_MESSAGE
+
+    def test_failed_with_stats(self) -> None:
+        kwargs = self.run_failing(OUTPUT, 23).call_args.kwargs
+        assert kwargs["status"] == 2
+        assert "partial" not in kwargs["performance_data"]
+        assert "body" not in kwargs
+
+
+class TestFanOut:
+    def test_parallel(self) -> None:
+        result = _patch(["--host-name=test1", "tmp1", "tmp2", "tmp3"])
+        assert result.watch.run.call_count == 2
+        commands = sorted(call.args[0][-2:] for call in result.watch.run.call_args_list)
+        assert commands == [["tmp1", "tmp2"], ["tmp1", "tmp3"]]
+        result.watch.log.info.assert_any_call(
+            "Service name: rsync_test1_tmp1_tmp2_tmp3"
+        )
+        kwargs = result.watch.report.call_args.kwargs
+        assert kwargs["performance_data"]["num_files"] == 2
+        assert kwargs["performance_data"]["dest2_num_files"] == 1
+        assert kwargs["body"] == "dest1: tmp2\ndest2: tmp3"
+
+    def test_parallel_one_fails(self) -> None:
+        def run(command: list[str], **kwargs: object) -> Mock:
+            if command[-1] == "tmp3":
+                return get_process("rsync-watch-file: >f+++++++++ 800 800 a.txt\n", 23)
+            return get_process()
+
+        with (
+            patch("rsync_watch.Watch") as Watch,
+            patch("sys.argv", ["cmd", "tmp1", "tmp2", "tmp3", "tmp4"]),
+        ):
+            Watch.return_value.run.side_effect = run
+            with pytest.raises(rsync_watch.FanOutFailedError) as error:
+                rsync_watch.main()
+        assert Watch.return_value.run.call_count == 3
+        assert [result.dest for result in error.value.results] == [
+            "tmp2",
+            "tmp3",
+            "tmp4",
+        ]
+        assert [e.result.dest for e in error.value.errors] == ["tmp3"]
+        Watch.return_value.report.assert_called_once()
+        kwargs = Watch.return_value.report.call_args.kwargs
+        assert kwargs["status"] == 2
+        assert kwargs["custom_message"] == (
+            "rsync failed for 1 of 3 destinations: tmp3 (exit code 23)"
+        )
+        performance_data = kwargs["performance_data"]
+        assert performance_data["dest1_num_files"] == 1
+        assert performance_data["dest2_transferred_size"] == 800
+        assert performance_data["dest3_num_files"] == 1
+        assert kwargs["body"] == (
+            "dest1: tmp2\ndest2: tmp3\ndest3: tmp4\n\n"
+            + rsync_watch.PARTIAL_STATS_MESSAGE
+        )
+
+    def test_parallel_two_fail(self) -> None:
+        def run(command: list[str], **kwargs: object) -> Mock:
+            return get_process(returncode=0 if command[-1] == "tmp3" else 12)
+
+        with (
+            patch("rsync_watch.Watch") as Watch,
+            patch("sys.argv", ["cmd", "tmp1", "tmp2", "tmp3", "tmp4"]),
+        ):
+            Watch.return_value.run.side_effect = run
+            with pytest.raises(rsync_watch.FanOutFailedError) as error:
+                rsync_watch.main()
+        assert str(error.value) == (
+            "rsync failed for 2 of 3 destinations: tmp2 (exit code 12), "
+            "tmp4 (exit code 12)"
+        )
+
+    def test_chain_fails(self) -> None:
+        def run(command: list[str], **kwargs: object) -> Mock:
+            return get_process(returncode=23 if command[-1] == "tmp3" else 0)
+
+        with (
+            patch("rsync_watch.Watch") as Watch,
+            patch(
+                "sys.argv", ["cmd", "--fan-out=chain", "tmp1", "tmp2", "tmp3", "tmp4"]
+            ),
+        ):
+            Watch.return_value.run.side_effect = run
+            with pytest.raises(rsync_watch.FanOutFailedError):
+                rsync_watch.main()
+        assert Watch.return_value.run.call_count == 2
+        kwargs = Watch.return_value.report.call_args.kwargs
+        assert kwargs["custom_message"] == (
+            "rsync failed for 1 of 3 destinations: tmp3 (exit code 23), skipped: tmp4"
+        )
+        assert kwargs["body"] == "dest1: tmp2\ndest2: tmp3"
+
+    def test_chain(self) -> None:
+        result = _patch(["--fan-out=chain", "dir/tmp1", "tmp2", "remote:tmp3", "tmp4"])
+        commands = [call.args[0][-2:] for call in result.watch.run.call_args_list]
+        assert commands == [
+            ["dir/tmp1", "tmp2"],
+            ["tmp2/tmp1", "remote:tmp3"],
+            ["remote:tmp3/tmp1", "tmp4"],
+        ]
+
+    def test_chain_trailing_slash(self) -> None:
+        result = _patch(["--fan-out=chain", "tmp1/", "tmp2/", "remote:tmp3", "tmp4"])
+        commands = [call.args[0][-2:] for call in result.watch.run.call_args_list]
+        assert commands == [
+            ["tmp1/", "tmp2/"],
+            ["tmp2/", "remote:tmp3"],
+            ["remote:tmp3/", "tmp4"],
+        ]
+
+    def test_batch(self) -> None:
+        result = _patch(["--fan-out=batch", "tmp1", "remote:tmp2", "tmp3", "tmp4"])
+        commands = [call.args[0][4:] for call in result.watch.run.call_args_list]
+        assert commands[0][0].startswith("--write-batch=")
+        assert commands[0][1:] == ["tmp1", "remote:tmp2"]
+        batch_file = commands[0][0].split("=", 1)[1]
+        assert sorted(commands[1:]) == [
+            [f"--read-batch={batch_file}", "tmp3"],
+            [f"--read-batch={batch_file}", "tmp4"],
+        ]
+        kwargs = result.watch.report.call_args.kwargs
+        assert kwargs["performance_data"]["dest3_num_files"] == 1
+        assert kwargs["body"] == "dest1: remote:tmp2\ndest2: tmp3\ndest3: tmp4"
+
+    @pytest.mark.parametrize("dest", ["remote:tmp3", "host::module", "rsync://host/m"])
+    def test_batch_remote_dest(self, dest: str) -> None:
+        with pytest.raises(SystemExit):
+            _patch(["--fan-out=batch", "tmp1", "tmp2", dest])
+
+
+class TestOptionVerify:
+    def test_verify(self, tmp_path: Path) -> None:
+        for name in ("src", "dest"):
+            (tmp_path / name).mkdir()
+            (tmp_path / name / "a.txt").write_text("a")
+        result = _patch(
+            ["--verify", f"{tmp_path}/src/", str(tmp_path / "dest")],
+            watch_run_stdout="rsync-watch-file: >f+++++++++ 1 1 a.txt\n" + OUTPUT,
+        )
+        assert (
+            "--out-format=rsync-watch-file: %i %l %b %n"
+            in (result.watch.run.call_args.args[0])
+        )
+        kwargs = result.watch.report.call_args.kwargs
+        assert kwargs["status"] == 0
+        assert kwargs["performance_data"]["verify_files"] == 1
+        assert kwargs["performance_data"]["verify_mismatches"] == 0
+
+    def test_mismatch(self, tmp_path: Path) -> None:
+        result = _patch(
+            ["--verify", f"{tmp_path}/src/", str(tmp_path / "dest")],
+            watch_run_stdout="rsync-watch-file: >f+++++++++ 1 1 a.txt\n" + OUTPUT,
+        )
+        kwargs = result.watch.report.call_args.kwargs
+        assert kwargs["status"] == 1
+        assert "mismatch: a.txt" in kwargs["body"]
+
+    def test_unreachable(self, tmp_path: Path) -> None:
+        with patch("rsync_watch.verify.subprocess.run") as run:
+            run.return_value = Mock(stdout="", stderr="", returncode=255)
+            result = _patch(
+                ["--verify", f"{tmp_path}/src/", "host:/dest"],
+                watch_run_stdout="rsync-watch-file: >f+++++++++ 1 1 a.txt\n" + OUTPUT,
+            )
+        kwargs = result.watch.report.call_args.kwargs
+        assert kwargs["status"] == 1
+        assert kwargs["performance_data"]["verify_mismatches"] == 0
+        assert kwargs["performance_data"]["verify_errors"] == 1
+        assert "couldn’t verify: Can’t hash the files on host" in kwargs["body"]
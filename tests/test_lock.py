@@ -0,0 +1,59 @@
+from pathlib import Path
+
+from rsync_watch.lock import ServiceLock
+
+
+def get_lock(tmp_path: Path) -> ServiceLock:
+    return ServiceLock("rsync_test_tmp1_tmp2", str(tmp_path))
+
+
+class TestServiceLock:
+    def test_file_names(self, tmp_path: Path) -> None:
+        lock = get_lock(tmp_path)
+        assert lock.lock_file == str(tmp_path / "rsync_test_tmp1_tmp2.lock")
+        assert lock.pending_file == str(tmp_path / "rsync_test_tmp1_tmp2.pending")
+
+    def test_acquire_release(self, tmp_path: Path) -> None:
+        lock = get_lock(tmp_path)
+        assert lock.acquire()
+        assert lock.locked
+        lock.release()
+        assert not lock.locked
+
+    def test_create_lock_dir(self, tmp_path: Path) -> None:
+        lock = ServiceLock("rsync_test_tmp1_tmp2", str(tmp_path / "a" / "b"))
+        assert lock.acquire()
+        assert (tmp_path / "a" / "b" / "rsync_test_tmp1_tmp2.lock").exists()
+
+    def test_acquire_held(self, tmp_path: Path) -> None:
+        holder = get_lock(tmp_path)
+        holder.acquire()
+        assert not get_lock(tmp_path).acquire()
+        holder.release()
+        assert get_lock(tmp_path).acquire()
+
+    def test_acquire_timeout(self, tmp_path: Path) -> None:
+        holder = get_lock(tmp_path)
+        holder.acquire()
+        assert not get_lock(tmp_path).acquire(timeout=0.1, interval=0.05)
+
+    def test_consume_pending(self, tmp_path: Path) -> None:
+        lock = get_lock(tmp_path)
+        assert not lock.consume_pending()
+        lock.request_pass()
+        assert lock.consume_pending()
+        assert not lock.consume_pending()
+
+    def test_next_pass_without_request(self, tmp_path: Path) -> None:
+        lock = get_lock(tmp_path)
+        lock.acquire()
+        assert not lock.next_pass()
+        assert not lock.locked
+
+    def test_next_pass_with_request(self, tmp_path: Path) -> None:
+        holder = get_lock(tmp_path)
+        holder.acquire()
+        get_lock(tmp_path).request_pass()
+        assert holder.next_pass()
+        assert holder.locked
+        assert not holder.next_pass()
@@ -0,0 +1,148 @@
+import os
+import shutil
+import socket
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from loopback import (
+    PROFILES,
+    Profile,
+    ShapingProxy,
+    benchmark,
+    generate_tree,
+    modify_tree,
+    run_rsync_watch,
+)
+
+requires_rsync = pytest.mark.skipif(
+    shutil.which("rsync") is None, reason="rsync is not installed"
+)
+
+
+class TestGenerateTree:
+    def test_small_files(self, tmp_path: Path) -> None:
+        stats = generate_tree(tmp_path, "small-files", scale=0.01)
+        assert stats.files == 50
+        assert len(list(tmp_path.iterdir())) == 50
+        assert 1024 * 50 <= stats.bytes <= 16384 * 50
+
+    def test_huge_files(self, tmp_path: Path) -> None:
+        stats = generate_tree(tmp_path, "huge-files", scale=1 / 1024)
+        assert stats == (3, 3 * 256 * 1024)
+        assert (tmp_path / "huge0").stat().st_size == 256 * 1024
+
+    def test_deep(self, tmp_path: Path) -> None:
+        stats = generate_tree(tmp_path, "deep", scale=0.1)
+        assert stats.files == 10 * 3 * 3
+        assert (tmp_path / "chain0/level00/level01/level02/file0").is_file()
+
+    def test_reproducible(self, tmp_path: Path) -> None:
+        generate_tree(tmp_path / "a", "small-files", scale=0.01)
+        generate_tree(tmp_path / "b", "small-files", scale=0.01)
+        assert (tmp_path / "a/dir01/file00001").read_bytes() == (
+            tmp_path / "b/dir01/file00001"
+        ).read_bytes()
+
+    def test_modify_tree(self, tmp_path: Path) -> None:
+        generate_tree(tmp_path, "small-files", scale=0.01)
+        before = (tmp_path / "dir00/file00000").read_bytes()
+        assert modify_tree(tmp_path, fraction=1.0) == 50
+        assert (tmp_path / "dir00/file00000").read_bytes() != before
+
+
+class TestShapingProxy:
+    def echo_server(self) -> socket.socket:
+        server = socket.create_server(("127.0.0.1", 0))
+
+        def serve() -> None:
+            connection, _ = server.accept()
+            with connection:
+                while data := connection.recv(65536):
+                    connection.sendall(data)
+
+        threading.Thread(target=serve, daemon=True).start()
+        return server
+
+    def test_latency(self) -> None:
+        server = self.echo_server()
+        with ShapingProxy(server.getsockname()[1], latency=0.1) as proxy:
+            with socket.create_connection(("127.0.0.1", proxy.port)) as client:
+                start = time.monotonic()
+                client.sendall(b"ping")
+                assert client.recv(4) == b"ping"
+                # There and back again.
+                assert time.monotonic() - start >= 0.2
+
+    def test_bandwidth(self) -> None:
+        server = self.echo_server()
+        with ShapingProxy(server.getsockname()[1], bandwidth=1024**2) as proxy:
+            with socket.create_connection(("127.0.0.1", proxy.port)) as client:
+                start = time.monotonic()
+                client.sendall(b"x" * 512 * 1024)
+                client.shutdown(socket.SHUT_WR)
+                received = 0
+                while data := client.recv(65536):
+                    received += len(data)
+                assert received == 512 * 1024
+                assert time.monotonic() - start >= 0.45
+
+
+class TestRunRsyncWatch:
+    def test_fake_rsync(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        bin_dir = tmp_path / "bin"
+        bin_dir.mkdir()
+        rsync = bin_dir / "rsync"
+        rsync.write_text(
+            "#!/bin/sh\n"
+            "echo 'Number of files: 1'\n"
+            "echo 'Number of created files: 0'\n"
+            "echo 'Number of deleted files: 0'\n"
+            "echo 'Number of regular files transferred: 1'\n"
+            "echo 'Total file size: 2 bytes'\n"
+            "echo 'Total transferred file size: 2 bytes'\n"
+            "echo 'Literal data: 2 bytes'\n"
+            "echo 'Matched data: 0 bytes'\n"
+            "echo 'File list size: 0'\n"
+            "echo 'File list generation time: 0.001 seconds'\n"
+            "echo 'File list transfer time: 0.000 seconds'\n"
+            "echo 'Total bytes sent: 100'\n"
+            "echo 'Total bytes received: 35'\n"
+        )
+        rsync.chmod(0o755)
+        monkeypatch.setenv("PATH", f"{bin_dir}:{os.environ['PATH']}")
+        result = run_rsync_watch(["--host-name=test", "a", "b"], tmp_path / "state")
+        assert result.returncode == 0
+        assert result.performance_data["num_files_transferred"] == 1
+        assert result.parse_time > 0
+        assert result.max_rss > 0
+
+
+@pytest.mark.slow
+@requires_rsync
+class TestBenchmark:
+    @pytest.mark.parametrize("profile", PROFILES)
+    def test_local(self, tmp_path: Path, profile: Profile) -> None:
+        initial, incremental = benchmark(tmp_path, profile, scale=0.05)
+        assert initial.performance_data["num_files_transferred"] > 0
+        assert (
+            incremental.performance_data["num_files_transferred"]
+            < initial.performance_data["num_files_transferred"]
+        )
+
+    def test_daemon(self, tmp_path: Path) -> None:
+        initial, _ = benchmark(tmp_path, "small-files", "daemon", scale=0.05)
+        assert initial.performance_data["num_files_transferred"] == 250
+
+    def test_slow_network(self, tmp_path: Path) -> None:
+        initial, _ = benchmark(
+            tmp_path,
+            "huge-files",
+            "daemon",
+            scale=1 / 256,
+            latency=0.05,
+            bandwidth=4 * 1024**2,
+        )
+        # 3 MiB at 4 MiB/s
+        assert initial.wall_time > 0.75
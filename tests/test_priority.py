@@ -0,0 +1,95 @@
+import os
+import platform
+import subprocess
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from rsync_watch.priority import Priority, build_preexec_fn, setup_cgroup
+
+
+class TestPriority:
+    def test_is_set(self) -> None:
+        assert not Priority().is_set
+        assert Priority(nice=10).is_set
+
+    def test_format(self) -> None:
+        assert (
+            Priority(10, "idle", None, "rsync").format()
+            == "Priority: nice 10, ionice idle, cgroup rsync"
+        )
+        assert Priority(ionice_class="best-effort", ionice_level=7).format() == (
+            "Priority: ionice best-effort 7"
+        )
+
+
+class TestSetupCgroup:
+    def test_not_configured(self) -> None:
+        assert setup_cgroup(Priority(nice=10)) is None
+
+    def test_limits(self, tmp_path: Path) -> None:
+        with patch("rsync_watch.priority.CGROUP_ROOT", str(tmp_path)):
+            procs_file = setup_cgroup(
+                Priority(
+                    cgroup="/backup/rsync",
+                    cgroup_cpu_weight=20,
+                    cgroup_cpu_max=50,
+                    cgroup_io_max="8:0 wbps=1048576",
+                )
+            )
+        cgroup = tmp_path / "backup" / "rsync"
+        assert procs_file == str(cgroup / "cgroup.procs")
+        assert (cgroup / "cpu.weight").read_text() == "20\n"
+        assert (cgroup / "cpu.max").read_text() == "50000 100000\n"
+        assert (cgroup / "io.max").read_text() == "8:0 wbps=1048576\n"
+        assert not (cgroup / "io.weight").exists()
+
+
+class TestBuildPreexecFn:
+    def test_not_configured(self) -> None:
+        assert build_preexec_fn(Priority()) is None
+
+    def test_nice(self) -> None:
+        preexec_fn = build_preexec_fn(Priority(nice=5))
+        process = subprocess.run(
+            [sys.executable, "-c", "import os; print(os.nice(0))"],
+            preexec_fn=preexec_fn,
+            stdout=subprocess.PIPE,
+            encoding="utf-8",
+            check=True,
+        )
+        assert int(process.stdout) == min(os.nice(0) + 5, 19)
+
+    @pytest.mark.skipif(platform.machine() != "x86_64", reason="x86_64 only")
+    def test_ionice(self) -> None:
+        preexec_fn = build_preexec_fn(Priority(ionice_class="best-effort"))
+        # ioprio_get(IOPRIO_WHO_PROCESS, 0)
+        code = "import ctypes; print(ctypes.CDLL(None).syscall(252, 1, 0))"
+        process = subprocess.run(
+            [sys.executable, "-c", code],
+            preexec_fn=preexec_fn,
+            stdout=subprocess.PIPE,
+            encoding="utf-8",
+            check=True,
+        )
+        assert int(process.stdout) == (2 << 13) | 4
+
+    def test_cgroup(self, tmp_path: Path) -> None:
+        with patch("rsync_watch.priority.CGROUP_ROOT", str(tmp_path)):
+            preexec_fn = build_preexec_fn(Priority(cgroup="rsync"))
+        (tmp_path / "rsync" / "cgroup.procs").touch()
+        process = subprocess.Popen(["true"], preexec_fn=preexec_fn)
+        process.wait()
+        assert (tmp_path / "rsync" / "cgroup.procs").read_text() == "0\n"
+
+    def test_resolved_in_parent(self) -> None:
+        with patch("rsync_watch.priority.ctypes.CDLL") as CDLL:
+            preexec_fn = build_preexec_fn(Priority(ionice_class="idle"))
+        assert CDLL.call_count == 1
+        assert preexec_fn is not None
+        with patch("rsync_watch.priority.ctypes.CDLL") as CDLL:
+            CDLL.return_value.syscall.return_value = 0
+            preexec_fn()
+        CDLL.assert_not_called()
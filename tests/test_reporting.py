@@ -0,0 +1,151 @@
+import threading
+import time
+from pathlib import Path
+
+from rsync_watch.reporting import (
+    SPOOL_MAX,
+    DeliveryError,
+    QueuedReporter,
+    Report,
+)
+
+
+class Backend:
+    def __init__(self, failures: int = 0, delay: float = 0) -> None:
+        self.failures = failures
+        self.delay = delay
+        self.reports: list[Report] = []
+
+    def __call__(self, report: Report) -> None:
+        time.sleep(self.delay)
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("unreachable")
+        self.reports.append(report)
+
+
+class Channels:
+    """Two channels, the second one fails ``failures`` times."""
+
+    def __init__(self, failures: int) -> None:
+        self.failures = failures
+        self.delivered: list[tuple[str, Report]] = []
+
+    def __call__(self, report: Report) -> None:
+        for name in report.channels or ["email", "icinga"]:
+            if name == "icinga" and self.failures:
+                self.failures -= 1
+                raise DeliveryError(["icinga"], "icinga: unreachable")
+            self.delivered.append((name, report))
+
+
+class TestReport:
+    def test_data(self) -> None:
+        assert Report(1, body="body", channels=["icinga"]).data == {"body": "body"}
+
+
+class TestQueuedReporter:
+    def test_deliver(self) -> None:
+        backend = Backend()
+        reporter = QueuedReporter(backend)
+        reporter.report(0, custom_message="first")
+        reporter.report(1, performance_data={"a": 1})
+        assert reporter.close() == 0
+        assert backend.reports == [
+            Report(0, "first"),
+            Report(1, performance_data={"a": 1}),
+        ]
+
+    def test_report_does_not_wait(self) -> None:
+        backend = Backend(delay=0.5)
+        reporter = QueuedReporter(backend)
+        start = time.monotonic()
+        reporter.report(0)
+        assert time.monotonic() - start < 0.1
+        reporter.close()
+        assert len(backend.reports) == 1
+
+    def test_retry(self) -> None:
+        backend = Backend(failures=2)
+        reporter = QueuedReporter(backend, retries=2, backoff=0.01)
+        reporter.report(0)
+        assert reporter.close() == 0
+        assert backend.reports == [Report(0)]
+
+    def test_retry_failed_channels(self) -> None:
+        channels = Channels(failures=1)
+        reporter = QueuedReporter(channels, retries=1, backoff=0.01)
+        reporter.report(0)
+        assert reporter.close() == 0
+        assert [name for name, _ in channels.delivered] == ["email", "icinga"]
+
+    def test_spool_failed_channels(self, tmp_path: Path) -> None:
+        reporter = QueuedReporter(Channels(failures=10), str(tmp_path), retries=0)
+        reporter.report(0)
+        assert reporter.close() == 1
+        channels = Channels(failures=0)
+        QueuedReporter(channels, str(tmp_path)).close()
+        assert channels.delivered == [("icinga", Report(0, channels=["icinga"]))]
+
+    def test_capture_when_queued(self, tmp_path: Path) -> None:
+        records: list[str] = ["first run"]
+
+        def capture(report: Report) -> Report:
+            return report._replace(log_records=records[0], processes=[["rsync"]])
+
+        reporter = QueuedReporter(
+            Backend(failures=10), str(tmp_path), retries=0, capture=capture
+        )
+        reporter.report(0)
+        reporter.close()
+        records[0] = "second run"
+        backend = Backend()
+        QueuedReporter(backend, str(tmp_path), capture=capture).close()
+        assert backend.reports == [
+            Report(0, log_records="first run", processes=[["rsync"]])
+        ]
+
+    def test_spool(self, tmp_path: Path) -> None:
+        backend = Backend(failures=10)
+        reporter = QueuedReporter(backend, str(tmp_path), retries=1, backoff=0.01)
+        reporter.report(0, custom_message="first")
+        reporter.report(1, custom_message="second")
+        assert reporter.close() == 2
+        assert len(list(tmp_path.iterdir())) == 2
+
+        backend = Backend()
+        QueuedReporter(backend, str(tmp_path)).close()
+        assert backend.reports == [Report(0, "first"), Report(1, "second")]
+        assert list(tmp_path.iterdir()) == []
+
+    def test_spool_max(self, tmp_path: Path) -> None:
+        reporter = QueuedReporter(Backend(failures=1000), str(tmp_path), retries=0)
+        for _ in range(SPOOL_MAX + 5):
+            reporter.report(0)
+        reporter.close()
+        assert len(list(tmp_path.iterdir())) == SPOOL_MAX
+
+    def test_close_timeout(self, tmp_path: Path) -> None:
+        event = threading.Event()
+
+        def hang(report: Report) -> None:
+            event.wait(10)
+
+        reporter = QueuedReporter(hang, str(tmp_path))
+        reporter.report(0, custom_message="hanging")
+        reporter.report(1, custom_message="queued")
+        time.sleep(0.1)
+        start = time.monotonic()
+        assert reporter.close(timeout=0.1) == 2
+        assert time.monotonic() - start < 2
+        event.set()
+        backend = Backend()
+        QueuedReporter(backend, str(tmp_path)).close()
+        assert backend.reports == [Report(0, "hanging"), Report(1, "queued")]
+
+    def test_corrupt_spool_file(self, tmp_path: Path) -> None:
+        (tmp_path / "1.json").write_text("{")
+        backend = Backend()
+        QueuedReporter(backend, str(tmp_path)).close()
+        assert backend.reports == []
+        assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,34 @@
+import subprocess
+import sys
+
+from rsync_watch.resources import ResourceUsage
+
+
+class TestResourceUsage:
+    def test_children(self) -> None:
+        before = ResourceUsage.children()
+        subprocess.run(
+            [sys.executable, "-c", "sum(range(3_000_000)); b = bytearray(2**25)"],
+            check=True,
+        )
+        usage = ResourceUsage.children() - before
+        assert usage.user_time + usage.system_time > 0
+        assert usage.max_rss_so_far > 2**25
+        assert usage.voluntary_switches >= 0
+
+    def test_sub(self) -> None:
+        usage = ResourceUsage(3.0, 2.0, 300, 30, 20, 10, 5) - ResourceUsage(
+            1.0, 1.0, 100, 10, 10, 5, 5
+        )
+        assert usage == ResourceUsage(2.0, 1.0, 300, 20, 10, 5, 0)
+
+    def test_performance_data(self) -> None:
+        assert ResourceUsage(1.23456, 0.5, 1024, 1, 2, 3, 4).performance_data == {
+            "cpu_user": 1.235,
+            "cpu_system": 0.5,
+            "max_rss_so_far": 1024,
+            "ctx_switches_voluntary": 1,
+            "ctx_switches_involuntary": 2,
+            "block_input": 3,
+            "block_output": 4,
+        }
@@ -1,4 +1,6 @@
 import os
+import random
+import re
 import subprocess
 from unittest.mock import Mock, patch
 
@@ -7,6 +9,7 @@ import pytest
 from rsync_watch import (
     ChecksCollection,
     StatsNotFoundError,
+    chain_source,
     format_service_name,
     parse_stats,
 )
@@ -112,6 +115,9 @@ class TestUnitParseStats:
             "list_transfer_time": 12.000,
             "bytes_sent": 13,
             "bytes_received": 14,
+            "num_files_dir": 2,
+            "bytes_per_sec": 156.0,
+            "speedup": 0.0,
         }
 
     def test_output_real(self) -> None:
@@ -130,6 +136,13 @@ class TestUnitParseStats:
             "list_transfer_time": 0.000,
             "bytes_sent": 13631370,
             "bytes_received": 19859,
+            "num_files_reg": 3256,
+            "num_files_dir": 1672,
+            "num_created_files_reg": 64,
+            "num_created_files_dir": 48,
+            "num_deleted_files_reg": 125,
+            "num_deleted_files_dir": 89,
+            "speedup": 309.34,
         }
 
     def test_output_without_deleted(self) -> None:
@@ -148,6 +161,10 @@ class TestUnitParseStats:
             "list_transfer_time": 0.000,
             "bytes_sent": 59,
             "bytes_received": 1170,
+            "num_files_reg": 16,
+            "num_files_dir": 24,
+            "bytes_per_sec": 819.33,
+            "speedup": 17.97,
         }
 
     def test_output_2023(self) -> None:
@@ -166,6 +183,10 @@ class TestUnitParseStats:
             "list_transfer_time": 0.000,
             "bytes_sent": 950,
             "bytes_received": 139226,
+            "num_files_reg": 2039,
+            "num_files_dir": 892,
+            "bytes_per_sec": 3548.76,
+            "speedup": 155133.72,
         }
 
 
@@ -191,6 +212,82 @@ class TestUnitServiceName:
             "data-backup-host-serverway-mysql"
         )
 
+    def test_rsync_daemon(self) -> None:
+        assert (
+            format_service_name("wnas", "/data", "rsync://backup@nas/module/data")
+            == "rsync_wnas_data_rsync-backup-nas-module-data"
+        )
+        assert (
+            format_service_name("wnas", "/data", "backup@nas::module/data")
+            == "rsync_wnas_data_backup-nas-module-data"
+        )
+
+    def test_unique(self) -> None:
+        assert format_service_name("h", "a/b", "c", unique=True) == (
+            "rsync_h_a-b_c_2b48d8b1f3"
+        )
+        assert format_service_name("h", "a-b", "c", unique=True) == (
+            "rsync_h_a-b_c_d6897abd90"
+        )
+
+    def test_unique_more_dests(self) -> None:
+        assert format_service_name("h", "s", "a_b", more_dests=("c",)) == (
+            format_service_name("h", "s", "a", more_dests=("b_c",))
+        )
+        assert format_service_name(
+            "h", "s", "a_b", unique=True, more_dests=("c",)
+        ) != format_service_name("h", "s", "a", unique=True, more_dests=("b_c",))
+
+    def test_same_as_multiple_substitutions(self) -> None:
+        """The single pass normalizer results in the same names as the
+        former sequence of substitutions."""
+
+        def format_reference(host_name: str, src: str, dest: str) -> str:
+            result: str = f"rsync_{host_name}_{src}_{dest}"
+            result = re.sub(r"[/@:\.~]", "-", result)
+            result = re.sub(r"-*_-*", "_", result)
+            result = re.sub(r"-{2,}", "-", result)
+            result = re.sub(r"_{2,}", "_", result)
+            result = re.sub(r"-$", "", result)
+            result = re.sub(r"^-", "", result)
+            return result
+
+        rand = random.Random(1)
+        for _ in range(2000):
+            parts = [
+                "".join(rand.choices("ab/@:.~-_", k=rand.randrange(8)))
+                for _ in range(3)
+            ]
+            assert format_service_name(*parts) == format_reference(*parts), parts
+
+    def test_cache(self) -> None:
+        format_service_name.cache_clear()
+        format_service_name("host", "src", "dest")
+        format_service_name("host", "src", "dest")
+        assert format_service_name.cache_info().hits == 1
+
+
+class TestUnitChainSource:
+    @pytest.mark.parametrize(
+        "src,dest,expected",
+        [
+            ("/data", "/backup", "/backup/data"),
+            ("/data", "/backup/", "/backup/data"),
+            ("/data/", "/backup", "/backup/"),
+            ("/data/", "host:backup/", "host:backup/"),
+            ("host:/data", "/backup", "/backup/data"),
+            ("host:data", "/backup", "/backup/data"),
+            ("host:", "/backup", "/backup/"),
+            ("host::module/data", "/backup", "/backup/data"),
+            ("host::module", "/backup", "/backup/"),
+            ("rsync://host:873/module/data", "/backup", "/backup/data"),
+            ("rsync://host/module", "/backup", "/backup/"),
+            (".", "/backup", "/backup/"),
+        ],
+    )
+    def test_chain_source(self, src: str, dest: str, expected: str) -> None:
+        assert chain_source(src, dest) == expected
+
 
 class TestUnitClassChecks:
     def get_checks(self, raise_exception: bool) -> ChecksCollection:
@@ -0,0 +1,69 @@
+import datetime
+from pathlib import Path
+
+import pytest
+
+from rsync_watch.schedule import ChangeRateForecaster
+
+
+def forecaster(tmp_path: Path) -> ChangeRateForecaster:
+    return ChangeRateForecaster(
+        str(tmp_path / "schedule.json"),
+        min_interval=60,
+        max_interval=3600,
+        target_size=1000,
+        smoothing=0.5,
+    )
+
+
+def stats(size: int) -> dict[str, int | float]:
+    return {"transferred_size": size, "num_files_transferred": 1 if size else 0}
+
+
+class TestChangeRateForecaster:
+    def test_first_run(self, tmp_path: Path) -> None:
+        assert forecaster(tmp_path).record(stats(5000), 1000.0) == 60
+        assert forecaster(tmp_path).next_run == 1060.0
+
+    def test_rate(self, tmp_path: Path) -> None:
+        forecaster(tmp_path).record(stats(0), 1000.0)
+        # 2 bytes/sec: 1000 bytes in 500 seconds
+        assert forecaster(tmp_path).record(stats(200), 1100.0) == 500
+        # 0.5 * 10 + 0.5 * 2 bytes/sec
+        assert forecaster(tmp_path).record(stats(1000), 1200.0) == pytest.approx(
+            1000 / 6
+        )
+        assert forecaster(tmp_path).rate == 6.0
+
+    def test_bounds(self, tmp_path: Path) -> None:
+        forecaster(tmp_path).record(stats(0), 1000.0)
+        assert forecaster(tmp_path).record(stats(10**6), 1100.0) == 60
+        assert forecaster(tmp_path).record(stats(0), 1200.0) == 60
+
+    def test_empty_runs(self, tmp_path: Path) -> None:
+        forecaster(tmp_path).record(stats(0), 1000.0)
+        assert forecaster(tmp_path).record(stats(0), 1100.0) == 3600
+        assert forecaster(tmp_path).empty_runs == 2
+
+    def test_metadata_only_changes(self, tmp_path: Path) -> None:
+        forecaster(tmp_path).record(stats(0), 1000.0)
+        forecaster(tmp_path).record(
+            {"transferred_size": 500, "num_files_transferred": 0}, 1100.0
+        )
+        assert forecaster(tmp_path).rate == 0
+
+    def test_is_due(self, tmp_path: Path) -> None:
+        assert forecaster(tmp_path).is_due(0)
+        forecaster(tmp_path).record(stats(0), 1000.0)
+        assert not forecaster(tmp_path).is_due(1059.0)
+        assert forecaster(tmp_path).is_due(1060.0)
+
+    def test_write_next_run(self, tmp_path: Path) -> None:
+        path = tmp_path / "next-run"
+        forecaster(tmp_path).write_next_run(str(path))
+        assert not path.exists()
+        f = forecaster(tmp_path)
+        f.record(stats(0), 1000.0)
+        f.write_next_run(str(path))
+        next_run = datetime.datetime.fromisoformat(path.read_text().strip())
+        assert next_run.timestamp() == 1060.0
@@ -0,0 +1,133 @@
+import datetime
+from pathlib import Path
+
+import pytest
+
+from rsync_watch.snapshot import (
+    MAX_SEQUENCE,
+    Retention,
+    SnapshotStore,
+    format_name,
+    parse_name,
+    select_expired,
+)
+
+NAMES = [
+    "2026-01-30T12-00-00",
+    "2026-02-01T08-00-00",
+    "2026-02-01T20-00-00",
+    "2026-02-02T08-00-00",
+    "2026-02-09T08-00-00",
+    "2026-02-10T08-00-00",
+    "2026-02-10T20-00-00",
+]
+
+
+class TestName:
+    def test_utc(self) -> None:
+        cest = datetime.timezone(datetime.timedelta(hours=2))
+        assert format_name(datetime.datetime(2026, 7, 1, 12, tzinfo=cest)) == (
+            "2026-07-01T10-00-00Z"
+        )
+
+    def test_sequence(self) -> None:
+        time = datetime.datetime(2026, 7, 1, tzinfo=datetime.timezone.utc)
+        assert format_name(time, 2) == "2026-07-01T00-00-00Z-2"
+        assert format_name(time, 2) < format_name(time + datetime.timedelta(seconds=1))
+
+    def test_dst_fall_back(self) -> None:
+        """The local time repeats an hour, the names stay in order."""
+        cest = datetime.timezone(datetime.timedelta(hours=2))
+        cet = datetime.timezone(datetime.timedelta(hours=1))
+        before = format_name(datetime.datetime(2026, 10, 25, 2, 30, tzinfo=cest))
+        after = format_name(datetime.datetime(2026, 10, 25, 2, 10, tzinfo=cet))
+        assert before < after
+
+    def test_parse(self) -> None:
+        expected = datetime.datetime(2026, 7, 1, 10)
+        assert parse_name("2026-07-01T10-00-00Z") == expected
+        assert parse_name("2026-07-01T10-00-00Z-3") == expected
+        assert parse_name("2026-07-01T10-00-00") == expected
+        with pytest.raises(ValueError):
+            parse_name("other")
+
+
+class TestSelectExpired:
+    def test_no_retention(self) -> None:
+        assert select_expired(NAMES, Retention()) == []
+
+    def test_last(self) -> None:
+        assert select_expired(NAMES, Retention(last=2)) == NAMES[:5]
+
+    def test_latest_is_always_kept(self) -> None:
+        assert (
+            select_expired(NAMES, Retention(daily=0, monthly=0, weekly=0, last=0)) == []
+        )
+        assert "2026-02-10T20-00-00" not in select_expired(
+            NAMES, Retention(monthly=0, daily=1)
+        )
+
+    def test_daily(self) -> None:
+        assert select_expired(NAMES, Retention(daily=3)) == [
+            "2026-01-30T12-00-00",
+            "2026-02-01T08-00-00",
+            "2026-02-01T20-00-00",
+            "2026-02-10T08-00-00",
+        ]
+
+    def test_weekly_and_monthly(self) -> None:
+        # ISO weeks: 2026-01-30 and 2026-02-01 are in week 5, 2026-02-02 in
+        # week 6, 2026-02-09 and 2026-02-10 in week 7.
+        assert select_expired(NAMES, Retention(weekly=2, monthly=2)) == [
+            "2026-02-01T08-00-00",
+            "2026-02-01T20-00-00",
+            "2026-02-09T08-00-00",
+            "2026-02-10T08-00-00",
+        ]
+
+
+class TestSnapshotStore:
+    def test_location(self) -> None:
+        store = SnapshotStore("user@host:/backup/")
+        assert store.host == "user@host"
+        assert store.path == "/backup"
+        assert store.location_of("x") == "user@host:/backup/x"
+        assert SnapshotStore("/backup").location_of("x") == "/backup/x"
+
+    def test_daemon(self) -> None:
+        with pytest.raises(ValueError):
+            SnapshotStore("rsync://host/module")
+
+    def test_local(self, tmp_path: Path) -> None:
+        store = SnapshotStore(str(tmp_path / "backup"))
+        assert store.snapshots() == []
+        store.create_base()
+        for name in NAMES[:3] + ["2026-02-02T08-00-00.partial", "other"]:
+            (tmp_path / "backup" / name).mkdir()
+        assert store.snapshots() == NAMES[:3]
+        assert store.latest() == NAMES[2]
+        assert store.remove_partial() == ["2026-02-02T08-00-00.partial"]
+        assert store.prune(Retention(last=1)) == NAMES[:2]
+        store.rename(NAMES[2], NAMES[3])
+        assert sorted(path.name for path in (tmp_path / "backup").iterdir()) == [
+            NAMES[3],
+            "other",
+        ]
+
+    def test_claim(self, tmp_path: Path) -> None:
+        store = SnapshotStore(str(tmp_path))
+        time = datetime.datetime(2026, 7, 1, tzinfo=datetime.timezone.utc)
+        assert store.claim(time) == "2026-07-01T00-00-00Z"
+        assert (tmp_path / "2026-07-01T00-00-00Z.partial").is_dir()
+        store.rename("2026-07-01T00-00-00Z.partial", "2026-07-01T00-00-00Z")
+        assert store.claim(time) == "2026-07-01T00-00-00Z-1"
+        assert store.claim(time) == "2026-07-01T00-00-00Z-2"
+        assert store.snapshots() == ["2026-07-01T00-00-00Z"]
+
+    def test_claim_exhausted(self, tmp_path: Path) -> None:
+        store = SnapshotStore(str(tmp_path))
+        time = datetime.datetime(2026, 7, 1, tzinfo=datetime.timezone.utc)
+        for _ in range(MAX_SEQUENCE + 1):
+            store.claim(time)
+        with pytest.raises(FileExistsError):
+            store.claim(time)
@@ -0,0 +1,353 @@
+import random
+
+import pytest
+
+from rsync_watch.stats import (
+    StatsNotFoundError,
+    add_throughput,
+    aggregate_stats,
+    convert_number_to_float,
+    convert_number_to_int,
+    detect_stats_format,
+    parse_partial_stats,
+    parse_stats,
+)
+
+OUTPUT_3_0: str = """
+sending incremental file list
+Number of files: 4928
+Number of files transferred: 64
+Total file size: 4222882233 bytes
+Total transferred file size: 13472638 bytes
+Literal data: 13472638 bytes
+Matched data: 0 bytes
+File list size: 65536
+File list generation time: 0.001 seconds
+File list transfer time: 0.000 seconds
+Total bytes sent: 13631370
+Total bytes received: 19859
+
+sent 13631370 bytes  received 19859 bytes  9100819.33 bytes/sec
+total size is 4222882233  speedup is 309.34
+"""
+
+OUTPUT_OPENRSYNC: str = """
+Number of files: 3
+Number of files transferred: 1
+Total file size: 10 B
+Total transferred file size: 10 B
+Literal data: 10 B
+Matched data: 0 B
+File list size: 45 B
+File list generation time: 0.001 seconds
+File list transfer time: 0.000 seconds
+Total bytes sent: 130
+Total bytes received: 35
+"""
+
+OUTPUT_3_2: str = (
+    "Number of files: 5\u202f012 (reg: 4\u202f001, dir: 1\u202f000, link: 11)\r\n"
+    "Number of created files: 3 (reg: 2, link: 1)\r\n"
+    "Number of deleted files: 0\r\n"
+    "Number of regular files transferred: 2\r\n"
+    "Total file size: 1\u202f234\u202f567 bytes\r\n"
+    "Total transferred file size: 1\u202f024 bytes\r\n"
+    "Literal data: 1\u202f024 bytes\r\n"
+    "Matched data: 0 bytes\r\n"
+    "File list size: 0\r\n"
+    "File list generation time: 1\u202f002,500 seconds\r\n"
+    "File list transfer time: 0,000 seconds\r\n"
+    "Total bytes sent: 2\u202f048\r\n"
+    "Total bytes received: 512\r\n"
+    "\r\n"
+    "sent 2\u202f048 bytes  received 512 bytes  5\u202f120,00 bytes/sec\r\n"
+    "total size is 1\u202f234\u202f567  speedup is 482,25\r\n"
+)
+
+
+class TestConvertNumberToInt:
+    @pytest.mark.parametrize(
+        "formatted, expected",
+        [
+            ("0", 0),
+            ("1234", 1234),
+            ("1,234", 1234),
+            ("1.234.567", 1234567),
+            ("1'234'567", 1234567),
+            ("1 234 567", 1234567),
+            ("1\u202f234", 1234),
+            ("1\u00a0234", 1234),
+        ],
+    )
+    def test_convert(self, formatted: str, expected: int) -> None:
+        assert convert_number_to_int(formatted) == expected
+
+
+class TestConvertNumberToFloat:
+    @pytest.mark.parametrize(
+        "formatted, expected",
+        [
+            ("11.000", 11.0),
+            ("0,147", 0.147),
+            ("3.548,76", 3548.76),
+            ("3,548.76", 3548.76),
+            ("155.133,72", 155133.72),
+            ("1'234'567.89", 1234567.89),
+            ("1\u202f002,500", 1002.5),
+            ("12", 12.0),
+        ],
+    )
+    def test_convert(self, formatted: str, expected: float) -> None:
+        assert convert_number_to_float(formatted) == expected
+
+
+class TestDetectStatsFormat:
+    def test_3_0(self) -> None:
+        assert detect_stats_format(OUTPUT_3_0) == "rsync-3.0"
+
+    def test_3_2(self) -> None:
+        assert detect_stats_format(OUTPUT_3_2) == "rsync-3.1"
+
+    def test_openrsync(self) -> None:
+        assert detect_stats_format(OUTPUT_OPENRSYNC) == "openrsync"
+
+    def test_empty(self) -> None:
+        assert detect_stats_format("") == "rsync-3.1"
+
+
+class TestParseStats:
+    def test_3_0(self) -> None:
+        assert parse_stats(OUTPUT_3_0) == {
+            "num_files": 4928,
+            "num_created_files": 0,
+            "num_deleted_files": 0,
+            "num_files_transferred": 64,
+            "total_size": 4222882233,
+            "transferred_size": 13472638,
+            "literal_data": 13472638,
+            "matched_data": 0,
+            "list_size": 65536,
+            "list_generation_time": 0.001,
+            "list_transfer_time": 0.0,
+            "bytes_sent": 13631370,
+            "bytes_received": 19859,
+            "bytes_per_sec": 9100819.33,
+            "speedup": 309.34,
+        }
+
+    def test_3_0_missing(self) -> None:
+        with pytest.raises(StatsNotFoundError) as context:
+            parse_stats(OUTPUT_3_0.replace("Total bytes sent", "Bytes sent"))
+        assert context.value.args[0] == "Total bytes sent: X,XXX"
+
+    def test_openrsync(self) -> None:
+        stats = parse_stats(OUTPUT_OPENRSYNC)
+        assert stats["num_files"] == 3
+        assert stats["num_files_transferred"] == 1
+        assert stats["total_size"] == 10
+        assert stats["list_size"] == 45
+        assert stats["bytes_received"] == 35
+
+    def test_3_2_narrow_no_break_space_and_crlf(self) -> None:
+        assert parse_stats(OUTPUT_3_2) == {
+            "num_files": 5012,
+            "num_created_files": 3,
+            "num_deleted_files": 0,
+            "num_files_transferred": 2,
+            "total_size": 1234567,
+            "transferred_size": 1024,
+            "literal_data": 1024,
+            "matched_data": 0,
+            "list_size": 0,
+            "list_generation_time": 1002.5,
+            "list_transfer_time": 0.0,
+            "bytes_sent": 2048,
+            "bytes_received": 512,
+            "num_files_reg": 4001,
+            "num_files_dir": 1000,
+            "num_files_link": 11,
+            "num_created_files_reg": 2,
+            "num_created_files_link": 1,
+            "bytes_per_sec": 5120.0,
+            "speedup": 482.25,
+        }
+
+    def test_file_names_similar_to_stats(self) -> None:
+        """Itemized file names must not shadow the real stats."""
+        output = "Number of files: 99 (reg: 99)/\n" + OUTPUT_3_0
+        assert parse_stats(output)["num_files"] == 4928
+
+    def test_large_itemized_output(self) -> None:
+        itemized = "".join(f"dir/file_{i}.txt\n" for i in range(100_000))
+        assert parse_stats(itemized + OUTPUT_3_0)["num_files"] == 4928
+
+
+class TestParsePartialStats:
+    def test_out_format(self) -> None:
+        stdout = (
+            "sending incremental file list\n"
+            "rsync-watch-file: cd+++++++++ 4,096 0 dir/\n"
+            "rsync-watch-file: >f+++++++++ 1,000 1,000 dir/new.txt\n"
+            "rsync-watch-file: >f.st...... 2,000 150 dir/changed.txt\n"
+            "rsync-watch-file: .f...p..... 3,000 0 dir/permissions.txt\n"
+            "rsync-watch-file: *deleting 0 0 dir/old.txt\n"
+        )
+        assert parse_partial_stats(stdout) == {
+            "num_files_transferred": 2,
+            "num_created_files": 2,
+            "num_deleted_files": 1,
+            "transferred_size": 3000,
+            "partial_bytes_transferred": 1150,
+            "partial": 1,
+        }
+
+    def test_verbose(self) -> None:
+        stdout = (
+            "sending incremental file list\n"
+            "deleting old.txt\n"
+            "./\n"
+            "dir/\n"
+            "dir/a.txt\n"
+            "dir/b.txt\n"
+            "link -> dir/a.txt\n"
+            'skipping non-regular file "fifo"\n'
+        )
+        assert parse_partial_stats(stdout) == {
+            "num_files_transferred": 2,
+            "num_created_files": 0,
+            "num_deleted_files": 1,
+            "partial": 1,
+        }
+
+    def test_truncated_stats(self) -> None:
+        stats = parse_partial_stats(OUTPUT_3_0.split("Total file size")[0])
+        assert stats["num_files"] == 4928
+        assert stats["num_files_transferred"] == 64
+        assert stats["partial"] == 1
+
+    def test_parse_stats_fallback(self) -> None:
+        assert parse_stats("a.txt\n", partial=True)["partial"] == 1
+        assert "partial" not in parse_stats(OUTPUT_3_0, partial=True)
+
+    def test_add_throughput(self) -> None:
+        stats = add_throughput(parse_partial_stats("a.txt\n"), 2.0)
+        assert stats["effective_bytes_per_sec"] == 0.0
+        assert "speedup" not in stats
+
+
+class TestAddThroughput:
+    def test_with_summary(self) -> None:
+        stats = add_throughput(parse_stats(OUTPUT_3_0), 2.0)
+        assert stats["duration"] == 2.0
+        assert stats["effective_bytes_per_sec"] == 6825614.5
+        assert stats["bytes_per_sec"] == 9100819.33
+        assert stats["speedup"] == 309.34
+
+    def test_without_summary(self) -> None:
+        stats = add_throughput(parse_stats(OUTPUT_OPENRSYNC), 0.5)
+        assert stats["effective_bytes_per_sec"] == 330.0
+        assert "bytes_per_sec" not in stats
+        assert stats["speedup"] == 0.06
+
+    def test_zero_duration(self) -> None:
+        stats = add_throughput(parse_stats(OUTPUT_3_0), 0)
+        assert stats["effective_bytes_per_sec"] == 0.0
+
+
+class TestAggregateStats:
+    def test_aggregate(self) -> None:
+        stats1 = add_throughput(parse_stats(OUTPUT_3_0), 2.0)
+        stats2 = add_throughput(parse_stats(OUTPUT_OPENRSYNC), 1.0)
+        aggregate = aggregate_stats([stats1, stats2], 2.5)
+        assert aggregate["num_files"] == 4931
+        assert aggregate["bytes_received"] == 19894
+        assert aggregate["duration"] == 2.5
+        assert aggregate["effective_bytes_per_sec"] == 5460557.6
+        assert aggregate["speedup"] == 309.34
+        assert "bytes_per_sec" not in aggregate
+        assert aggregate["dest1_num_files"] == 4928
+        assert aggregate["dest2_num_files"] == 3
+        assert aggregate["dest2_duration"] == 1.0
+
+
+def _format_int(number: int, separator: str) -> str:
+    return f"{number:,}".replace(",", separator)
+
+
+def _format_float(number: float, separator: str, decimal_point: str) -> str:
+    integer, fraction = f"{number:.3f}".split(".")
+    return f"{_format_int(int(integer), separator)}{decimal_point}{fraction}"
+
+
+class TestFuzzParseStats:
+    """Render random stats using random locale conventions and parse them
+    again."""
+
+    LOCALES: list[tuple[str, str]] = [
+        (",", "."),
+        (".", ","),
+        ("'", "."),
+        (" ", ","),
+        ("\u00a0", ","),
+        ("\u202f", ","),
+    ]
+
+    def test_round_trip(self) -> None:
+        rand = random.Random(4711)
+        for _ in range(500):
+            separator, decimal_point = rand.choice(self.LOCALES)
+            ints = {
+                key: rand.randrange(0, 10 ** rand.randrange(1, 16))
+                for key in (
+                    "num_files",
+                    "num_created_files",
+                    "num_deleted_files",
+                    "num_files_transferred",
+                    "total_size",
+                    "transferred_size",
+                    "literal_data",
+                    "matched_data",
+                    "list_size",
+                    "bytes_sent",
+                    "bytes_received",
+                    "num_files_reg",
+                    "num_files_dir",
+                )
+            }
+            floats = {
+                key: rand.randrange(0, 10**9) / 1000
+                for key in ("list_generation_time", "list_transfer_time")
+            }
+
+            # Bind the values of this iteration (ruff B023).
+            def i(
+                key: str, ints: dict[str, int] = ints, separator: str = separator
+            ) -> str:
+                return _format_int(ints[key], separator)
+
+            def f(
+                key: str,
+                floats: dict[str, float] = floats,
+                separator: str = separator,
+                decimal_point: str = decimal_point,
+            ) -> str:
+                return _format_float(floats[key], separator, decimal_point)
+
+            output = (
+                f"Number of files: {i('num_files')} (reg: {i('num_files_reg')}, "
+                f"dir: {i('num_files_dir')})\n"
+                f"Number of created files: {i('num_created_files')}\n"
+                f"Number of deleted files: {i('num_deleted_files')}\n"
+                "Number of regular files transferred: "
+                f"{i('num_files_transferred')}\n"
+                f"Total file size: {i('total_size')} bytes\n"
+                f"Total transferred file size: {i('transferred_size')} bytes\n"
+                f"Literal data: {i('literal_data')} bytes\n"
+                f"Matched data: {i('matched_data')} bytes\n"
+                f"File list size: {i('list_size')}\n"
+                f"File list generation time: {f('list_generation_time')} seconds\n"
+                f"File list transfer time: {f('list_transfer_time')} seconds\n"
+                f"Total bytes sent: {i('bytes_sent')}\n"
+                f"Total bytes received: {i('bytes_received')}\n"
+            )
+            assert parse_stats(output) == {**ints, **floats}, output
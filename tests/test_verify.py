@@ -0,0 +1,155 @@
+import random
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+import pytest
+
+from rsync_watch.histogram import OutFormatLine
+from rsync_watch.verify import (
+    VerificationResult,
+    hash_files,
+    hash_local_file,
+    merge_results,
+    resolve_root,
+    sample_files,
+    verify,
+)
+
+EMPTY_SHA256: str = "e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855"
+
+
+def get_lines(*sizes: int) -> list[OutFormatLine]:
+    return [
+        OutFormatLine(">f+++++++++", size, size, f"file{i}")
+        for i, size in enumerate(sizes)
+    ]
+
+
+class TestSampleFiles:
+    def test_all(self) -> None:
+        lines = get_lines(1, 2, 3)
+        assert sample_files(lines, 5) == lines
+
+    def test_count(self) -> None:
+        lines = get_lines(*range(100))
+        sample = sample_files(lines, 10, rand=random.Random(1))
+        assert len(sample) == 10
+        # In the order of the output
+        assert sample == sorted(sample, key=lambda line: line.size)
+
+    def test_zero(self) -> None:
+        assert sample_files(get_lines(1, 2), 0) == []
+
+    def test_skip_directories(self) -> None:
+        lines = [OutFormatLine("cd+++++++++", 4096, 0, "dir/")] + get_lines(1)
+        assert [line.name for line in sample_files(lines, 5)] == ["file0"]
+
+    def test_size_weighted(self) -> None:
+        lines = get_lines(*([1] * 1000 + [10**9]))
+        rand = random.Random(2)
+        hits = sum(
+            "file1000" in [line.name for line in sample_files(lines, 1, "size", rand)]
+            for _ in range(100)
+        )
+        assert hits > 90
+
+
+class TestResolveRoot:
+    @pytest.mark.parametrize(
+        "src, root",
+        [
+            ("/data/src/", "/data/src/"),
+            ("/data/src", "/data"),
+            ("src", ""),
+            ("host:/var/backups", "host:/var"),
+            ("host:backups", "host:"),
+        ],
+    )
+    def test_src(self, src: str, root: str) -> None:
+        assert resolve_root(src, "dest") == (root, "dest")
+
+
+class TestHash:
+    def test_local(self, tmp_path: Path) -> None:
+        (tmp_path / "empty").touch()
+        assert hash_local_file(str(tmp_path / "empty")) == EMPTY_SHA256
+        assert hash_local_file(str(tmp_path / "missing")) is None
+
+    def test_remote_batched(self) -> None:
+        with patch("rsync_watch.verify.subprocess.run") as run:
+            # sha256sum exits with 1 if a file can’t be read.
+            run.return_value = Mock(
+                stdout=f"{EMPTY_SHA256}  /backup/a b\n", returncode=1
+            )
+            digests = hash_files("user@host:/backup", ["a b", "c"])
+        assert digests == [EMPTY_SHA256, None]
+        assert run.call_count == 1
+        assert run.call_args.args[0] == [
+            "ssh",
+            "user@host",
+            "sha256sum -- '/backup/a b' /backup/c",
+        ]
+
+    def test_remote_ssh_error(self) -> None:
+        with patch("rsync_watch.verify.subprocess.run") as run:
+            run.return_value = Mock(
+                stdout="", stderr="Permission denied (publickey).\n", returncode=255
+            )
+            with pytest.raises(OSError, match=r"exit code 255\): Permission denied"):
+                hash_files("user@host:/backup", ["a"])
+
+
+class TestVerify:
+    def test_local(self, tmp_path: Path) -> None:
+        src = tmp_path / "src"
+        dest = tmp_path / "dest"
+        for directory in (src, dest):
+            directory.mkdir()
+            (directory / "same").write_text("same")
+        (src / "changed").write_text("old")
+        (dest / "changed").write_text("new")
+        (src / "missing").write_text("missing")
+        lines = [
+            OutFormatLine(">f+++++++++", 4, 4, "same"),
+            OutFormatLine(">f+++++++++", 3, 3, "changed"),
+            OutFormatLine(">f+++++++++", 7, 7, "missing"),
+        ]
+        result = verify(f"{src}/", str(dest), lines)
+        assert result.files == 3
+        assert result.bytes == 14
+        assert result.mismatches == ["changed", "missing"]
+        assert result.performance_data["verify_mismatches"] == 2
+
+    def test_unreachable(self, tmp_path: Path) -> None:
+        (tmp_path / "a").write_text("a")
+        lines = [OutFormatLine(">f+++++++++", 1, 1, "a")]
+        with patch("rsync_watch.verify.subprocess.run") as run:
+            run.return_value = Mock(stdout="", stderr="No route", returncode=255)
+            result = verify(f"{tmp_path}/", "host:/backup", lines)
+        assert result.files == 0
+        assert result.mismatches == []
+        assert result.errors == (
+            "Can’t hash the files on host (exit code 255): No route",
+        )
+        assert result.performance_data["verify_errors"] == 1
+        assert result.format() == (
+            "Verification: 0 files, 0 mismatches\n"
+            "  couldn’t verify: Can’t hash the files on host (exit code 255): "
+            "No route"
+        )
+
+    def test_daemon(self) -> None:
+        with pytest.raises(ValueError):
+            verify("src/", "rsync://host/module", [])
+
+    def test_merge_and_format(self) -> None:
+        result = merge_results(
+            [
+                VerificationResult(2, 10, ["a"], 1.0),
+                VerificationResult(3, 30, ["b"], 1.0),
+            ]
+        )
+        assert result.performance_data["verify_bytes_per_sec"] == 20.0
+        assert result.format(limit=1) == (
+            "Verification: 5 files, 2 mismatches\n  mismatch: a\n  … and 1 more"
+        )